@@ -1,34 +1,83 @@
 from datetime import datetime, timezone
-from typing import Dict, Optional, List
-from pathlib import Path
-
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from pydantic import BaseModel, Field
+from typing import Dict, Optional, List, Literal
+import os
+import json
+import time
+import asyncio
+import queue
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, Response, JSONResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 import logging
 import sys
 sys.path.append('/app')
 
 from model_manager import (
-    load_model,
     get_model_status,
+    get_runtime_stats,
+    reload_model,
     predict_single,
     predict_batch,
-    validate_model
+    predict_many,
+    predict_arrays,
+    prediction_cache,
+    shadow_scorer,
+    model_feature_columns
+)
+from model_registry import promote_version
+from microbatch import MicroBatcher, MICROBATCH_ENABLED
+from executors import run_inference
+from columnar import score_columnar, score_columnar_heuristic, format_from_media_type, MEDIA_TYPES
+from heuristic import heuristic_score, heuristic_predictions, heuristic_arrays
+from compact import (
+    columns_payload,
+    float32_payload,
+    FORMAT_RECORDS,
+    FORMAT_COLUMNS,
+    FORMAT_FLOAT32,
+    FLOAT32_COLUMNS,
+    JSON_MEDIA_TYPE,
+    FLOAT32_MEDIA_TYPE
+)
+from shadow import SHADOW_ENABLED, SHADOW_VERSION, read_shadow_state
+from warmup import warm_up, readiness, WARMUP_ENABLED
+from training_jobs import submit_job, read_job, cancel_job, JobAlreadyRunning
+from metrics import (
+    render_metrics,
+    RequestTimingMiddleware,
+    PROMETHEUS_CONTENT_TYPE,
+    FALLBACKS,
+    STAGE_PARSE,
+    STAGE_STATUS,
+    STAGE_SERIALIZE,
+    BATCH_SIZE_BATCH,
+    BATCH_SIZE_STREAM
 )
-from train_model import train_pipeline
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="MLService", version="1.0.0")
+app.add_middleware(RequestTimingMiddleware)
 
 MODEL_VERSION = "v1.0.0"
 
+# Размер чанка потокового скоринга /ml/predict/stream
+STREAM_CHUNK_SIZE = int(os.environ.get('ML_STREAM_CHUNK_SIZE', '1000'))
+
+# Coalescer одиночных предсказаний (включается ML_MICROBATCH_ENABLED)
+micro_batcher = MicroBatcher(predict_many) if MICROBATCH_ENABLED else None
+
+# Фоновая задача прогрева воркера
+_warmup_task = None
+
 
 class ScoreRequest(BaseModel):
     application_id: Optional[int] = None
     features: Dict[str, float] = Field(default_factory=dict)
+    importance_type: Literal['global', 'shap'] = 'global'
 
 
 class ScoreResponse(BaseModel):
@@ -36,35 +85,56 @@ class ScoreResponse(BaseModel):
     default_probability: float
     model_version: str
     feature_importances: Dict[str, float]
+    importance_type: str = 'global'
     confidence: float
     generated_at: str
 
 
 class TrainRequest(BaseModel):
-    n_iterations: Optional[int] = 1000
+    n_iterations: int = Field(default=1000, gt=0)
     dataset_path: Optional[str] = None
+    promote: bool = True
+    tune: bool = False
+    tune_trials: Optional[int] = Field(default=None, gt=0)
 
 
-class TrainResponse(BaseModel):
-    success: bool
-    model_version: str
-    metrics: Optional[Dict]
-    feature_count: Optional[int]
-    model_path: Optional[str]
-    error: Optional[str]
+class ShadowRequest(BaseModel):
+    version: Optional[str] = None
+
+
+class TrainJobResponse(BaseModel):
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    params: Dict
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    progress: Optional[Dict] = None
+    result: Optional[Dict] = None
+    error: Optional[str] = None
 
 
 class BatchPredictRequest(BaseModel):
     features_list: List[Dict[str, float]]
+    importance_type: Optional[Literal['global', 'shap']] = None
+
+
+# Валидация одной записи потокового скоринга (как элемента features_list)
+STREAM_RECORD_ADAPTER = TypeAdapter(Dict[str, float])
 
 
 class BatchPredictResponse(BaseModel):
     success: bool
     total_predictions: Optional[int]
     predictions: Optional[List[Dict]]
+    feature_importances: Optional[Dict[str, float]] = None
+    importance_type: Optional[str] = None
+    fallback_count: Optional[int] = None
+    fallback_reason: Optional[str] = None
     model_version: str
     generated_at: str
-    error: Optional[str]
+    error: Optional[str] = None
 
 
 class ModelStatusResponse(BaseModel):
@@ -73,34 +143,125 @@ class ModelStatusResponse(BaseModel):
     last_trained: Optional[str]
     metrics: Dict
     loaded_at: str
+    model_format: Optional[str] = None
+    load_time_ms: Optional[float] = None
+    loaded_by_pid: Optional[int] = None
+    worker_pid: Optional[int] = None
+    rss_mb: Optional[float] = None
+    pss_mb: Optional[float] = None
+    shared_mb: Optional[float] = None
+    peak_rss_mb: Optional[float] = None
+
+
+async def score_single(features: Dict[str, float], importance_type: str = 'global',
+                       application_id: Optional[int] = None) -> dict:
+    """
+    Предсказание одной записи в пуле инференса или через micro-batching
+    (если включен, только для global importances). При переполнении
+    очереди запись считается напрямую.
+    """
+    if micro_batcher is None or importance_type != 'global':
+        return await run_inference(predict_single, features, importance_type, application_id)
+    
+    try:
+        future = micro_batcher.enqueue(features, application_id)
+    except queue.Full:
+        return await run_inference(predict_single, features, importance_type, application_id)
+    
+    return await asyncio.wrap_future(future)
 
 
-def heuristic_score(features: Dict[str, float]) -> tuple[float, Dict[str, float], float]:
-    income = float(features.get("income", 50000))
-    age = float(features.get("age", 35))
-    debt_to_income = float(features.get("debt_to_income", 0.3))
-    bki_requests = float(features.get("bki_request_cnt", 1))
+async def score_batch(features_list: list, importance_type: Optional[str] = None,
+                      record_ids: Optional[list] = None) -> dict:
+    """
+    Батч-скоринг моделью с деградацией на векторизованную эвристику,
+    если модель не загружена или батч не удалось посчитать.
+    Каждая строка ответа помечена fallback (true - посчитана эвристикой).
+    record_ids - ключи записей в результатах shadow.
+    """
+    try:
+        started = time.perf_counter()
+        status = get_model_status()
+        STAGE_STATUS.observe(time.perf_counter() - started)
+        
+        if status.get('status') == 'not_loaded':
+            fallback, reason = 'heuristic fallback', 'model_not_loaded'
+        else:
+            result = await run_inference(predict_batch, features_list, importance_type, record_ids)
+            if result.get('success'):
+                for prediction in result['predictions']:
+                    prediction['fallback'] = False
+                result['fallback_count'] = 0
+                return result
+            fallback, reason = 'fallback after error', result.get('error')
+    except Exception as e:
+        fallback, reason = 'error fallback', str(e)
+    
+    predictions = await run_inference(heuristic_predictions, features_list, importance_type is not None)
+    FALLBACKS.labels(fallback).inc(len(predictions))
+    
+    return {
+        'success': True,
+        'total_predictions': len(predictions),
+        'predictions': predictions,
+        'importance_type': 'heuristic',
+        'model_version': f"{MODEL_VERSION} ({fallback})",
+        'fallback_count': len(predictions),
+        'fallback_reason': reason,
+        'generated_at': datetime.now(timezone.utc).isoformat()
+    }
 
-    linear = 0.45 + (debt_to_income * 0.7) + (bki_requests * 0.04) - (income / 300000) - (age / 400)
-    probability = max(0.01, min(0.99, linear))
 
-    feature_importances = {
-        "debt_to_income": round(min(0.35, debt_to_income * 0.5), 4),
-        "bki_request_cnt": round(min(0.2, bki_requests * 0.03), 4),
-        "income": round(max(-0.25, -(income / 500000)), 4),
-        "age": round(max(-0.1, -(age / 1000)), 4),
-    }
-    confidence = round(0.65 + (0.3 * abs(0.5 - probability)), 4)
-    return round(probability, 4), feature_importances, min(0.98, confidence)
+async def score_batch_arrays(features_list: list, importance_type: Optional[str] = None) -> dict:
+    """
+    Батч-скоринг параллельными массивами (компактные форматы ответа)
+    с той же деградацией на эвристику, что и score_batch.
+    """
+    try:
+        started = time.perf_counter()
+        status = get_model_status()
+        STAGE_STATUS.observe(time.perf_counter() - started)
+        
+        if status.get('status') == 'not_loaded':
+            fallback, reason = 'heuristic fallback', 'model_not_loaded'
+        else:
+            result = await run_inference(predict_arrays, features_list, importance_type)
+            result.update(fallback_count=0, fallback_reason=None)
+            return result
+    except Exception as e:
+        logger.error(f"Batch prediction failed: {e}")
+        fallback, reason = 'fallback after error', str(e)
+    
+    result = await run_inference(heuristic_arrays, features_list)
+    FALLBACKS.labels(fallback).inc(len(features_list))
+    
+    # Importances эвристики построчные, в компактный ответ не попадают
+    result.pop('feature_importances')
+    result.update(
+        model_version=f"{MODEL_VERSION} ({fallback})",
+        fallback_count=len(features_list),
+        fallback_reason=reason
+    )
+    return result
 
 
 @app.get("/ml/health")
-def health() -> dict:
+async def health() -> dict:
     return {"status": "ok", "model_version": MODEL_VERSION}
 
 
+@app.get("/ml/ready")
+async def ready() -> JSONResponse:
+    """
+    Готовность воркера принимать трафик: 503, пока не закончен прогрев
+    (загрузка bundle и пробные предсказания), затем 200 и время шагов.
+    """
+    state = readiness()
+    return JSONResponse(content=state, status_code=200 if state['ready'] else 503)
+
+
 @app.get("/ml/model/status", response_model=ModelStatusResponse)
-def model_status() -> ModelStatusResponse:
+async def model_status() -> ModelStatusResponse:
     status = get_model_status()
     
     return ModelStatusResponse(
@@ -108,145 +269,462 @@ def model_status() -> ModelStatusResponse:
         status=status.get('status', 'unknown'),
         last_trained=status.get('last_trained'),
         metrics=status.get('metrics', {}),
-        loaded_at=status.get('loaded_at', datetime.now(timezone.utc).isoformat())
+        loaded_at=status.get('loaded_at', datetime.now(timezone.utc).isoformat()),
+        **get_runtime_stats()
     )
 
 
-@app.post("/ml/train", response_model=TrainResponse)
-def train_model(request: TrainRequest, background_tasks: BackgroundTasks):
+@app.post("/ml/train", response_model=TrainJobResponse, status_code=202)
+async def train_model(request: TrainRequest):
     """
-    Запуск обучения модели в фоновом режиме.
+    Постановка задачи обучения, обучение идет в отдельном процессе.
+    Ответ возвращается сразу, прогресс - /ml/train/status/{job_id}.
+    Одновременно выполняется одно обучение (409 при занятости).
     """
-    try:
-        # Проверяем доступность модели
-        if not validate_model():
-            # Если модель не загружена, запускаем обучение
-            result = train_pipeline()
-            
-            return TrainResponse(
-                success=result.get('success', False),
-                model_version=result.get('model_version', MODEL_VERSION),
-                metrics=result.get('metrics'),
-                feature_count=result.get('feature_count'),
-                model_path=result.get('model_path'),
-                error=result.get('error')
-            )
-        else:
-            # Модель уже загружена, перезапускаем обучение
-            result = train_pipeline()
-            
-            return TrainResponse(
-                success=result.get('success', False),
-                model_version=result.get('model_version', MODEL_VERSION),
-                metrics=result.get('metrics'),
-                feature_count=result.get('feature_count'),
-                model_path=result.get('model_path'),
-                error=result.get('error')
-            )
+    async def reload_promoted(job: dict):
+        if job['params']['promote']:
+            await run_inference(reload_model)
     
-    except Exception as e:
-        return TrainResponse(
-            success=False,
-            model_version=MODEL_VERSION,
-            error=str(e)
+    try:
+        job = await submit_job(
+            n_iterations=request.n_iterations,
+            dataset_path=request.dataset_path,
+            promote=request.promote,
+            tune=request.tune,
+            tune_trials=request.tune_trials,
+            on_success=reload_promoted
         )
+    except JobAlreadyRunning as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return TrainJobResponse(**job)
+
+
+@app.post("/ml/model/reload", response_model=ModelStatusResponse)
+async def model_reload() -> ModelStatusResponse:
+    """
+    Перезагрузка активной версии модели из реестра.
+    Запросы в процессе дорабатывают на предыдущей версии.
+    """
+    try:
+        await run_inference(reload_model)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    return await model_status()
+
+
+def _heuristic_response(req: ScoreRequest, fallback: str) -> ScoreResponse:
+    """Ответ /ml/predict по эвристике (fallback - причина для версии и метрик)"""
+    FALLBACKS.labels(fallback).inc()
+    probability, importances, confidence = heuristic_score(req.features)
+    return ScoreResponse(
+        application_id=req.application_id,
+        default_probability=probability,
+        model_version=f"{MODEL_VERSION} ({fallback})",
+        feature_importances=importances,
+        importance_type='heuristic',
+        confidence=confidence,
+        generated_at=datetime.now(timezone.utc).isoformat()
+    )
+
+
+def _observe_parse(request: Request):
+    """Время от получения запроса до входа в обработчик (чтение тела и валидация)"""
+    received_at = getattr(request.state, 'received_at', None)
+    if received_at is not None:
+        STAGE_PARSE.observe(time.perf_counter() - received_at)
+
+
+def _mark_handler_done(request: Request):
+    """Начало сериализации ответа (замеряется в RequestTimingMiddleware)"""
+    request.state.handler_done_at = time.perf_counter()
 
 
 @app.post("/ml/predict", response_model=ScoreResponse)
-def predict(req: ScoreRequest):
+async def predict(req: ScoreRequest, request: Request):
     """
     Предсказание для одной записи.
     Использует обученную CatBoost модель.
     """
+    _observe_parse(request)
+    
     try:
         # Проверяем статус модели
+        started = time.perf_counter()
         status = get_model_status()
+        STAGE_STATUS.observe(time.perf_counter() - started)
         
         if status.get('status') == 'not_loaded':
             # Если модель не загружена, используем heuristic
-            probability, importances, confidence = heuristic_score(req.features)
-            return ScoreResponse(
-                application_id=req.application_id,
-                default_probability=probability,
-                model_version=f"{MODEL_VERSION} (heuristic fallback)",
-                feature_importances=importances,
-                confidence=confidence,
-                generated_at=datetime.now(timezone.utc).isoformat()
-            )
+            _mark_handler_done(request)
+            return _heuristic_response(req, 'heuristic fallback')
         
         # Используем обученную модель
-        result = predict_single(req.features)
+        result = await score_single(req.features, req.importance_type, req.application_id)
+        _mark_handler_done(request)
         
         if not result.get('success'):
             # Если предсказание не удалось, используем heuristic
-            probability, importances, confidence = heuristic_score(req.features)
-            return ScoreResponse(
-                application_id=req.application_id,
-                default_probability=probability,
-                model_version=f"{MODEL_VERSION} (fallback after error)",
-                feature_importances=importances,
-                confidence=confidence,
-                generated_at=datetime.now(timezone.utc).isoformat()
-            )
+            return _heuristic_response(req, 'fallback after error')
         
         return ScoreResponse(
             application_id=req.application_id,
             default_probability=result['default_probability'],
             model_version=result['model_version'],
             feature_importances=result['feature_importances'],
+            importance_type=result['importance_type'],
             confidence=result['confidence'],
             generated_at=result['generated_at']
         )
     
-    except Exception as e:
+    except Exception:
         # Fallback на heuristic
-        probability, importances, confidence = heuristic_score(req.features)
-        return ScoreResponse(
-            application_id=req.application_id,
-            default_probability=probability,
-            model_version=f"{MODEL_VERSION} (error fallback)",
-            feature_importances=importances,
-            confidence=confidence,
-            generated_at=datetime.now(timezone.utc).isoformat()
-        )
+        _mark_handler_done(request)
+        return _heuristic_response(req, 'error fallback')
 
 
 @app.post("/ml/predict/batch", response_model=BatchPredictResponse)
-def predict_batch_endpoint(req: BatchPredictRequest):
+async def predict_batch_endpoint(req: BatchPredictRequest, request: Request,
+                                 response_format: Literal['records', 'columns', 'float32'] = FORMAT_RECORDS):
     """
     Батч предсказания для нескольких записей.
+    Без модели (или при ошибке модели) записи считаются эвристикой,
+    такие строки помечены fallback=true.
+    response_format=columns - параллельные массивы в JSON,
+    response_format=float32 - сырые float32 колонки (метаданные в заголовках X-*).
+    """
+    _observe_parse(request)
+    BATCH_SIZE_BATCH.observe(len(req.features_list))
+    
+    if response_format != FORMAT_RECORDS:
+        return await _compact_batch_response(req, request, response_format)
+    
+    result = await score_batch(req.features_list, req.importance_type)
+    _mark_handler_done(request)
+    
+    return BatchPredictResponse(
+        success=result.get('success', False),
+        total_predictions=result.get('total_predictions'),
+        predictions=result.get('predictions'),
+        feature_importances=result.get('feature_importances'),
+        importance_type=result.get('importance_type'),
+        fallback_count=result.get('fallback_count'),
+        fallback_reason=result.get('fallback_reason'),
+        model_version=result.get('model_version', MODEL_VERSION),
+        generated_at=datetime.now(timezone.utc).isoformat(),
+        error=result.get('error')
+    )
+
+
+async def _compact_batch_response(req: BatchPredictRequest, request: Request, response_format: str) -> Response:
+    """
+    Компактный ответ батч-скоринга без dict на запись и без
+    валидации pydantic: JSON с массивами или float32 колонки.
+    """
+    if req.importance_type == 'shap' or (response_format == FORMAT_FLOAT32 and req.importance_type):
+        raise HTTPException(
+            status_code=400,
+            detail=f"importance_type={req.importance_type} is not supported with response_format={response_format}"
+        )
+    
+    result = await score_batch_arrays(req.features_list, req.importance_type)
+    _mark_handler_done(request)
+    
+    meta = {
+        'success': True,
+        'total_predictions': len(req.features_list),
+        'model_version': result['model_version'],
+        'fallback_count': result['fallback_count'],
+        'fallback_reason': result['fallback_reason'],
+        'generated_at': datetime.now(timezone.utc).isoformat()
+    }
+    
+    if response_format == FORMAT_COLUMNS:
+        return Response(content=columns_payload(result, meta), media_type=JSON_MEDIA_TYPE)
+    
+    headers = {
+        'X-Model-Version': meta['model_version'],
+        'X-Total-Predictions': str(meta['total_predictions']),
+        'X-Fallback-Count': str(meta['fallback_count']),
+        'X-Columns': ','.join(FLOAT32_COLUMNS)
+    }
+    return Response(content=float32_payload(result), media_type=FLOAT32_MEDIA_TYPE, headers=headers)
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse, который не слушает receive во время ответа.
+    Стандартный StreamingResponse забирает сообщения тела запроса в
+    listen_for_disconnect, а здесь тело читает сам генератор ответа.
+    Отключение клиента обнаруживается через request.stream() и send.
+    """
+    
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        
+        if self.background is not None:
+            await self.background()
+
+
+async def _read_ndjson_lines(request: Request):
+    """Построчное чтение NDJSON из тела запроса без буферизации всего тела"""
+    buffer = b''
+    
+    async for data in request.stream():
+        buffer += data
+        if b'\n' not in data:
+            continue
+        lines = buffer.split(b'\n')
+        buffer = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    
+    if buffer.strip():
+        yield buffer
+
+
+def _ndjson(record: dict) -> bytes:
+    """Сериализация одной строки NDJSON"""
+    return json.dumps(record, ensure_ascii=False).encode() + b'\n'
+
+
+def _validate_stream_record(line: bytes, expected_columns: list) -> dict:
+    """
+    Разбор и проверка одной строки NDJSON: объект признак -> число
+    и все признаки модели (если модель загружена). Ошибка - ValueError.
     """
     try:
-        status = get_model_status()
+        record = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    
+    try:
+        features = STREAM_RECORD_ADAPTER.validate_python(record)
+    except ValidationError as e:
+        details = '; '.join(
+            f"{'.'.join(str(loc) for loc in error['loc']) or 'record'}: {error['msg']}"
+            for error in e.errors()
+        )
+        raise ValueError(f"Invalid record: {details}")
+    
+    if expected_columns:
+        missing = [col for col in expected_columns if col not in features]
+        if missing:
+            raise ValueError(f"Missing features: {missing}")
+    
+    return features
+
+
+async def _score_chunk(chunk: list, indices: list, errors: dict):
+    """
+    Скоринг чанка валидных записей через векторизованный батч-путь
+    (с fallback на эвристику). Строки результата и ошибки невалидных
+    записей чанка отдаются одним куском в порядке глобального индекса.
+    """
+    lines = {index: _ndjson({'index': index, 'error': error}) for index, error in errors.items()}
+    
+    if chunk:
+        BATCH_SIZE_STREAM.observe(len(chunk))
         
-        if status.get('status') == 'not_loaded':
-            return BatchPredictResponse(
-                success=False,
-                error="Model not loaded. Please train the model first."
-            )
+        try:
+            result = await score_batch(chunk, record_ids=indices)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
         
-        result = predict_batch(req.features_list)
+        started = time.perf_counter()
+        if result.get('success'):
+            model_version = result.get('model_version', MODEL_VERSION)
+            for prediction in result['predictions']:
+                prediction['index'] = indices[prediction['index']]
+                prediction['model_version'] = model_version
+                lines[prediction['index']] = _ndjson(prediction)
+        else:
+            for index in indices:
+                lines[index] = _ndjson({'index': index, 'error': result.get('error')})
+        STAGE_SERIALIZE.observe(time.perf_counter() - started)
+    
+    yield b''.join(lines[index] for index in sorted(lines))
+
+
+async def _stream_predictions(request: Request):
+    """
+    Потоковый скоринг: записи читаются чанками по STREAM_CHUNK_SIZE,
+    результаты чанка отдаются сразу после его обработки.
+    Каждая запись проверяется отдельно: невалидная получает строку
+    с ошибкой, остальные записи чанка скорятся.
+    """
+    expected_columns = await run_inference(model_feature_columns)
+    chunk, indices, errors, index = [], [], {}, 0
+    
+    async for line in _read_ndjson_lines(request):
+        try:
+            chunk.append(_validate_stream_record(line, expected_columns))
+            indices.append(index)
+        except ValueError as e:
+            errors[index] = str(e)
+        index += 1
         
-        return BatchPredictResponse(
-            success=result.get('success', False),
-            total_predictions=result.get('total_predictions'),
-            predictions=result.get('predictions'),
-            model_version=MODEL_VERSION,
-            generated_at=datetime.now(timezone.utc).isoformat(),
-            error=result.get('error')
-        )
+        if len(chunk) + len(errors) >= STREAM_CHUNK_SIZE:
+            async for out in _score_chunk(chunk, indices, errors):
+                yield out
+            chunk, indices, errors = [], [], {}
     
+    if chunk or errors:
+        async for out in _score_chunk(chunk, indices, errors):
+            yield out
+
+
+@app.post("/ml/predict/stream")
+async def predict_stream(request: Request):
+    """
+    Потоковый скоринг NDJSON: одна запись признаков на строку.
+    Ответ - NDJSON по строке на запись (index, default_probability,
+    prediction, confidence, fallback, model_version) или строка с ошибкой
+    записи (index, error). Без модели записи считаются эвристикой.
+    Память не зависит от размера входа.
+    """
+    return DuplexStreamingResponse(_stream_predictions(request), media_type='application/x-ndjson')
+
+
+@app.post("/ml/predict/columnar")
+async def predict_columnar(request: Request, response_format: Literal['arrow', 'parquet'] = 'arrow'):
+    """
+    Колоночный батч-скоринг.
+    Тело - Arrow IPC stream (application/vnd.apache.arrow.stream) или
+    Parquet (application/vnd.apache.parquet). Имена колонок сопоставляются
+    с feature_columns.json без учета регистра.
+    Ответ - таблица sk_id_curr, default_probability, prediction, confidence
+    в формате response_format.
+    Без модели (или при ошибке скоринга) таблица считается эвристикой,
+    причина - в заголовках X-Fallback-Count и X-Fallback-Reason.
+    """
+    payload = await request.body()
+    input_format = format_from_media_type(request.headers.get('content-type'))
+    media_type = MEDIA_TYPES[response_format]
+    
+    try:
+        status = get_model_status()
+        
+        if status.get('status') == 'not_loaded':
+            fallback, reason = 'heuristic fallback', 'model_not_loaded'
+        else:
+            content, model_version, total = await run_inference(
+                score_columnar, payload, input_format, response_format
+            )
+            return Response(
+                content=content,
+                media_type=media_type,
+                headers={
+                    'X-Model-Version': model_version,
+                    'X-Total-Predictions': str(total),
+                    'X-Fallback-Count': '0'
+                }
+            )
+    except ValueError as e:
+        # Нет колонок признаков или поврежденный вход - ошибка клиента
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        return BatchPredictResponse(
-            success=False,
-            error=str(e),
-            model_version=MODEL_VERSION,
-            generated_at=datetime.now(timezone.utc).isoformat()
+        logger.error(f"Columnar prediction failed: {e}")
+        fallback, reason = 'fallback after error', str(e)
+    
+    try:
+        content, total = await run_inference(
+            score_columnar_heuristic, payload, input_format, response_format
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    FALLBACKS.labels(fallback).inc(total)
+    
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={
+            'X-Model-Version': f"{MODEL_VERSION} ({fallback})",
+            'X-Total-Predictions': str(total),
+            'X-Fallback-Count': str(total),
+            'X-Fallback-Reason': reason
+        }
+    )
+
+
+@app.get("/ml/microbatch/stats")
+async def microbatch_stats() -> dict:
+    """
+    Метрики micro-batching: глубина очереди, размеры батчей, время ожидания.
+    """
+    if micro_batcher is None:
+        return {'enabled': False}
+    
+    return micro_batcher.stats()
+
+
+@app.get("/ml/cache/stats")
+async def cache_stats() -> dict:
+    """
+    Метрики кэша предсказаний: попадания, промахи, вытеснения.
+    """
+    return prediction_cache.stats()
+
+
+@app.get("/ml/metrics")
+async def metrics() -> Response:
+    """
+    Метрики в текстовом формате Prometheus: задержки по этапам,
+    размеры батчей, fallback по причинам, время загрузки модели.
+    Счетчики ведутся в каждом воркере gunicorn отдельно.
+    """
+    return Response(content=render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get("/ml/shadow/stats")
+async def shadow_stats() -> dict:
+    """
+    Метрики shadow-скоринга по всем воркерам: очередь, буфер, накладные
+    расходы на пути champion, расхождение вероятностей и решений с
+    challenger (суммы и метрики каждого воркера).
+    """
+    return await run_inference(shadow_scorer.collect_stats)
+
+
+@app.post("/ml/shadow/enable")
+async def shadow_enable(req: ShadowRequest) -> dict:
+    """
+    Включение shadow-скоринга во всех воркерах (другие воркеры
+    подхватывают его в течение ML_SHADOW_SYNC_INTERVAL).
+    Без version challenger - самая новая версия, обученная после активной.
+    """
+    try:
+        return await run_inference(shadow_scorer.enable, req.version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/ml/shadow/disable")
+async def shadow_disable() -> dict:
+    """Отключение shadow-скоринга во всех воркерах с выгрузкой буфера"""
+    return await run_inference(shadow_scorer.disable)
+
+
+@app.post("/ml/shadow/promote", response_model=ModelStatusResponse)
+async def shadow_promote() -> ModelStatusResponse:
+    """Публикация challenger-версии как активной и отключение shadow"""
+    state = read_shadow_state() or {}
+    if not state.get('enabled') or not state.get('version'):
+        raise HTTPException(status_code=404, detail="No challenger enabled")
+    
+    await run_inference(shadow_scorer.disable)
+    await run_inference(promote_version, state['version'])
+    await run_inference(reload_model)
+    
+    return await model_status()
 
 
 @app.get("/ml/train/status")
-def train_status():
+async def train_status():
     """
     Проверка статуса последнего обучения.
     """
@@ -260,17 +738,54 @@ def train_status():
     }
 
 
+@app.get("/ml/train/status/{job_id}", response_model=TrainJobResponse)
+async def train_job_status(job_id: str):
+    """
+    Статус задачи обучения: шаг пайплайна, итерация, AUC, elapsed, ETA.
+    """
+    job = read_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Training job {job_id} not found")
+    
+    return TrainJobResponse(**job)
+
+
+@app.post("/ml/train/cancel/{job_id}", response_model=TrainJobResponse)
+async def train_job_cancel(job_id: str):
+    """
+    Отмена задачи обучения (останавливается на ближайшей итерации).
+    """
+    job = cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Training job {job_id} not found")
+    
+    return TrainJobResponse(**job)
+
+
 # Инициализация при старте
 @app.on_event("startup")
 async def startup_event():
     """
-    Проверка модели при старте сервиса.
+    Проверка модели при старте сервиса и запуск прогрева в фоне
+    (готовность - /ml/ready).
     """
+    global _warmup_task
+    
     try:
         status = get_model_status()
         logger.info(f"MLService started. Model status: {status.get('status')}")
     except Exception as e:
         logger.error(f"Error during startup: {e}")
+    
+    if WARMUP_ENABLED:
+        _warmup_task = asyncio.create_task(run_inference(warm_up))
+    
+    # Состояние, переключенное через API, важнее настройки окружения
+    if SHADOW_ENABLED and read_shadow_state() is None:
+        try:
+            await run_inference(shadow_scorer.enable, SHADOW_VERSION)
+        except Exception as e:
+            logger.error(f"Shadow scoring not enabled: {e}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,352 @@
+"""
+Воспроизводимый бенчмарк endpoints ML-сервиса.
+Обучает модель на синтетических прототипных данных во временном
+реестре, поднимает FastAPI приложение в процессе (ASGI без сети)
+и замеряет p50/p95/p99 и пропускную способность /ml/predict,
+/ml/predict/batch и fallback-путей. Работает офлайн на CPU.
+
+Запуск:
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json --fail-on-regression
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZES = (1, 10, 100, 1000)
+DEFAULT_CONCURRENCY = (1, 8)
+DEFAULT_REQUESTS = 300
+DEFAULT_WARMUP = 20
+DEFAULT_TOLERANCE = 0.10
+DEFAULT_SEED = 42
+DEFAULT_TRAIN_ROWS = 5000
+
+
+def _percentiles(latencies: list) -> dict:
+    """Перцентили задержки в миллисекундах"""
+    values = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(values.mean()), 3),
+        'max_ms': round(float(values.max()), 3)
+    }
+
+
+async def _run_scenario(client, path: str, payloads: list, records_per_request: int,
+                        requests: int, concurrency: int, warmup: int) -> dict:
+    """Прогон одного сценария: warmup, затем requests запросов в concurrency потоков"""
+    for i in range(warmup):
+        await client.post(path, json=payloads[i % len(payloads)])
+
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            payload = payloads[i % len(payloads)]
+            started = time.perf_counter()
+            response = await client.post(path, json=payload)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'path': path,
+        'concurrency': concurrency,
+        'requests': requests,
+        'records_per_request': records_per_request,
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(requests / elapsed, 1),
+        'records_per_second': round(requests * records_per_request / elapsed, 1),
+        **_percentiles(latencies)
+    }
+
+
+def benchmark_data(n_rows: int = DEFAULT_TRAIN_ROWS, seed: int = DEFAULT_SEED):
+    """
+    Прототипные данные с целевой переменной, зависящей от признаков.
+    У generate_prototype_data target - случайный шум, детектор переобучения
+    сокращает модель до одного дерева, и бенчмарк замерял бы тривиальную модель.
+    """
+    from train_model import generate_prototype_data
+
+    df = generate_prototype_data(n_rows=n_rows, seed=seed)
+    rng = np.random.RandomState(seed + 1)
+
+    debt_ratio = (df['amt_credit'] / df['amt_income_total']).clip(upper=10) / 5
+    logit = (
+        -1.5 + 2.5 * debt_ratio
+        - 2.0 * (df['ext_source_2'] + df['ext_source_3'] - 1)
+        + 0.4 * (df['region_rating_client'] - 2)
+        + 0.3 * (df['flag_own_car'] == 'N')
+        + 0.2 * df['cnt_children']
+        + rng.normal(0, 0.5, n_rows)
+    )
+    df['target'] = (rng.uniform(size=n_rows) < 1 / (1 + np.exp(-logit))).astype(int)
+
+    return df
+
+
+def _request_records(df, cat_columns: list) -> list:
+    """
+    Записи признаков для запросов.
+    API принимает только числа, категориальные признаки передаются
+    кодами (для модели это неизвестная категория, путь скоринга тот же).
+    """
+    features = df.drop(columns=['sk_id_curr', 'target'])
+    for col in cat_columns:
+        features[col] = features[col].astype('category').cat.codes.astype(float)
+    return features.astype(float).to_dict(orient='records')
+
+
+def _scenarios(records: list, batch_sizes: tuple, model_loaded: bool) -> list:
+    """Сценарии (имя, путь, payloads, записей в запросе) для фазы без модели или с моделью"""
+    rng = random.Random(DEFAULT_SEED)
+    scenarios = []
+
+    def batches(size: int) -> list:
+        return [
+            {'features_list': rng.sample(records, size) if size <= len(records) else rng.choices(records, k=size)}
+            for _ in range(16)
+        ]
+
+    if not model_loaded:
+        scenarios.append(('predict_heuristic_fallback', '/ml/predict',
+                          [{'features': record} for record in records], 1))
+        scenarios.append(('batch_heuristic_fallback_100', '/ml/predict/batch', batches(100), 100))
+        return scenarios
+
+    scenarios.append(('predict', '/ml/predict', [{'features': record} for record in records], 1))
+    scenarios.append(('predict_shap', '/ml/predict',
+                      [{'features': record, 'importance_type': 'shap'} for record in records], 1))
+
+    for size in batch_sizes:
+        scenarios.append((f'batch_{size}', '/ml/predict/batch', batches(size), size))
+
+    # Записи без части признаков: ошибка модели и fallback на эвристику
+    partial = [{'features': {k: v for k, v in list(record.items())[:5]}} for record in records]
+    scenarios.append(('predict_fallback_after_error', '/ml/predict', partial, 1))
+
+    return scenarios
+
+
+async def _run_phase(app_module, scenarios: list, concurrency_levels: tuple,
+                     requests: int, warmup: int) -> dict:
+    import httpx
+
+    results = {}
+    transport = httpx.ASGITransport(app=app_module.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=600) as client:
+        for name, path, payloads, records_per_request in scenarios:
+            for concurrency in concurrency_levels:
+                key = f'{name}@c{concurrency}'
+                results[key] = await _run_scenario(
+                    client, path, payloads, records_per_request, requests, concurrency, warmup
+                )
+                result = results[key]
+                print(f"{key:45s} p50={result['p50_ms']:8.3f} ms  p95={result['p95_ms']:8.3f} ms  "
+                      f"p99={result['p99_ms']:8.3f} ms  {result['throughput_rps']:9.1f} req/s  "
+                      f"errors={result['errors']}", file=sys.stderr)
+
+    return results
+
+
+def run_benchmark(batch_sizes: tuple = DEFAULT_BATCH_SIZES,
+                  concurrency_levels: tuple = DEFAULT_CONCURRENCY,
+                  requests: int = DEFAULT_REQUESTS, warmup: int = DEFAULT_WARMUP,
+                  seed: int = DEFAULT_SEED, model_dir: str = None,
+                  prediction_cache: bool = False, train_rows: int = DEFAULT_TRAIN_ROWS) -> dict:
+    """
+    Полный прогон: фаза без модели (fallback), обучение, фаза с моделью.
+    Реестр моделей - временная директория (или model_dir), кэш
+    предсказаний по умолчанию выключен, чтобы замерять саму модель.
+    """
+    model_dir = model_dir or tempfile.mkdtemp(prefix='mlservice-bench-')
+
+    # Модули сервиса читают настройки при импорте
+    os.environ['ML_MODEL_DIR'] = model_dir
+    os.environ['ML_PREDICTION_CACHE_ENABLED'] = 'true' if prediction_cache else 'false'
+
+    import catboost
+    import app as app_module
+    from model_manager import reload_model
+    from train_model import train_pipeline
+    from executors import CPU_COUNT, INFERENCE_WORKERS, CATBOOST_THREAD_COUNT
+
+    df = benchmark_data(train_rows, seed)
+    records = _request_records(df, ['code_gender', 'flag_own_car', 'flag_own_realty', 'organization_type'])
+
+    results = {}
+    results.update(asyncio.run(_run_phase(
+        app_module, _scenarios(records, batch_sizes, model_loaded=False),
+        concurrency_levels, requests, warmup
+    )))
+
+    started = time.perf_counter()
+    training = train_pipeline(df=df)
+    train_seconds = time.perf_counter() - started
+    if not training.get('success'):
+        raise RuntimeError(f"Training failed: {training.get('error')}")
+    tree_count = reload_model().model.tree_count_
+
+    results.update(asyncio.run(_run_phase(
+        app_module, _scenarios(records, batch_sizes, model_loaded=True),
+        concurrency_levels, requests, warmup
+    )))
+
+    return {
+        'generated_at': datetime.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'catboost': catboost.__version__,
+            'numpy': np.__version__,
+            'cpu_count': CPU_COUNT,
+            'inference_workers': INFERENCE_WORKERS,
+            'catboost_thread_count': CATBOOST_THREAD_COUNT
+        },
+        'config': {
+            'batch_sizes': list(batch_sizes),
+            'concurrency': list(concurrency_levels),
+            'requests': requests,
+            'warmup': warmup,
+            'seed': seed,
+            'train_rows': train_rows,
+            'prediction_cache': prediction_cache
+        },
+        'training': {
+            'seconds': round(train_seconds, 3),
+            'model_version': training.get('model_version'),
+            'metrics': training.get('metrics'),
+            'tree_count': tree_count
+        },
+        'scenarios': results
+    }
+
+
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """
+    Сравнение сценариев с baseline.
+    Регрессия - p95 выше baseline больше чем на tolerance или
+    пропускная способность ниже больше чем на tolerance.
+    """
+    rows = []
+
+    for key, current in report['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(key)
+        if base is None:
+            continue
+
+        p95_change = current['p95_ms'] / base['p95_ms'] - 1 if base['p95_ms'] else 0.0
+        throughput_change = current['throughput_rps'] / base['throughput_rps'] - 1 if base['throughput_rps'] else 0.0
+
+        rows.append({
+            'scenario': key,
+            'p95_ms': current['p95_ms'],
+            'baseline_p95_ms': base['p95_ms'],
+            'p95_change': round(p95_change, 4),
+            'throughput_rps': current['throughput_rps'],
+            'baseline_throughput_rps': base['throughput_rps'],
+            'throughput_change': round(throughput_change, 4),
+            'regression': p95_change > tolerance or throughput_change < -tolerance
+        })
+
+    return rows
+
+
+def _int_list(value: str) -> tuple:
+    return tuple(int(item) for item in value.split(',') if item.strip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк endpoints ML-сервиса')
+    parser.add_argument('--batch-sizes', type=_int_list, default=DEFAULT_BATCH_SIZES,
+                        help='Размеры батчей через запятую')
+    parser.add_argument('--concurrency', type=_int_list, default=DEFAULT_CONCURRENCY,
+                        help='Уровни конкурентности через запятую')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='Запросов на сценарий')
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--train-rows', type=int, default=DEFAULT_TRAIN_ROWS,
+                        help='Строк синтетических данных для обучения')
+    parser.add_argument('--model-dir', default=None, help='Директория реестра (по умолчанию временная)')
+    parser.add_argument('--prediction-cache', action='store_true', help='Не выключать кэш предсказаний')
+    parser.add_argument('--output', default=None, help='Файл для результатов (JSON)')
+    parser.add_argument('--baseline', default=None, help='Результаты для сравнения (JSON)')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Допустимое ухудшение p95/throughput (доля)')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help='Не подавлять логи сервиса')
+    args = parser.parse_args(argv)
+
+    # Логи сервиса на каждый запрос искажают замеры
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if not args.verbose:
+        logging.disable(logging.ERROR)
+
+    report = run_benchmark(
+        batch_sizes=args.batch_sizes,
+        concurrency_levels=args.concurrency,
+        requests=args.requests,
+        warmup=args.warmup,
+        seed=args.seed,
+        model_dir=args.model_dir,
+        prediction_cache=args.prediction_cache,
+        train_rows=args.train_rows
+    )
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report['comparison'] = compare_with_baseline(report, baseline, args.tolerance)
+        regressions = [row for row in report['comparison'] if row['regression']]
+
+        # Время predict_proba зависит от размера модели
+        baseline_trees = baseline.get('training', {}).get('tree_count')
+        if baseline_trees is not None and baseline_trees != report['training']['tree_count']:
+            print(f"WARNING: model has {report['training']['tree_count']} trees, baseline {baseline_trees}, "
+                  f"scenarios with the model are not comparable", file=sys.stderr)
+
+        for row in report['comparison']:
+            mark = 'REGRESSION' if row['regression'] else 'ok'
+            print(f"{row['scenario']:45s} p95 {row['p95_change']:+7.1%}  "
+                  f"throughput {row['throughput_change']:+7.1%}  {mark}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""
+Офлайн bulk-скоринг портфеля.
+Читает витрину (или произвольную таблицу/запрос) из Greenplum
+server-side курсором по чанкам, скорит чанки моделью в пуле процессов
+и пишет результаты пачками через COPY в таблицу скоринга.
+
+Запуск из CLI:
+    python bulk_score.py --source training_mart.homecredit_features --workers 4
+
+Из Airflow - PythonOperator(python_callable=bulk_score, op_kwargs={...}).
+"""
+
+import io
+import os
+import json
+import time
+import hashlib
+import argparse
+import resource
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import logging
+
+import numpy as np
+import pandas as pd
+
+from model_registry import current_dir
+from model_manager import load_bundle, preprocess_frame
+from executors import CPU_COUNT
+from columnar import map_columns, ID_COLUMN
+from greenplum import connect_greenplum
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCE = 'training_mart.homecredit_features'
+DEFAULT_TARGET_TABLE = 'dv_sat_scoring_result'
+DEFAULT_CHUNK_SIZE = int(os.environ.get('ML_BULK_CHUNK_SIZE', '50000'))
+DEFAULT_WORKERS = int(os.environ.get('ML_BULK_WORKERS', str(max(1, CPU_COUNT - 1))))
+RECORD_SOURCE = 'mlservice:bulk_score'
+
+# Bundle модели в процессе-воркере пула
+_worker_bundle = None
+_worker_thread_count = 1
+
+
+def hk_application(sk_id_curr) -> str:
+    """Hash-ключ хаба заявки (как в ETL Data Vault)"""
+    return hashlib.md5(f'application|{sk_id_curr}'.encode('utf-8')).hexdigest()
+
+
+def _init_worker(bundle_dir: str, thread_count: int):
+    """Загрузка модели один раз на процесс пула"""
+    global _worker_bundle, _worker_thread_count
+
+    from pathlib import Path
+
+    _worker_bundle = load_bundle(Path(bundle_dir))
+    _worker_thread_count = thread_count
+
+
+def score_chunk(df: pd.DataFrame, bundle=None, thread_count: int = None) -> tuple:
+    """
+    Скоринг одного чанка.
+    Возвращает (sk_id_curr, вероятности, confidence, время предобработки, время predict_proba).
+    """
+    bundle = bundle or _worker_bundle
+    thread_count = thread_count or _worker_thread_count
+    features_info = bundle.features
+    expected_columns = features_info['columns']
+    cat_features = {expected_columns[idx] for idx in features_info['categorical_indices']}
+
+    started = time.perf_counter()
+
+    mapping = map_columns(list(df.columns), expected_columns + [ID_COLUMN])
+    df = df.rename(columns=mapping)
+    ids = df[ID_COLUMN].to_numpy()
+
+    # NUMERIC из БД приходит как Decimal (object), приводим к числам
+    for col in expected_columns:
+        if col in df.columns and col not in cat_features and df[col].dtype == object:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    features_df = preprocess_frame(df, bundle)
+    preprocess_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    probas = bundle.model.predict_proba(features_df, thread_count=thread_count)[:, 1]
+    predict_seconds = time.perf_counter() - started
+
+    confidences = np.clip(0.65 + 0.3 * np.abs(0.5 - probas), 0.01, 0.99)
+
+    return ids, probas, confidences, preprocess_seconds, predict_seconds
+
+
+def _write_results(conn, target_table: str, ids, probas, confidences,
+                   model_version: str, load_dts: datetime) -> int:
+    """Запись результатов чанка одной командой COPY"""
+    load_dts_text = load_dts.isoformat(sep=' ')
+    probas = np.round(probas, 6)
+    confidences = np.round(confidences, 6)
+
+    frame = pd.DataFrame({
+        'hk_application': [hk_application(sk_id) for sk_id in ids],
+        'hashdiff': [
+            hashlib.md5(f'{p}|{model_version}|{c}'.encode('utf-8')).hexdigest()
+            for p, c in zip(probas, confidences)
+        ],
+        'default_probability': probas,
+        'model_version': model_version,
+        'confidence': confidences,
+        'record_source': RECORD_SOURCE,
+        'load_dts': load_dts_text,
+        'effective_from': load_dts_text
+    })
+
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    with conn.cursor() as cur:
+        cur.copy_expert(
+            f"COPY {target_table} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    conn.commit()
+
+    return len(frame)
+
+
+def _peak_memory_mb() -> dict:
+    """Пиковая память основного процесса и процессов пула (МБ)"""
+    return {
+        'main_peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'workers_peak_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    }
+
+
+def bulk_score(source: str = DEFAULT_SOURCE, query: str = None,
+               target_table: str = DEFAULT_TARGET_TABLE,
+               chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = DEFAULT_WORKERS,
+               limit: int = None, write: bool = True) -> dict:
+    """
+    Bulk-скоринг таблицы или запроса.
+    workers=0 - скоринг в текущем процессе без пула.
+    Возвращает отчет: строки, rows/sec, пиковая память, время по этапам.
+    """
+    started = time.perf_counter()
+    load_dts = datetime.now()
+
+    # Версия фиксируется на весь прогон, воркеры грузят ту же директорию
+    bundle_dir = current_dir()
+    bundle = load_bundle(bundle_dir)
+    model_version = bundle.version
+
+    if query is None:
+        query = f"SELECT * FROM {source}"
+    if limit is not None:
+        query = f"SELECT * FROM ({query}) AS bulk_source LIMIT {int(limit)}"
+
+    thread_count = max(1, CPU_COUNT // max(1, workers))
+    timings = {'read': 0.0, 'preprocess': 0.0, 'predict': 0.0, 'write': 0.0}
+    total_rows = 0
+    chunks = 0
+
+    read_conn = connect_greenplum()
+    write_conn = connect_greenplum() if write else None
+    executor = None
+
+    if workers > 0:
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(str(bundle_dir), thread_count)
+        )
+
+    def collect(result):
+        nonlocal total_rows
+        ids, probas, confidences, preprocess_seconds, predict_seconds = result
+        timings['preprocess'] += preprocess_seconds
+        timings['predict'] += predict_seconds
+
+        if write_conn is not None:
+            write_started = time.perf_counter()
+            _write_results(write_conn, target_table, ids, probas, confidences, model_version, load_dts)
+            timings['write'] += time.perf_counter() - write_started
+
+        total_rows += len(ids)
+
+    try:
+        # Именованный курсор - server-side, строки приходят порциями
+        with read_conn.cursor(name='mlservice_bulk_score') as cur:
+            cur.itersize = chunk_size
+            cur.execute(query)
+
+            pending = []
+            columns = None
+
+            while True:
+                read_started = time.perf_counter()
+                rows = cur.fetchmany(chunk_size)
+                if columns is None and cur.description is not None:
+                    columns = [desc[0] for desc in cur.description]
+                timings['read'] += time.perf_counter() - read_started
+
+                if not rows:
+                    break
+
+                chunk = pd.DataFrame.from_records(rows, columns=columns)
+                chunks += 1
+
+                if executor is None:
+                    collect(score_chunk(chunk, bundle, thread_count))
+                    continue
+
+                pending.append(executor.submit(score_chunk, chunk))
+
+                # Не больше 2 чанков на воркер в полете - память ограничена
+                while len(pending) >= workers * 2:
+                    collect(pending.pop(0).result())
+
+            for future in pending:
+                collect(future.result())
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        read_conn.close()
+        if write_conn is not None:
+            write_conn.close()
+
+    elapsed = time.perf_counter() - started
+
+    report = {
+        'source': query,
+        'target_table': target_table if write else None,
+        'model_version': model_version,
+        'load_dts': load_dts.isoformat(),
+        'rows': total_rows,
+        'chunks': chunks,
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(total_rows / elapsed, 1) if elapsed > 0 else 0.0,
+        'stage_seconds': {stage: round(value, 3) for stage, value in timings.items()},
+        **_peak_memory_mb()
+    }
+
+    logger.info(f"Bulk scoring finished: {report}")
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-скоринг портфеля моделью ML-сервиса')
+    parser.add_argument('--source', default=DEFAULT_SOURCE, help='Таблица с признаками')
+    parser.add_argument('--query', default=None, help='Произвольный SELECT вместо таблицы')
+    parser.add_argument('--target-table', default=DEFAULT_TARGET_TABLE, help='Таблица для результатов')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='Процессов для скоринга (0 - в текущем процессе)')
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--dry-run', action='store_true', help='Не записывать результаты')
+    args = parser.parse_args(argv)
+
+    report = bulk_score(
+        source=args.source,
+        query=args.query,
+        target_table=args.target_table,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        limit=args.limit,
+        write=not args.dry_run
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
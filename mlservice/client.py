@@ -0,0 +1,104 @@
+"""
+Python-клиент колоночного скоринга ML-сервиса.
+Отправляет признаки в Arrow IPC stream или Parquet и получает
+вероятности колонками, выровненными по sk_id_curr. Для JSON-батчей -
+компактный ответ /ml/predict/batch параллельными массивами.
+"""
+
+import io
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import httpx
+
+ML_SERVICE_URL = os.environ.get('ML_SERVICE_URL', 'http://mlservice:8001')
+
+ARROW_STREAM_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+PARQUET_MEDIA_TYPE = 'application/vnd.apache.parquet'
+
+
+def _serialize_arrow(table: pa.Table) -> bytes:
+    """Сериализация таблицы в Arrow IPC stream"""
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def predict_columnar(data, base_url: str = ML_SERVICE_URL,
+                     response_format: str = 'arrow', timeout: float = 600) -> pa.Table:
+    """
+    Колоночный скоринг через /ml/predict/columnar.
+    data - pyarrow.Table, pandas.DataFrame или путь к Parquet-файлу
+    (файл отправляется как есть, без чтения в память клиента по строкам).
+    Возвращает таблицу sk_id_curr, default_probability, prediction, confidence;
+    версия модели - в table.schema.metadata[b'model_version'], число строк,
+    посчитанных эвристикой без модели, - в metadata[b'fallback_count'].
+    """
+    if isinstance(data, (str, Path)):
+        payload = Path(data).read_bytes()
+        content_type = PARQUET_MEDIA_TYPE
+    else:
+        if isinstance(data, pd.DataFrame):
+            data = pa.Table.from_pandas(data, preserve_index=False)
+        payload = _serialize_arrow(data)
+        content_type = ARROW_STREAM_MEDIA_TYPE
+
+    response = httpx.post(
+        f"{base_url}/ml/predict/columnar",
+        params={'response_format': response_format},
+        content=payload,
+        headers={'Content-Type': content_type},
+        timeout=timeout
+    )
+    response.raise_for_status()
+
+    if response_format == 'parquet':
+        table = pq.read_table(io.BytesIO(response.content))
+    else:
+        table = pa.ipc.open_stream(response.content).read_all()
+
+    return table.replace_schema_metadata({
+        'model_version': response.headers.get('X-Model-Version', ''),
+        'fallback_count': response.headers.get('X-Fallback-Count', '0')
+    })
+
+
+def predict_batch_arrays(features_list: list, base_url: str = ML_SERVICE_URL,
+                         response_format: str = 'float32', timeout: float = 600) -> dict:
+    """
+    Батч-скоринг через /ml/predict/batch с компактным ответом.
+    response_format=float32 - сырые float32 колонки, columns - JSON с массивами.
+    Возвращает {default_probability, prediction, confidence: numpy-массивы,
+    model_version, fallback_count}.
+    """
+    response = httpx.post(
+        f"{base_url}/ml/predict/batch",
+        params={'response_format': response_format},
+        json={'features_list': features_list},
+        timeout=timeout
+    )
+    response.raise_for_status()
+
+    if response_format == 'columns':
+        body = response.json()
+        return {
+            'default_probability': np.asarray(body['default_probability'], dtype=np.float64),
+            'prediction': np.asarray(body['prediction'], dtype=np.int8),
+            'confidence': np.asarray(body['confidence'], dtype=np.float64),
+            'model_version': body['model_version'],
+            'fallback_count': body['fallback_count']
+        }
+
+    columns = response.headers['X-Columns'].split(',')
+    values = np.frombuffer(response.content, dtype='<f4').reshape(len(columns), -1)
+    result = dict(zip(columns, values))
+    result['prediction'] = result['prediction'].astype(np.int8)
+    result['model_version'] = response.headers.get('X-Model-Version', '')
+    result['fallback_count'] = int(response.headers.get('X-Fallback-Count', '0'))
+
+    return result
@@ -0,0 +1,180 @@
+"""
+Колоночный батч-скоринг ML-сервиса (Arrow IPC stream / Parquet).
+Признаки читаются колонками без преобразования записей в dict,
+результат возвращается колонками, выровненными по sk_id_curr.
+"""
+
+import io
+import time
+import logging
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from model_manager import get_bundle, predict_frame
+from heuristic import HEURISTIC_FEATURES, heuristic_columns
+from metrics import STAGE_PARSE, STAGE_SERIALIZE, BATCH_SIZE_COLUMNAR
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ARROW_STREAM_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+PARQUET_MEDIA_TYPE = 'application/vnd.apache.parquet'
+
+FORMAT_ARROW = 'arrow'
+FORMAT_PARQUET = 'parquet'
+
+MEDIA_TYPES = {
+    FORMAT_ARROW: ARROW_STREAM_MEDIA_TYPE,
+    FORMAT_PARQUET: PARQUET_MEDIA_TYPE
+}
+
+# Колонка идентификатора заявки
+ID_COLUMN = 'sk_id_curr'
+
+
+def format_from_media_type(media_type: str) -> str:
+    """Формат входа по Content-Type (по умолчанию Arrow IPC stream)"""
+    media_type = (media_type or '').split(';')[0].strip().lower()
+
+    if media_type in (PARQUET_MEDIA_TYPE, 'application/x-parquet', 'application/parquet'):
+        return FORMAT_PARQUET
+
+    return FORMAT_ARROW
+
+
+def map_columns(source_columns: list, expected_columns: list) -> dict:
+    """
+    Сопоставление колонок входа с колонками feature_columns.json.
+    Имена сравниваются без учета регистра (AMT_CREDIT -> amt_credit).
+    Возвращает {колонка входа: колонка модели}.
+    """
+    by_lower = {}
+    for col in source_columns:
+        by_lower.setdefault(col.lower(), col)
+
+    mapping = {}
+    for col in expected_columns:
+        source = col if col in source_columns else by_lower.get(col.lower())
+        if source is not None:
+            mapping[source] = col
+
+    return mapping
+
+
+def _read_table(payload: bytes, input_format: str, expected_columns: list) -> tuple:
+    """
+    Чтение только нужных колонок входа.
+    Для Parquet колонки выбираются при чтении файла.
+    Возвращает (таблица, {колонка входа: колонка модели}, колонка id или None).
+    """
+    if input_format == FORMAT_PARQUET:
+        source_columns = pq.read_schema(io.BytesIO(payload)).names
+    else:
+        reader = pa.ipc.open_stream(payload)
+        source_columns = reader.schema.names
+
+    mapping = map_columns(source_columns, expected_columns)
+    id_source = map_columns(source_columns, [ID_COLUMN])
+    id_column = next(iter(id_source), None)
+
+    selected = list(mapping) + ([id_column] if id_column and id_column not in mapping else [])
+
+    if input_format == FORMAT_PARQUET:
+        table = pq.read_table(io.BytesIO(payload), columns=selected)
+    else:
+        table = reader.read_all().select(selected)
+
+    return table, mapping, id_column
+
+
+def _write_table(table: pa.Table, output_format: str) -> bytes:
+    """Сериализация результата в Arrow IPC stream или Parquet"""
+    sink = io.BytesIO()
+
+    if output_format == FORMAT_PARQUET:
+        pq.write_table(table, sink)
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    return sink.getvalue()
+
+
+def _result_table(table: pa.Table, id_column: str, result: dict) -> pa.Table:
+    """Таблица результата, выровненная по sk_id_curr (или row_index)"""
+    if id_column is not None:
+        id_name, ids = ID_COLUMN, table.column(id_column)
+    else:
+        id_name, ids = 'row_index', pa.array(np.arange(table.num_rows, dtype=np.int64))
+
+    return pa.table({
+        id_name: ids,
+        'default_probability': pa.array(np.asarray(result['default_probability'], dtype=np.float32)),
+        'prediction': pa.array(result['prediction']),
+        'confidence': pa.array(np.asarray(result['confidence'], dtype=np.float32))
+    })
+
+
+def score_columnar(payload: bytes, input_format: str = FORMAT_ARROW,
+                   output_format: str = FORMAT_ARROW) -> tuple:
+    """
+    Скоринг колоночного входа.
+    Возвращает (сериализованная таблица результата, версия модели, число строк).
+    Колонки результата: sk_id_curr (или row_index), default_probability,
+    prediction, confidence.
+    """
+    expected_columns = get_bundle().features['columns']
+
+    started = time.perf_counter()
+    table, mapping, id_column = _read_table(payload, input_format, expected_columns)
+
+    missing = [col for col in expected_columns if col not in mapping.values()]
+    if missing:
+        raise ValueError(f"Missing feature columns: {missing}")
+
+    features_df = table.select(list(mapping)).to_pandas()
+    features_df.columns = [mapping[col] for col in features_df.columns]
+    STAGE_PARSE.observe(time.perf_counter() - started)
+    BATCH_SIZE_COLUMNAR.observe(table.num_rows)
+
+    if id_column is not None:
+        result = predict_frame(features_df, table.column(id_column).to_numpy())
+    else:
+        result = predict_frame(features_df)
+
+    started = time.perf_counter()
+    payload = _write_table(_result_table(table, id_column, result), output_format)
+    STAGE_SERIALIZE.observe(time.perf_counter() - started)
+
+    return payload, result['model_version'], table.num_rows
+
+
+def score_columnar_heuristic(payload: bytes, input_format: str = FORMAT_ARROW,
+                             output_format: str = FORMAT_ARROW) -> tuple:
+    """
+    Колоночный скоринг эвристикой (модель не загружена или не отработала).
+    Читаются только колонки признаков эвристики, отсутствующие колонки и
+    пропуски заменяются значениями по умолчанию, как в heuristic_arrays.
+    Возвращает (сериализованная таблица результата, число строк).
+    """
+    table, mapping, id_column = _read_table(payload, input_format, list(HEURISTIC_FEATURES))
+    sources = {col: source for source, col in mapping.items()}
+
+    columns = {}
+    for name, default in HEURISTIC_FEATURES.items():
+        if name in sources:
+            values = table.column(sources[name]).to_numpy(zero_copy_only=False).astype(np.float64)
+            columns[name] = np.where(np.isnan(values), default, values)
+        else:
+            columns[name] = np.full(table.num_rows, default, dtype=np.float64)
+
+    result = heuristic_columns(columns)
+
+    started = time.perf_counter()
+    payload = _write_table(_result_table(table, id_column, result), output_format)
+    STAGE_SERIALIZE.observe(time.perf_counter() - started)
+
+    return payload, table.num_rows
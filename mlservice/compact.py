@@ -0,0 +1,46 @@
+"""
+Компактные форматы ответа батч-скоринга.
+Вместо dict на каждую запись результаты отдаются параллельными
+массивами: JSON (orjson сериализует массивы numpy напрямую) или
+сырые little-endian float32 колонки без JSON.
+"""
+
+import orjson
+import numpy as np
+
+FORMAT_RECORDS = 'records'
+FORMAT_COLUMNS = 'columns'
+FORMAT_FLOAT32 = 'float32'
+
+JSON_MEDIA_TYPE = 'application/json'
+FLOAT32_MEDIA_TYPE = 'application/octet-stream'
+
+# Порядок колонок в бинарном ответе: n значений каждой подряд
+FLOAT32_COLUMNS = ('default_probability', 'prediction', 'confidence')
+
+
+def columns_payload(arrays: dict, meta: dict) -> bytes:
+    """
+    JSON с параллельными массивами default_probability, prediction,
+    confidence (вероятности округлены до 4 знаков, как в построчном ответе)
+    и метаданными ответа.
+    """
+    payload = {
+        **meta,
+        'default_probability': np.round(arrays['default_probability'], 4),
+        'prediction': np.asarray(arrays['prediction'], dtype=np.int8),
+        'confidence': np.round(arrays['confidence'], 4)
+    }
+    if arrays.get('feature_importances') is not None:
+        payload['feature_importances'] = arrays['feature_importances']
+
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def float32_payload(arrays: dict) -> bytes:
+    """Колонки FLOAT32_COLUMNS одна за другой, little-endian float32 (12 байт на запись)"""
+    columns = np.empty((len(FLOAT32_COLUMNS), len(arrays['default_probability'])), dtype='<f4')
+    for i, name in enumerate(FLOAT32_COLUMNS):
+        columns[i] = arrays[name]
+
+    return columns.tobytes()
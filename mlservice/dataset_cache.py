@@ -0,0 +1,265 @@
+"""
+Кэш предобработанных датасетов для повторного обучения.
+Запись кэша - train/valid выборки после preprocess_data в Parquet
+и артефакты предобработки (encoders, таблицы кодирования, список
+признаков). Ключ - хэш отпечатка источника (число строк и max load_dts
+витрины или размер и mtime файла) и версии предобработки, поэтому
+при неизменных данных загрузка и предобработка пропускаются целиком.
+Размер кэша ограничен, старые записи вытесняются по LRU (mtime записи
+обновляется при каждом использовании).
+
+В той же записи хранится квантованный CatBoost Pool обучающей выборки
+(границы и квантование - один раз на отпечаток), его загружают
+последующие обучения и trials подбора гиперпараметров.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+from pathlib import Path
+from datetime import datetime
+import logging
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from catboost import Pool
+
+from model_registry import (
+    MODEL_DIR,
+    ENCODER_FILE,
+    ENCODING_TABLES_FILE,
+    FEATURES_FILE
+)
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATASET_CACHE_ENABLED = os.environ.get('ML_DATASET_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+DATASET_CACHE_DIR = Path(os.environ.get('ML_DATASET_CACHE_DIR', str(MODEL_DIR / 'dataset_cache')))
+DATASET_CACHE_MAX_MB = int(os.environ.get('ML_DATASET_CACHE_MAX_MB', '2048'))
+
+META_FILE = 'meta.json'
+TRAIN_FILE = 'train.parquet'
+VALID_FILE = 'valid.parquet'
+TARGET_COLUMN = '__target__'
+POOL_TRAIN_FILE = 'train.quantized'
+
+# Артефакты предобработки, копируемые в директорию версии
+ARTIFACT_FILES = (ENCODER_FILE, ENCODING_TABLES_FILE, FEATURES_FILE)
+
+
+def file_fingerprint(path: str) -> dict:
+    """Отпечаток файла датасета: путь, размер и время изменения"""
+    stat = os.stat(path)
+    return {
+        'path': os.path.realpath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+
+
+def dataset_key(fingerprint: dict, preprocessing_version: int) -> str:
+    """Ключ записи кэша - хэш отпечатка источника и версии предобработки"""
+    payload = json.dumps(
+        {'source': fingerprint, 'preprocessing_version': preprocessing_version},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+def _entry_dir(key: str) -> Path:
+    return DATASET_CACHE_DIR / key
+
+
+def _entry_size(path: Path) -> int:
+    return sum(item.stat().st_size for item in path.iterdir() if item.is_file())
+
+
+def _write_split(path: Path, X, y):
+    """Выборка с целевой переменной в отдельной колонке, без индекса"""
+    table = pa.Table.from_pandas(X, preserve_index=False)
+    table = table.append_column(TARGET_COLUMN, pa.array(y.to_numpy()))
+    pq.write_table(table, path)
+
+
+def _read_split(path: Path) -> tuple:
+    X = pq.read_table(path).to_pandas()
+    y = X.pop(TARGET_COLUMN)
+    y.name = 'target'
+    return X, y
+
+
+def load_dataset(key: str):
+    """
+    Предобработанный датасет из кэша (None при промахе).
+    Возвращает словарь с выборками, списком признаков, индексами
+    категориальных признаков и директорией артефактов.
+    """
+    if not DATASET_CACHE_ENABLED:
+        return None
+
+    entry = _entry_dir(key)
+    meta_path = entry / META_FILE
+    if not meta_path.exists():
+        return None
+
+    started = time.perf_counter()
+    try:
+        meta = json.loads(meta_path.read_text())
+        X_train, y_train = _read_split(entry / TRAIN_FILE)
+        X_valid, y_valid = _read_split(entry / VALID_FILE)
+    except Exception as e:
+        # Поврежденная запись удаляется и пересобирается
+        logger.warning(f"Dataset cache entry {key} is unreadable, dropping it: {e}")
+        shutil.rmtree(entry, ignore_errors=True)
+        return None
+
+    # LRU: время последнего использования - mtime записи
+    os.utime(entry)
+
+    logger.info(f"Dataset cache hit {key}: {meta['rows']} rows in {time.perf_counter() - started:.2f} s")
+
+    return {
+        'key': key,
+        'X_train': X_train,
+        'X_valid': X_valid,
+        'y_train': y_train,
+        'y_valid': y_valid,
+        'feature_columns': meta['feature_columns'],
+        'cat_indices': meta['cat_indices'],
+        'artifacts_dir': entry
+    }
+
+
+def copy_artifacts(artifacts_dir: Path, output_dir: Path):
+    """Копирование артефактов предобработки в директорию версии"""
+    for name in ARTIFACT_FILES:
+        shutil.copyfile(artifacts_dir / name, output_dir / name)
+
+
+def quantize_train_pool(X_train, y_train, cat_features_indices: list, work_dir: Path) -> Path:
+    """
+    Квантование обучающей выборки, возвращает путь к сохраненному Pool.
+    Валидация не квантуется: у отдельно квантованного Pool свои индексы
+    значений категориальных признаков, и метрика на нем считалась бы
+    неверно, поэтому eval_set строится из исходной выборки.
+    """
+    train_path = work_dir / POOL_TRAIN_FILE
+
+    train_pool = Pool(X_train, y_train, cat_features=cat_features_indices)
+    train_pool.quantize()
+    train_pool.save(str(train_path))
+
+    return train_path
+
+
+def quantized_pool_path(key: str):
+    """Путь к квантованному Pool записи кэша (None, если его нет)"""
+    path = _entry_dir(key) / POOL_TRAIN_FILE
+    if not DATASET_CACHE_ENABLED or not path.exists():
+        return None
+    return path
+
+
+def store_quantized_pool(key: str, X_train, y_train, cat_features_indices: list):
+    """
+    Квантование обучающей выборки и сохранение Pool в запись кэша
+    (временный файл внутри записи и rename). Возвращает путь или None,
+    если записи нет (кэш выключен или выборки не сохранились).
+    """
+    entry = _entry_dir(key)
+    if not DATASET_CACHE_ENABLED or not (entry / META_FILE).exists():
+        return None
+
+    started = time.perf_counter()
+    tmp_dir = entry / f'.pool.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    try:
+        tmp_dir.mkdir()
+        tmp_path = quantize_train_pool(X_train, y_train, cat_features_indices, tmp_dir)
+        os.replace(tmp_path, entry / POOL_TRAIN_FILE)
+    except OSError as e:
+        logger.warning(f"Quantized pool for {key} not stored: {e}")
+        return None
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    logger.info(f"Quantized pool for {key} stored in {time.perf_counter() - started:.2f} s")
+
+    evict()
+    return quantized_pool_path(key)
+
+
+def store_dataset(key: str, fingerprint: dict, preprocessing_version: int,
+                  X_train, X_valid, y_train, y_valid,
+                  feature_columns: list, cat_indices: list, artifacts_dir: Path):
+    """
+    Запись предобработанного датасета в кэш.
+    Запись собирается во временной директории и публикуется rename,
+    затем кэш ужимается до DATASET_CACHE_MAX_MB.
+    """
+    if not DATASET_CACHE_ENABLED:
+        return
+
+    entry = _entry_dir(key)
+    if entry.exists():
+        return
+
+    DATASET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_entry = DATASET_CACHE_DIR / f'.{key}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_entry, ignore_errors=True)
+    tmp_entry.mkdir()
+
+    try:
+        _write_split(tmp_entry / TRAIN_FILE, X_train, y_train)
+        _write_split(tmp_entry / VALID_FILE, X_valid, y_valid)
+        for name in ARTIFACT_FILES:
+            shutil.copyfile(artifacts_dir / name, tmp_entry / name)
+
+        (tmp_entry / META_FILE).write_text(json.dumps({
+            'key': key,
+            'fingerprint': fingerprint,
+            'preprocessing_version': preprocessing_version,
+            'rows': len(X_train) + len(X_valid),
+            'feature_columns': feature_columns,
+            'cat_indices': cat_indices,
+            'created_at': datetime.now().isoformat()
+        }, default=str))
+
+        os.rename(tmp_entry, entry)
+    except OSError as e:
+        # Параллельная запись того же ключа или нехватка места - кэш не обязателен
+        logger.warning(f"Dataset cache entry {key} not stored: {e}")
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        return
+
+    logger.info(f"Dataset cache entry {key} stored ({_entry_size(entry) / 1024 / 1024:.1f} MB)")
+
+    evict()
+
+
+def evict(max_mb: int = DATASET_CACHE_MAX_MB):
+    """Вытеснение давно неиспользованных записей, пока кэш больше max_mb"""
+    if not DATASET_CACHE_DIR.exists():
+        return
+
+    entries = sorted(
+        (path for path in DATASET_CACHE_DIR.iterdir() if path.is_dir() and not path.name.startswith('.')),
+        key=lambda path: path.stat().st_mtime
+    )
+    sizes = {path: _entry_size(path) for path in entries}
+    total = sum(sizes.values())
+
+    # Самая свежая запись остается, даже если одна превышает лимит
+    for path in entries[:-1]:
+        if total <= max_mb * 1024 * 1024:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= sizes[path]
+        logger.info(f"Dataset cache entry {path.name} evicted")
+
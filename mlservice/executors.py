@@ -0,0 +1,55 @@
+"""
+Пулы исполнения ML-сервиса.
+Инференс выполняется в выделенном ограниченном пуле потоков,
+обучение - в отдельном процессе (training_jobs), event loop остается свободным
+для health/status запросов.
+"""
+
+import os
+import asyncio
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _available_cpus() -> int:
+    """Количество CPU, доступных процессу (с учетом affinity контейнера)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+CPU_COUNT = _available_cpus()
+
+# Воркеры gunicorn (gunicorn.conf.py), потоки инференса на воркер и потоки
+# CatBoost на один вызов predict_proba, вместе не больше доступных CPU
+GUNICORN_WORKERS = max(1, int(os.environ.get('ML_WORKERS', '1')))
+INFERENCE_WORKERS = int(os.environ.get('ML_INFERENCE_WORKERS', str(min(4, CPU_COUNT))))
+CATBOOST_THREAD_COUNT = int(os.environ.get(
+    'ML_CATBOOST_THREAD_COUNT', str(max(1, CPU_COUNT // (GUNICORN_WORKERS * INFERENCE_WORKERS)))
+))
+
+# Приоритет процесса обучения относительно воркеров инференса
+TRAINING_NICE = int(os.environ.get('ML_TRAINING_NICE', '10'))
+
+inference_executor = ThreadPoolExecutor(
+    max_workers=INFERENCE_WORKERS,
+    thread_name_prefix='inference'
+)
+
+
+def init_training_process():
+    """Понижение приоритета процесса обучения (training_jobs)"""
+    if TRAINING_NICE > 0:
+        os.nice(TRAINING_NICE)
+
+
+async def run_inference(fn, *args, **kwargs):
+    """Выполнение функции инференса в выделенном пуле потоков"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_executor, partial(fn, *args, **kwargs))
@@ -0,0 +1,517 @@
+"""
+Загрузка данных из Greenplum для обучения и скоринга.
+Типы колонок берутся из DDL таблицы (information_schema.columns):
+float32 для дробных, узкие целые, category для строк.
+
+Два способа выгрузки витрины:
+- copy: COPY (SELECT ...) TO STDOUT в CSV, поток сразу разбирается
+  многопоточным CSV-парсером pyarrow в колоночные массивы;
+- cursor: именованный (server-side) курсор чанками, каждый чанк
+  сразу приводится к компактным типам.
+Результат выгрузки можно кэшировать локально в Parquet.
+
+Запуск из CLI:
+    python greenplum.py --benchmark --limit 100000
+    python greenplum.py --output /tmp/homecredit_features.parquet
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import threading
+from pathlib import Path
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TRAINING_MART_TABLE = 'training_mart.homecredit_features'
+LOAD_CHUNK_SIZE = int(os.environ.get('ML_TRAIN_CHUNK_SIZE', '50000'))
+TRAIN_LOADER = os.environ.get('ML_TRAIN_LOADER', 'copy')
+PARQUET_CACHE_DIR = os.environ.get('ML_TRAIN_PARQUET_CACHE_DIR', '')
+PARQUET_CACHE_TTL = int(os.environ.get('ML_TRAIN_PARQUET_CACHE_TTL', '3600'))
+COPY_BLOCK_SIZE = 4 * 1024 * 1024
+
+LOADER_COPY = 'copy'
+LOADER_CURSOR = 'cursor'
+
+# Служебные колонки витрины, не являющиеся признаками
+MART_METADATA_COLUMNS = ('record_source', 'load_dts', 'update_dts')
+
+# Тип колонки в БД -> (dtype без NULL, dtype с NULL)
+_DTYPE_PLAN = {
+    'smallint': ('int16', 'float32'),
+    'integer': ('int32', 'float32'),
+    'bigint': ('int64', 'float64'),
+    'real': ('float32', 'float32'),
+    'double precision': ('float32', 'float32'),
+    'numeric': ('float32', 'float32'),
+    'boolean': ('int8', 'float32'),
+    'character varying': ('category', 'category'),
+    'character': ('category', 'category'),
+    'text': ('category', 'category'),
+    'date': ('datetime64[ns]', 'datetime64[ns]'),
+    'timestamp without time zone': ('datetime64[ns]', 'datetime64[ns]'),
+    'timestamp with time zone': ('datetime64[ns]', 'datetime64[ns]')
+}
+
+# Приведение в SELECT: CSV COPY пишет boolean как t/f
+_SELECT_CASTS = {
+    'boolean': 'smallint'
+}
+
+# dtype плана -> тип колонки при разборе CSV в pyarrow
+_ARROW_TYPES = {
+    'int8': pa.int8(),
+    'int16': pa.int16(),
+    'int32': pa.int32(),
+    'int64': pa.int64(),
+    'float32': pa.float32(),
+    'float64': pa.float64(),
+    'bool': pa.bool_(),
+    'category': pa.dictionary(pa.int32(), pa.string()),
+    'datetime64[ns]': pa.timestamp('ns'),
+    'object': pa.string()
+}
+
+
+def connect_greenplum():
+    """Подключение к Greenplum по переменным окружения GREENPLUM_*"""
+    import psycopg2
+
+    return psycopg2.connect(
+        host=os.environ.get('GREENPLUM_HOST', 'gpdb'),
+        port=os.environ.get('GREENPLUM_PORT', '5432'),
+        database=os.environ.get('GREENPLUM_DB', 'bank_dwh'),
+        user=os.environ.get('GREENPLUM_USER', 'bank_user'),
+        password=os.environ.get('GREENPLUM_PASSWORD', 'bank_pass')
+    )
+
+
+def table_columns(conn, table: str) -> list:
+    """Колонки таблицы из information_schema: [(имя, тип, допускает NULL)]"""
+    schema, name = table.split('.', 1) if '.' in table else ('public', table)
+
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT column_name, data_type, is_nullable = 'YES'
+            FROM information_schema.columns
+            WHERE table_schema = %s AND table_name = %s
+            ORDER BY ordinal_position
+            """,
+            (schema, name)
+        )
+        return cur.fetchall()
+
+
+def dtype_plan(columns: list, exclude: tuple = MART_METADATA_COLUMNS) -> dict:
+    """
+    План типов {колонка: dtype} по DDL.
+    Целые с NULL хранятся как float32 (NaN), дробные - float32,
+    строки - category, неизвестные типы - object.
+    """
+    plan = {}
+    for name, data_type, nullable in columns:
+        if name in exclude:
+            continue
+        not_null_dtype, nullable_dtype = _DTYPE_PLAN.get(data_type, ('object', 'object'))
+        plan[name] = nullable_dtype if nullable else not_null_dtype
+    return plan
+
+
+class _ColumnBuffer:
+    """Накопитель колонки по чанкам в целевом dtype"""
+
+    def __init__(self, dtype: str):
+        self.dtype = dtype
+        self.parts = []
+        self.categories = {} if dtype == 'category' else None
+
+    def append(self, values: tuple):
+        if self.categories is not None:
+            # Коды чанка переводятся в общий словарь категорий колонки
+            codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=True)
+            mapping = np.fromiter(
+                (self.categories.setdefault(value, len(self.categories)) for value in uniques),
+                dtype=np.int32,
+                count=len(uniques)
+            )
+            self.parts.append(np.where(codes >= 0, mapping[codes] if len(mapping) else -1, -1).astype(np.int32))
+        elif self.dtype.startswith('datetime64'):
+            self.parts.append(pd.to_datetime(pd.Series(values, dtype=object)).to_numpy(dtype=self.dtype))
+        elif self.dtype == 'object':
+            self.parts.append(np.asarray(values, dtype=object))
+        else:
+            # None -> NaN для float, Decimal приводится к float
+            self.parts.append(np.asarray(values, dtype=self.dtype))
+
+    def build(self):
+        values = np.concatenate(self.parts) if self.parts else np.empty(0, dtype=self.dtype)
+        self.parts = []
+
+        if self.categories is None:
+            return values
+
+        # from_codes хранит коды в минимальном целом типе (int8 для малых словарей)
+        return pd.Categorical.from_codes(values, categories=list(self.categories))
+
+
+def _peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _select_query(table: str, ddl: list, limit: int = None, exclude: tuple = MART_METADATA_COLUMNS) -> str:
+    """SELECT колонок плана в порядке DDL с приведениями _SELECT_CASTS"""
+    expressions = [
+        f"{name}::{_SELECT_CASTS[data_type]} AS {name}" if data_type in _SELECT_CASTS else name
+        for name, data_type, _ in ddl
+        if name not in exclude
+    ]
+    query = f"SELECT {', '.join(expressions)} FROM {table}"
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+    return query
+
+
+def load_table_chunked(table: str = TRAINING_MART_TABLE, chunk_size: int = LOAD_CHUNK_SIZE,
+                       conn=None, limit: int = None) -> tuple:
+    """
+    Загрузка таблицы server-side курсором чанками по chunk_size строк
+    с приведением типов по плану из DDL.
+    В памяти одновременно только один чанк в виде кортежей psycopg2,
+    остальные данные уже в компактных массивах.
+    Возвращает (DataFrame, отчет о загрузке).
+    """
+    own_conn = conn is None
+    conn = conn or connect_greenplum()
+    started = time.perf_counter()
+    rss_before = _peak_rss_mb()
+
+    try:
+        ddl = table_columns(conn, table)
+        plan = dtype_plan(ddl)
+        if not plan:
+            raise ValueError(f"Table not found or has no columns: {table}")
+
+        columns = list(plan)
+        buffers = [_ColumnBuffer(plan[col]) for col in columns]
+        query = _select_query(table, ddl, limit)
+
+        rows_total = 0
+        chunks = 0
+
+        with conn.cursor(name='mlservice_training_loader') as cur:
+            cur.itersize = chunk_size
+            cur.execute(query)
+
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+
+                for buffer, values in zip(buffers, zip(*rows)):
+                    buffer.append(values)
+
+                rows_total += len(rows)
+                chunks += 1
+                del rows
+
+        # Колонки собираются по одной, части чанков освобождаются сразу
+        data = {}
+        for col, buffer in zip(columns, buffers):
+            data[col] = buffer.build()
+        df = pd.DataFrame(data, copy=False)
+
+    finally:
+        if own_conn:
+            conn.close()
+
+    report = {
+        'table': table,
+        'loader': LOADER_CURSOR,
+        'rows': rows_total,
+        'columns': len(columns),
+        'chunks': chunks,
+        'chunk_size': chunk_size,
+        'seconds': round(time.perf_counter() - started, 3),
+        'frame_mb': round(df.memory_usage(deep=True).sum() / 1024 / 1024, 1),
+        'peak_rss_mb': _peak_rss_mb(),
+        'peak_rss_before_mb': rss_before,
+        'dtypes': {dtype: sum(1 for value in plan.values() if value == dtype) for dtype in sorted(set(plan.values()))}
+    }
+    logger.info(f"Loaded {table}: {report}")
+
+    return df, report
+
+
+def table_fingerprint(table: str = TRAINING_MART_TABLE, conn=None) -> dict:
+    """
+    Отпечаток содержимого таблицы без выгрузки: число строк, максимальные
+    load_dts/update_dts и список колонок с типами из DDL.
+    Меняется при любой загрузке или обновлении витрины.
+    """
+    own_conn = conn is None
+    conn = conn or connect_greenplum()
+
+    try:
+        ddl = table_columns(conn, table)
+        names = {name for name, _, _ in ddl}
+        aggregates = ['count(*)'] + [f'max({col})' for col in ('load_dts', 'update_dts') if col in names]
+
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {', '.join(aggregates)} FROM {table}")
+            values = cur.fetchone()
+    finally:
+        if own_conn:
+            conn.close()
+
+    return {
+        'table': table,
+        'columns': [[name, data_type, nullable] for name, data_type, nullable in ddl],
+        'rows': values[0],
+        'max_dts': [str(value) for value in values[1:]]
+    }
+
+
+def _copy_to_pipe(conn, query: str, fd: int, errors: list):
+    """Поток-писатель: COPY TO STDOUT в канал, ошибка передается читателю"""
+    try:
+        with os.fdopen(fd, 'wb') as sink, conn.cursor() as cur:
+            cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", sink)
+    except Exception as e:
+        errors.append(e)
+
+
+def export_table_copy(table: str = TRAINING_MART_TABLE, conn=None, limit: int = None,
+                      block_size: int = COPY_BLOCK_SIZE) -> tuple:
+    """
+    Выгрузка таблицы через COPY (SELECT ...) TO STDOUT в CSV.
+    Поток COPY пишется в канал отдельным потоком и одновременно
+    разбирается pyarrow блоками по block_size байт с типами из DDL,
+    весь CSV в памяти не собирается.
+    NULL в CSV - пустое поле без кавычек, пустая строка - "" (не NULL).
+    Возвращает (pyarrow.Table, отчет о выгрузке).
+    """
+    own_conn = conn is None
+    conn = conn or connect_greenplum()
+    started = time.perf_counter()
+
+    try:
+        ddl = table_columns(conn, table)
+        plan = dtype_plan(ddl)
+        if not plan:
+            raise ValueError(f"Table not found or has no columns: {table}")
+
+        columns = list(plan)
+        read_fd, write_fd = os.pipe()
+        errors = []
+        writer = threading.Thread(
+            target=_copy_to_pipe,
+            args=(conn, _select_query(table, ddl, limit), write_fd, errors),
+            name='greenplum-copy',
+            daemon=True
+        )
+        writer.start()
+
+        try:
+            with os.fdopen(read_fd, 'rb') as source:
+                reader = pa_csv.open_csv(
+                    source,
+                    read_options=pa_csv.ReadOptions(block_size=block_size),
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types={col: _ARROW_TYPES.get(plan[col], pa.string()) for col in columns},
+                        null_values=[''],
+                        strings_can_be_null=True,
+                        quoted_strings_can_be_null=False,
+                        true_values=['t'],
+                        false_values=['f']
+                    )
+                )
+                batches = list(reader)
+                schema = reader.schema
+        finally:
+            # Если парсер упал, писатель получит закрытый канал и завершится
+            writer.join()
+
+        if errors:
+            raise errors[0]
+
+        table_data = pa.Table.from_batches(batches, schema=schema)
+        del batches
+
+    finally:
+        if own_conn:
+            conn.close()
+
+    report = {
+        'table': table,
+        'loader': LOADER_COPY,
+        'rows': table_data.num_rows,
+        'columns': table_data.num_columns,
+        'seconds': round(time.perf_counter() - started, 3),
+        'arrow_mb': round(table_data.nbytes / 1024 / 1024, 1),
+        'peak_rss_mb': _peak_rss_mb()
+    }
+    logger.info(f"Exported {table} via COPY: {report}")
+
+    return table_data, report
+
+
+def arrow_to_frame(table_data: pa.Table) -> pd.DataFrame:
+    """
+    pyarrow.Table -> DataFrame без лишних копий: словарные колонки
+    становятся category, буферы Arrow освобождаются по мере конвертации.
+    """
+    return table_data.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _cache_path(table: str, cache_dir: str) -> Path:
+    return Path(cache_dir) / f"{table.replace('.', '__')}.parquet"
+
+
+def load_training_frame(table: str = TRAINING_MART_TABLE, loader: str = TRAIN_LOADER,
+                        cache_dir: str = PARQUET_CACHE_DIR, cache_ttl: int = PARQUET_CACHE_TTL,
+                        limit: int = None) -> tuple:
+    """
+    Данные витрины для обучения.
+    При заданном cache_dir сначала проверяется локальный Parquet
+    не старше cache_ttl секунд, иначе выгрузка loader-ом (copy или
+    cursor) и запись Parquet. Возвращает (DataFrame, отчет).
+    """
+    cache_file = _cache_path(table, cache_dir) if cache_dir and limit is None else None
+
+    if cache_file is not None and cache_file.exists() and time.time() - cache_file.stat().st_mtime < cache_ttl:
+        started = time.perf_counter()
+        df = arrow_to_frame(pq.read_table(cache_file))
+        report = {
+            'table': table,
+            'loader': 'parquet_cache',
+            'cache_file': str(cache_file),
+            'rows': len(df),
+            'seconds': round(time.perf_counter() - started, 3),
+            'peak_rss_mb': _peak_rss_mb()
+        }
+        logger.info(f"Loaded {table} from Parquet cache: {report}")
+        return df, report
+
+    if loader == LOADER_COPY:
+        table_data, report = export_table_copy(table, limit=limit)
+        if cache_file is not None:
+            _write_cache(table_data, cache_file)
+        df = arrow_to_frame(table_data)
+        del table_data
+    elif loader == LOADER_CURSOR:
+        df, report = load_table_chunked(table, limit=limit)
+        if cache_file is not None:
+            _write_cache(pa.Table.from_pandas(df, preserve_index=False), cache_file)
+    else:
+        raise ValueError(f"Unknown training data loader: {loader}")
+
+    report['frame_mb'] = round(df.memory_usage(deep=True).sum() / 1024 / 1024, 1)
+    report['peak_rss_mb'] = _peak_rss_mb()
+
+    return df, report
+
+
+def _write_cache(table_data: pa.Table, cache_file: Path):
+    """Атомарная запись Parquet: временный файл и rename"""
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_name(f'.{cache_file.name}.{os.getpid()}.tmp')
+    pq.write_table(table_data, tmp_file)
+    os.replace(tmp_file, cache_file)
+    logger.info(f"Parquet cache written: {cache_file}")
+
+
+def benchmark_loaders(table: str = TRAINING_MART_TABLE, limit: int = None) -> dict:
+    """
+    Сравнение способов выгрузки витрины: pd.read_sql (прежний путь),
+    server-side курсор, COPY и чтение Parquet кэша.
+    Пиковый RSS процесса монотонный, поэтому для сравнения памяти
+    приводится размер итогового фрейма.
+    """
+    import tempfile
+
+    results = {}
+
+    def record(name: str, df: pd.DataFrame, seconds: float):
+        results[name] = {
+            'rows': len(df),
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(len(df) / seconds, 1) if seconds else None,
+            'frame_mb': round(df.memory_usage(deep=True).sum() / 1024 / 1024, 1)
+        }
+        print(f"{name:15s} {results[name]['seconds']:9.3f} s  {results[name]['frame_mb']:9.1f} MB", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory(prefix='mlservice-parquet-') as tmp_dir:
+        cache_file = Path(tmp_dir) / 'bench.parquet'
+
+        conn = connect_greenplum()
+        try:
+            ddl = table_columns(conn, table)
+
+            started = time.perf_counter()
+            df = pd.read_sql(_select_query(table, ddl, limit), conn)
+            record('read_sql', df, time.perf_counter() - started)
+            del df
+
+            started = time.perf_counter()
+            df, _ = load_table_chunked(table, conn=conn, limit=limit)
+            record('cursor', df, time.perf_counter() - started)
+            del df
+
+            started = time.perf_counter()
+            table_data, _ = export_table_copy(table, conn=conn, limit=limit)
+            export_seconds = time.perf_counter() - started
+
+            # Parquet пишется до arrow_to_frame: после self_destruct таблица недействительна
+            pq.write_table(table_data, cache_file)
+
+            started = time.perf_counter()
+            df = arrow_to_frame(table_data)
+            del table_data
+            record('copy', df, export_seconds + time.perf_counter() - started)
+            del df
+        finally:
+            conn.close()
+
+        started = time.perf_counter()
+        df = arrow_to_frame(pq.read_table(cache_file))
+        record('parquet_cache', df, time.perf_counter() - started)
+
+    return {'table': table, 'limit': limit, 'loaders': results, 'peak_rss_mb': _peak_rss_mb()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Выгрузка витрины обучения из Greenplum')
+    parser.add_argument('--table', default=TRAINING_MART_TABLE)
+    parser.add_argument('--loader', choices=(LOADER_COPY, LOADER_CURSOR), default=TRAIN_LOADER)
+    parser.add_argument('--limit', type=int, default=None, help='Ограничение числа строк')
+    parser.add_argument('--output', default=None, help='Записать выгрузку в Parquet файл')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Сравнить read_sql, cursor, COPY и Parquet кэш')
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        print(json.dumps(benchmark_loaders(args.table, args.limit), indent=2))
+        return
+
+    df, report = load_training_frame(args.table, loader=args.loader, cache_dir='', limit=args.limit)
+    if args.output:
+        _write_cache(pa.Table.from_pandas(df, preserve_index=False), Path(args.output))
+        report['output'] = args.output
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""
+Конфигурация gunicorn для MLService.
+Модель загружается в мастер-процессе до fork, поэтому воркеры
+разделяют страницы с деревьями CatBoost (copy-on-write) и не
+десериализуют модель повторно.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('ML_PORT', '8001')}"
+workers = int(os.environ.get('ML_WORKERS', '1'))
+worker_class = 'uvicorn.workers.UvicornWorker'
+preload_app = True
+
+
+def on_starting(server):
+    """Загрузка модели в мастере до старта воркеров"""
+    from model_manager import load_model, get_runtime_stats
+    
+    try:
+        load_model()
+        server.log.info(f"Model preloaded in master: {get_runtime_stats()}")
+    except FileNotFoundError as e:
+        server.log.warning(f"Model not preloaded: {e}")
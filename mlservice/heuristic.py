@@ -0,0 +1,106 @@
+"""
+Эвристический скоринг ML-сервиса (fallback без обученной модели).
+Вероятность, confidence и importances считаются массивами numpy
+сразу для всего батча, одиночный скоринг - батч из одной записи.
+"""
+
+from typing import Dict
+
+import numpy as np
+
+# Признаки эвристики и значения по умолчанию
+HEURISTIC_FEATURES = {
+    'income': 50000.0,
+    'age': 35.0,
+    'debt_to_income': 0.3,
+    'bki_request_cnt': 1.0
+}
+
+
+def _feature_arrays(features_list: list) -> dict:
+    """Колонки признаков эвристики (float64) из списка записей"""
+    count = len(features_list)
+    return {
+        name: np.fromiter(
+            (float(features.get(name, default)) for features in features_list),
+            dtype=np.float64,
+            count=count
+        )
+        for name, default in HEURISTIC_FEATURES.items()
+    }
+
+
+def heuristic_arrays(features_list: list) -> dict:
+    """
+    Векторизованная эвристика.
+    Возвращает массивы default_probability, prediction, confidence
+    и feature_importances {признак: массив вкладов}.
+    """
+    return heuristic_columns(_feature_arrays(features_list))
+
+
+def heuristic_columns(columns: Dict[str, np.ndarray]) -> dict:
+    """
+    Эвристика по готовым колонкам признаков (float64 без пропусков),
+    результат в формате heuristic_arrays
+    """
+    income = columns['income']
+    age = columns['age']
+    debt_to_income = columns['debt_to_income']
+    bki_requests = columns['bki_request_cnt']
+
+    linear = 0.45 + (debt_to_income * 0.7) + (bki_requests * 0.04) - (income / 300000) - (age / 400)
+    probability = np.clip(linear, 0.01, 0.99)
+    confidence = np.minimum(np.round(0.65 + 0.3 * np.abs(0.5 - probability), 4), 0.98)
+    probability = np.round(probability, 4)
+
+    importances = {
+        'debt_to_income': np.round(np.minimum(0.35, debt_to_income * 0.5), 4),
+        'bki_request_cnt': np.round(np.minimum(0.2, bki_requests * 0.03), 4),
+        'income': np.round(np.maximum(-0.25, -(income / 500000)), 4),
+        'age': np.round(np.maximum(-0.1, -(age / 1000)), 4)
+    }
+
+    return {
+        'default_probability': probability,
+        'prediction': (probability >= 0.5).astype(np.int8),
+        'confidence': confidence,
+        'feature_importances': importances
+    }
+
+
+def heuristic_score(features: Dict[str, float]) -> tuple[float, Dict[str, float], float]:
+    """Эвристика для одной записи: (вероятность, importances, confidence)"""
+    scores = heuristic_arrays([features])
+    importances = {name: float(values[0]) for name, values in scores['feature_importances'].items()}
+    return float(scores['default_probability'][0]), importances, float(scores['confidence'][0])
+
+
+def heuristic_predictions(features_list: list, with_importances: bool = False) -> list:
+    """
+    Ответы батч-скоринга по эвристике в формате predict_batch,
+    каждая строка помечена fallback=True.
+    """
+    scores = heuristic_arrays(features_list)
+    probabilities = scores['default_probability'].tolist()
+    predictions = scores['prediction'].tolist()
+    confidences = scores['confidence'].tolist()
+
+    results = [
+        {
+            'index': i,
+            'default_probability': proba,
+            'prediction': pred,
+            'confidence': conf,
+            'fallback': True
+        }
+        for i, (proba, pred, conf) in enumerate(zip(probabilities, predictions, confidences))
+    ]
+
+    if with_importances:
+        names = list(scores['feature_importances'])
+        rows = zip(*(scores['feature_importances'][name].tolist() for name in names))
+        for result, values in zip(results, rows):
+            result['feature_importances'] = dict(zip(names, values))
+
+    return results
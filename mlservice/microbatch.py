@@ -0,0 +1,168 @@
+"""
+Micro-batching одиночных предсказаний ML-сервиса.
+Конкурентные запросы /ml/predict собираются в батч (до N записей
+или M миллисекунд), модель вызывается один раз, результаты
+раздаются вызывающим потокам.
+"""
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import logging
+
+from metrics import BATCH_SIZE_MICROBATCH
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Параметры micro-batching (включается явно)
+MICROBATCH_ENABLED = os.environ.get('ML_MICROBATCH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+MICROBATCH_MAX_BATCH_SIZE = int(os.environ.get('ML_MICROBATCH_MAX_BATCH_SIZE', '32'))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get('ML_MICROBATCH_MAX_WAIT_MS', '5'))
+MICROBATCH_MAX_QUEUE_DEPTH = int(os.environ.get('ML_MICROBATCH_MAX_QUEUE_DEPTH', '1024'))
+
+
+class MicroBatcher:
+    """
+    Коалесцер одиночных запросов.
+    predict_fn принимает список признаков и список application_id записей
+    и возвращает список ответов в том же порядке. Поток-диспетчер стартует при первом запросе
+    (после fork воркера gunicorn).
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = MICROBATCH_MAX_BATCH_SIZE,
+                 max_wait_ms: float = MICROBATCH_MAX_WAIT_MS,
+                 max_queue_depth: int = MICROBATCH_MAX_QUEUE_DEPTH):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_depth = max_queue_depth
+
+        self._queue = queue.Queue(maxsize=max_queue_depth)
+        self._start_lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        self._stats_lock = threading.Lock()
+        self._submitted = 0
+        self._rejected = 0
+        self._batches = 0
+        self._batched_items = 0
+        self._max_batch_seen = 0
+        self._queue_wait_ms_total = 0.0
+        self._batch_size_counts = {}
+
+    def _ensure_started(self):
+        """
+        Запуск потока-диспетчера в текущем процессе.
+        После fork очередь создается заново: унаследованная очередь помнит
+        ожидание потока родителя, и put будил бы его, а не новый поток.
+        """
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+
+        with self._start_lock:
+            if self._worker is not None and self._worker_pid == os.getpid():
+                return
+            if self._worker is not None:
+                self._queue = queue.Queue(maxsize=self.max_queue_depth)
+            self._worker = threading.Thread(target=self._run, name='microbatcher', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+            logger.info(f"Micro-batcher started: max_batch_size={self.max_batch_size}, "
+                        f"max_wait_ms={self.max_wait_ms}, max_queue_depth={self.max_queue_depth}")
+
+    def enqueue(self, features: dict, application_id: int = None) -> Future:
+        """
+        Постановка записи в очередь, результат приходит во Future.
+        При переполнении очереди бросает queue.Full, вызывающий
+        код считает запись напрямую.
+        """
+        self._ensure_started()
+
+        future = Future()
+        try:
+            self._queue.put_nowait((features, application_id, future, time.perf_counter()))
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise
+
+        with self._stats_lock:
+            self._submitted += 1
+
+        return future
+
+    def submit(self, features: dict, application_id: int = None) -> dict:
+        """Постановка записи в очередь и ожидание результата"""
+        return self.enqueue(features, application_id).result()
+
+    def _collect_batch(self) -> list:
+        """Сбор батча: первая запись ждется без ограничения, остальные до дедлайна"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        """Цикл потока-диспетчера"""
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+
+            try:
+                results = self.predict_fn(
+                    [features for features, _, _, _ in batch],
+                    [application_id for _, application_id, _, _ in batch]
+                )
+                for (_, _, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"Micro-batch failed: {e}")
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+
+            self._record_batch(batch, started)
+
+    def _record_batch(self, batch: list, started: float):
+        """Обновление метрик после обработки батча"""
+        size = len(batch)
+        queue_wait_ms = sum((started - enqueued) * 1000 for _, _, _, enqueued in batch)
+        BATCH_SIZE_MICROBATCH.observe(size)
+
+        with self._stats_lock:
+            self._batches += 1
+            self._batched_items += size
+            self._max_batch_seen = max(self._max_batch_seen, size)
+            self._queue_wait_ms_total += queue_wait_ms
+            self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+
+    def stats(self) -> dict:
+        """Метрики micro-batching"""
+        with self._stats_lock:
+            return {
+                'enabled': True,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_ms,
+                'max_queue_depth': self.max_queue_depth,
+                'queue_depth': self._queue.qsize(),
+                'submitted': self._submitted,
+                'rejected': self._rejected,
+                'batches': self._batches,
+                'avg_batch_size': round(self._batched_items / self._batches, 2) if self._batches else 0.0,
+                'max_batch_size_seen': self._max_batch_seen,
+                'avg_queue_wait_ms': round(self._queue_wait_ms_total / self._batched_items, 3) if self._batched_items else 0.0,
+                'batch_size_counts': dict(sorted(self._batch_size_counts.items()))
+            }
@@ -5,88 +5,329 @@
 
 import os
 import json
+import time
+import hashlib
 import pickle
+import resource
+import threading
 from pathlib import Path
 from datetime import datetime
+from dataclasses import dataclass
 import logging
 
 import pandas as pd
 import numpy as np
-from catboost import CatBoostClassifier
+from catboost import CatBoostClassifier, Pool
 import joblib
 
+from model_registry import (
+    MODEL_DIR,
+    REGISTRY_DIR,
+    MODEL_FILE,
+    LEGACY_MODEL_FILE,
+    ENCODER_FILE,
+    ENCODING_TABLES_FILE,
+    FEATURES_FILE,
+    STATUS_FILE,
+    CURRENT_POINTER_PATH,
+    current_dir,
+    current_version
+)
+from executors import CATBOOST_THREAD_COUNT
+from prediction_cache import PredictionCache
+from shadow import ShadowScorer
+from metrics import (
+    STAGE_PREPROCESS,
+    STAGE_PREDICT,
+    STAGE_IMPORTANCES,
+    MODEL_LOAD_FILE,
+    MODEL_LOAD_BUNDLE
+)
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Пути
-MODEL_DIR = Path('/app/models')
+# Как часто воркер проверяет указатель current на смену версии (секунды)
+RELOAD_CHECK_INTERVAL = float(os.environ.get('ML_RELOAD_CHECK_INTERVAL', '5'))
 
-MODEL_PATH = MODEL_DIR / 'catboost_default_risk.pkl'
-ENCODER_PATH = MODEL_DIR / 'label_encoder.pkl'
-FEATURES_PATH = MODEL_DIR / 'feature_columns.json'
-STATUS_PATH = MODEL_DIR / 'model_status.json'
+# Код для категорий, которых не было при обучении (совпадает со значением пропусков)
+UNKNOWN_CATEGORY_CODE = -1
 
-# Глобальная переменная для кэширования модели
-_model_cache = None
-_encoders_cache = None
-_features_cache = None
+# Виды feature importances в ответе:
+# global - importances модели (PredictionValuesChange), считаются один раз на версию
+# shap - вклад признаков в конкретную заявку (SHAP values), считаются по запросу
+IMPORTANCE_GLOBAL = 'global'
+IMPORTANCE_SHAP = 'shap'
 
 
-def load_model() -> CatBoostClassifier:
-    """Загрузка модели из файла"""
-    global _model_cache
-    
-    if _model_cache is not None:
-        return _model_cache
+@dataclass(frozen=True)
+class ModelBundle:
+    """
+    Неизменяемый набор артефактов одной версии модели.
+    Модель, таблицы кодирования и список признаков всегда
+    подменяются вместе, запрос работает с одним bundle от начала до конца.
+    """
+    version: str
+    path: Path
+    model: CatBoostClassifier
+    encoding_tables: dict
+    features: dict
+    status: dict
+    load_info: dict
+    global_importances: dict
+
+
+# Текущий bundle процесса, подменяется целиком при reload
+_current_bundle = None
+_reload_lock = threading.Lock()
+_last_version_check = 0.0
+_last_pointer_mtime = None
+
+# Кэш вероятностей по вектору признаков и версии модели
+prediction_cache = PredictionCache()
+
+# Статус модели в памяти процесса, пока bundle не загружен.
+# Перечитывается с диска только при смене mtime указателя current или
+# файла статуса, проверка не чаще раза в RELOAD_CHECK_INTERVAL.
+_model_status = None
+_status_signature = None
+_last_status_check = 0.0
+
+
+def _load_model_file(bundle_dir: Path) -> tuple:
+    """
+    Загрузка модели из директории версии.
+    Основной формат - нативный бинарный cbm, pkl (joblib) читается
+    только для моделей, обученных до перехода на cbm.
+    """
+    model_path = bundle_dir / MODEL_FILE
+    legacy_path = bundle_dir / LEGACY_MODEL_FILE
     
-    if not MODEL_PATH.exists():
-        raise FileNotFoundError(f"Model file not found: {MODEL_PATH}")
+    if model_path.exists():
+        model = CatBoostClassifier()
+        model.load_model(str(model_path), format='cbm')
+        return model, 'cbm'
     
-    _model_cache = joblib.load(MODEL_PATH)
-    logger.info(f"Model loaded from {MODEL_PATH}")
+    if legacy_path.exists():
+        return joblib.load(legacy_path), 'pickle'
     
-    return _model_cache
+    raise FileNotFoundError(f"Model file not found: {model_path}")
 
 
-def load_encoders() -> dict:
+def load_encoders(bundle_dir: Path = None) -> dict:
     """Загрузка label encoders"""
-    global _encoders_cache
+    encoder_path = (bundle_dir or current_dir()) / ENCODER_FILE
     
-    if _encoders_cache is not None:
-        return _encoders_cache
+    if not encoder_path.exists():
+        raise FileNotFoundError(f"Encoders file not found: {encoder_path}")
     
-    if not ENCODER_PATH.exists():
-        raise FileNotFoundError(f"Encoders file not found: {ENCODER_PATH}")
+    with open(encoder_path, 'rb') as f:
+        encoders = pickle.load(f)
     
-    with open(ENCODER_PATH, 'rb') as f:
-        _encoders_cache = pickle.load(f)
+    logger.info(f"Encoders loaded from {encoder_path}")
     
-    logger.info(f"Encoders loaded from {ENCODER_PATH}")
+    return encoders
+
+
+def compile_encoding_tables(encoders: dict) -> dict:
+    """
+    Компиляция label encoders в таблицы классов.
+    Код категории равен ее позиции в списке (как у LabelEncoder).
+    """
+    return {col: pickle.loads(blob).classes_.tolist() for col, blob in encoders.items()}
+
+
+def _load_encoding_tables(bundle_dir: Path) -> dict:
+    """
+    Загрузка таблиц кодирования категориальных признаков.
+    Таблицы читаются из compact-артефакта рядом с моделью, для старых
+    моделей без артефакта компилируются из label encoders.
+    Возвращает {колонка: pd.Index классов} для векторного поиска кодов.
+    """
+    tables_path = bundle_dir / ENCODING_TABLES_FILE
+    
+    if tables_path.exists():
+        with open(tables_path, 'r') as f:
+            tables = json.load(f)['columns']
+    else:
+        tables = compile_encoding_tables(load_encoders(bundle_dir))
+        logger.info("Encoding tables compiled from label encoders")
     
-    return _encoders_cache
+    return {col: pd.Index(classes) for col, classes in tables.items()}
 
 
-def load_features() -> dict:
-    """Загрузка информации о признаках"""
-    global _features_cache
+def load_bundle(bundle_dir: Path = None) -> ModelBundle:
+    """
+    Загрузка всех артефактов версии в один bundle.
+    По умолчанию загружается активная версия реестра.
+    """
+    bundle_dir = bundle_dir or current_dir()
+    started = time.perf_counter()
+    
+    model, model_format = _load_model_file(bundle_dir)
+    load_seconds = time.perf_counter() - started
+    load_time_ms = round(load_seconds * 1000, 2)
+    
+    features_path = bundle_dir / FEATURES_FILE
+    if not features_path.exists():
+        raise FileNotFoundError(f"Features info not found: {features_path}")
+    
+    with open(features_path, 'r') as f:
+        features = json.load(f)
+    
+    status = {}
+    status_path = bundle_dir / STATUS_FILE
+    if status_path.exists():
+        with open(status_path, 'r') as f:
+            status = json.load(f)
     
-    if _features_cache is not None:
-        return _features_cache
+    # Для плоской раскладки старых моделей версия берется из статуса
+    if bundle_dir.parent == REGISTRY_DIR:
+        version = bundle_dir.name
+    else:
+        version = status.get('version', 'v1.0.0')
     
-    if not FEATURES_PATH.exists():
-        raise FileNotFoundError(f"Features info not found: {FEATURES_PATH}")
+    bundle = ModelBundle(
+        version=version,
+        path=bundle_dir,
+        model=model,
+        encoding_tables=_load_encoding_tables(bundle_dir),
+        features=features,
+        status=status,
+        global_importances=_feature_importances(model, features['columns']),
+        load_info={
+            'model_format': model_format,
+            'load_time_ms': load_time_ms,
+            'bundle_load_time_ms': round((time.perf_counter() - started) * 1000, 2),
+            'loaded_by_pid': os.getpid()
+        }
+    )
     
-    with open(FEATURES_PATH, 'r') as f:
-        _features_cache = json.load(f)
+    MODEL_LOAD_FILE.observe(load_seconds)
+    MODEL_LOAD_BUNDLE.observe(time.perf_counter() - started)
     
-    logger.info(f"Features info loaded from {FEATURES_PATH}")
+    logger.info(f"Model bundle {bundle.version} loaded from {bundle_dir} "
+                f"in {bundle.load_info['bundle_load_time_ms']} ms")
     
-    return _features_cache
+    return bundle
 
 
-def get_model_status() -> dict:
-    """Получение статуса модели"""
+# Shadow-скоринг challenger-версии на предобработанных батчах champion
+shadow_scorer = ShadowScorer(load_bundle)
+
+
+def reload_model() -> ModelBundle:
+    """
+    Атомарная перезагрузка модели.
+    Новый bundle полностью загружается до подмены, запросы в процессе
+    дорабатывают на старом bundle и не ждут загрузки.
+    """
+    global _current_bundle
+    
+    with _reload_lock:
+        bundle = load_bundle()
+        _current_bundle = bundle
+    
+    # Результаты старой версии больше не нужны
+    prediction_cache.clear()
+    
+    return bundle
+
+
+def _reload_in_background(pointer_mtime: float):
+    """
+    Перезагрузка модели в фоновом потоке после смены версии.
+    mtime указателя запоминается только после успешной подмены bundle,
+    при ошибке reload повторяется на следующей проверке.
+    """
+    global _last_pointer_mtime
+    
+    try:
+        reload_model()
+    except Exception as e:
+        logger.error(f"Model reload failed: {e}")
+        return
+    
+    _last_pointer_mtime = pointer_mtime
+
+
+def _check_for_new_version(bundle: ModelBundle):
+    """
+    Периодическая проверка указателя current.
+    При смене версии reload запускается в фоне, текущий запрос
+    обслуживается старым bundle.
+    """
+    global _last_version_check, _last_pointer_mtime
+    
+    now = time.monotonic()
+    if now - _last_version_check < RELOAD_CHECK_INTERVAL:
+        return
+    _last_version_check = now
+    
+    # Указатель читается только после изменения его mtime
+    pointer_mtime = _stat_mtime(CURRENT_POINTER_PATH)
+    if pointer_mtime == _last_pointer_mtime or _reload_lock.locked():
+        return
+    
+    version = current_version()
+    if version is None or version == bundle.version:
+        _last_pointer_mtime = pointer_mtime
+        return
+    
+    logger.info(f"Model version changed: {bundle.version} -> {version}, reloading")
+    threading.Thread(target=_reload_in_background, args=(pointer_mtime,), daemon=True).start()
+
+
+def get_bundle() -> ModelBundle:
+    """Текущий bundle модели (загружается при первом обращении)"""
+    global _current_bundle
+    
+    bundle = _current_bundle
+    
+    if bundle is None:
+        with _reload_lock:
+            if _current_bundle is None:
+                _current_bundle = load_bundle()
+            return _current_bundle
+    
+    _check_for_new_version(bundle)
+    return bundle
+
+
+def model_feature_columns():
+    """Признаки текущей версии модели (None, если модель недоступна)"""
+    try:
+        return get_bundle().features['columns']
+    except Exception:
+        return None
+
+
+def load_model() -> CatBoostClassifier:
+    """Загрузка модели текущей версии"""
+    return get_bundle().model
+
+
+def load_features() -> dict:
+    """Загрузка информации о признаках текущей версии"""
+    return get_bundle().features
+
+
+def load_encoding_tables() -> dict:
+    """Таблицы кодирования категориальных признаков текущей версии"""
+    return get_bundle().encoding_tables
+
+
+def _stat_mtime(path: Path):
+    """mtime файла в наносекундах (None, если файла нет)"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _read_model_status() -> dict:
+    """Чтение статуса активной версии с диска"""
     status = {
         'version': 'v1.0.0',
         'status': 'not_loaded',
@@ -95,15 +336,96 @@ def get_model_status() -> dict:
         'loaded_at': datetime.now().isoformat()
     }
     
-    if STATUS_PATH.exists():
-        with open(STATUS_PATH, 'r') as f:
+    status_path = current_dir() / STATUS_FILE
+    if status_path.exists():
+        with open(status_path, 'r') as f:
             status = json.load(f)
     
-    # Обновляем статус загрузки
-    if _model_cache is not None:
+    return status
+
+
+def _refresh_model_status():
+    """
+    Обновление статуса в памяти при изменениях вне процесса
+    (обучение в другом воркере, ручная подмена артефактов).
+    """
+    global _model_status, _status_signature, _last_status_check
+    
+    now = time.monotonic()
+    if _model_status is not None and now - _last_status_check < RELOAD_CHECK_INTERVAL:
+        return
+    _last_status_check = now
+    
+    signature = (_stat_mtime(CURRENT_POINTER_PATH), _stat_mtime(MODEL_DIR / STATUS_FILE))
+    if _model_status is not None and signature == _status_signature:
+        return
+    
+    _model_status = _read_model_status()
+    _status_signature = signature
+
+
+def get_model_status() -> dict:
+    """
+    Получение статуса модели из памяти процесса.
+    Для загруженной версии статус берется из bundle (обновляется при
+    load/reload), иначе - из кэша, который сверяется с диском по mtime.
+    """
+    bundle = _current_bundle
+    
+    # Статус загруженной версии
+    if bundle is not None:
+        status = dict(bundle.status)
+        status['version'] = bundle.version
         status['status'] = 'loaded_in_memory'
+        return status
     
-    return status
+    _refresh_model_status()
+    
+    return dict(_model_status)
+
+
+def get_process_memory() -> dict:
+    """
+    Память текущего процесса воркера в МБ.
+    pss_mb делит разделяемые страницы между процессами, shared_mb -
+    страницы, общие с другими процессами (page cache, copy-on-write
+    память мастера при preload модели до fork).
+    """
+    memory = {
+        'rss_mb': None,
+        'pss_mb': None,
+        'shared_mb': None,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+    
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            values = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    values[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return memory
+    
+    memory['rss_mb'] = round(values.get('Rss', 0) / 1024, 1)
+    memory['pss_mb'] = round(values.get('Pss', 0) / 1024, 1)
+    memory['shared_mb'] = round(
+        (values.get('Shared_Clean', 0) + values.get('Shared_Dirty', 0)) / 1024, 1
+    )
+    
+    return memory
+
+
+def get_runtime_stats() -> dict:
+    """Время загрузки модели и память воркера для /ml/model/status"""
+    bundle = _current_bundle
+    
+    return {
+        'worker_pid': os.getpid(),
+        **(bundle.load_info if bundle is not None else {}),
+        **get_process_memory()
+    }
 
 
 def preprocess_input_features(features: dict) -> pd.DataFrame:
@@ -111,70 +433,208 @@ def preprocess_input_features(features: dict) -> pd.DataFrame:
     Предобработка входных признаков для предсказания.
     Приводит к формату, который использовался при обучении.
     """
-    # Создаем DataFrame
-    df = pd.DataFrame([features])
+    return preprocess_batch_features([features])
+
+
+def preprocess_batch_features(features_list: list, bundle: ModelBundle = None) -> pd.DataFrame:
+    """
+    Векторизованная предобработка батча признаков.
+    Строит один DataFrame по всему списку записей и кодирует каждую
+    категориальную колонку за один проход поиском по таблицам кодирования.
+    """
+    started = time.perf_counter()
+    bundle = bundle or get_bundle()
     
-    # Загружаем информацию о признаках
-    features_info = load_features()
-    cat_features = [col for col, idx in 
-                   zip(features_info['columns'], features_info['categorical_indices'])]
+    # Пропущенный ключ в записи после from_records стал бы NaN -> -1,
+    # одиночный путь в этом случае падает с KeyError
+    expected_columns = bundle.features['columns']
+    for features in features_list:
+        check_columns(features.keys(), expected_columns)
     
-    # Загружаем encoders
-    encoders = load_encoders()
+    # Создаем DataFrame сразу по всем записям
+    df = pd.DataFrame.from_records(features_list)
+    df = preprocess_frame(df, bundle)
     
-    # Кодируем категориальные признаки
-    le = None
-    for col in cat_features:
-        if col in df.columns:
-            df[col] = df[col].astype(str)
-            if col in encoders:
-                le = pickle.loads(encoders[col])
-                df[col] = le.transform(df[col])
+    STAGE_PREPROCESS.observe(time.perf_counter() - started)
     
-    # Заполняем пропуски
-    df = df.fillna(-1)
+    return df
+
+
+def check_columns(columns, expected_columns: list):
+    """
+    Проверка наличия всех признаков модели.
+    Ошибка совпадает с ошибкой выбора колонок pandas в одиночном пути.
+    """
+    columns = set(columns)
+    missing = [col for col in expected_columns if col not in columns]
+    if missing:
+        raise KeyError(f"{missing} not in index")
+
+
+def preprocess_frame(df: pd.DataFrame, bundle: ModelBundle = None) -> pd.DataFrame:
+    """
+    Предобработка DataFrame с сырыми признаками (колоночный вход).
+    Колонки результата собираются отдельно в порядке признаков модели,
+    входной DataFrame не изменяется, лишние колонки отбрасываются.
+    Отсутствующие признаки - KeyError, как в одиночном пути.
+    """
+    bundle = bundle or get_bundle()
     
-    # Выбираем только нужные колонки в правильном порядке
+    # Информация о признаках
+    features_info = bundle.features
     expected_columns = features_info['columns']
-    df = df[expected_columns]
+    check_columns(df.columns, expected_columns)
+    cat_features = {expected_columns[idx] for idx in features_info['categorical_indices']}
     
-    return df
+    # Таблицы кодирования той же версии
+    tables = bundle.encoding_tables
+    
+    columns = {}
+    for col in expected_columns:
+        values = df[col]
+        if col in cat_features:
+            # Кодируем категориальные признаки целыми колонками,
+            # неизвестные категории получают UNKNOWN_CATEGORY_CODE
+            values = values.astype(str)
+            if col in tables:
+                values = tables[col].get_indexer(values)
+        elif values.dtype == object:
+            # Числовой признак из одних None (одиночная запись) или Decimal
+            # из базы приводится к числам до заполнения пропусков
+            values = pd.to_numeric(values)
+        columns[col] = values
+    
+    # Заполняем пропуски
+    return pd.DataFrame(columns, index=df.index).fillna(-1)
+
+
+def _feature_importances(model: CatBoostClassifier, columns) -> dict:
+    """
+    Нормализованные feature importances модели (PredictionValuesChange).
+    Считаются без данных: CatBoost не принимает DataFrame, а на пуле
+    из одной строки возвращает NaN. Вызывается один раз при загрузке версии.
+    """
+    importances = model.get_feature_importance(thread_count=CATBOOST_THREAD_COUNT)
+    feature_importances = dict(zip(columns, importances.tolist()))
+    
+    # Нормализуем importances
+    total = sum(abs(v) for v in feature_importances.values())
+    if total > 0:
+        feature_importances = {k: round(v / total, 4) for k, v in feature_importances.items()}
+    
+    return feature_importances
+
+
+def _shap_importances(model: CatBoostClassifier, df: pd.DataFrame) -> list:
+    """
+    Нормализованные SHAP values для каждой строки батча.
+    Считаются одним вызовом CatBoost на весь батч.
+    """
+    pool = Pool(df, cat_features=model.get_cat_feature_indices())
+    shap_values = model.get_feature_importance(
+        pool, type='ShapValues', thread_count=CATBOOST_THREAD_COUNT
+    )[:, :-1]
+    
+    # Нормализуем каждую строку по сумме модулей вкладов
+    totals = np.abs(shap_values).sum(axis=1, keepdims=True)
+    normalized = np.divide(shap_values, totals, out=np.zeros_like(shap_values), where=totals > 0)
+    
+    columns = df.columns.tolist()
+    return [dict(zip(columns, row)) for row in np.round(normalized, 4).tolist()]
+
+
+def _cache_keys(bundle: ModelBundle, df: pd.DataFrame):
+    """
+    Ключи кэша: хэш предобработанного вектора признаков и версии модели.
+    None, если признаки не приводятся к числам (такие записи не кэшируются).
+    """
+    try:
+        values = np.ascontiguousarray(df.to_numpy(dtype=np.float64))
+    except (ValueError, TypeError):
+        return None
+    
+    prefix = bundle.version.encode()
+    return [hashlib.blake2b(prefix + row.tobytes(), digest_size=16).digest() for row in values]
+
+
+def _predict_probas(bundle: ModelBundle, df: pd.DataFrame, record_ids=None) -> np.ndarray:
+    """
+    Вероятности дефолта для предобработанного батча.
+    CatBoost вызывается только для записей, которых нет в кэше.
+    При включенном shadow-скоринге батч ставится в очередь challenger,
+    record_ids - ключи записей в результатах shadow (по умолчанию номер строки).
+    """
+    model = bundle.model
+    
+    keys = _cache_keys(bundle, df) if prediction_cache.enabled else None
+    if keys is None:
+        started = time.perf_counter()
+        probas = model.predict_proba(df, thread_count=CATBOOST_THREAD_COUNT)[:, 1]
+        STAGE_PREDICT.observe(time.perf_counter() - started)
+    else:
+        cached = prediction_cache.get_many(keys)
+        missing = [i for i, value in enumerate(cached) if value is None]
+        
+        probas = np.array([np.nan if value is None else value for value in cached], dtype=np.float64)
+        
+        if missing:
+            missing_df = df if len(missing) == len(df) else df.iloc[missing]
+            started = time.perf_counter()
+            fresh = model.predict_proba(missing_df, thread_count=CATBOOST_THREAD_COUNT)[:, 1]
+            STAGE_PREDICT.observe(time.perf_counter() - started)
+            probas[missing] = fresh
+            prediction_cache.put_many([keys[i] for i in missing], fresh.tolist())
+    
+    # Challenger считает тот же предобработанный батч в фоне
+    shadow_scorer.sync()
+    if shadow_scorer.enabled:
+        shadow_scorer.submit(bundle, df, probas, record_ids)
+    
+    return probas
+
+
+def _single_result(bundle: ModelBundle, proba: float, feature_importances: dict,
+                   importance_type: str = IMPORTANCE_GLOBAL) -> dict:
+    """Ответ для одной записи в формате predict_single"""
+    return {
+        'success': True,
+        'default_probability': round(float(proba), 4),
+        'prediction': int(proba >= 0.5),
+        'confidence': round(max(0.01, min(0.99, 0.65 + 0.3 * abs(0.5 - proba))), 4),
+        'feature_importances': feature_importances,
+        'importance_type': importance_type,
+        'model_version': bundle.version,
+        'generated_at': datetime.now().isoformat()
+    }
 
 
-def predict_single(features: dict) -> dict:
+def predict_single(features: dict, importance_type: str = IMPORTANCE_GLOBAL,
+                   application_id: int = None) -> dict:
     """
     Предсказание для одной записи.
     Возвращает вероятность дефолта и дополнительную информацию.
+    importance_type=shap возвращает вклад признаков в эту заявку вместо
+    importances модели. application_id - ключ записи в результатах shadow.
     """
     try:
-        # Загружаем модель
-        model = load_model()
+        # Фиксируем bundle на весь запрос
+        bundle = get_bundle()
+        model = bundle.model
         
         # Предобрабатываем входные данные
-        df = preprocess_input_features(features)
+        df = preprocess_batch_features([features], bundle)
         
         # Делаем предсказание
-        proba = model.predict_proba(df)[0, 1]
-        prediction = int(proba >= 0.5)
+        proba = _predict_probas(bundle, df, [application_id])[0]
         
-        # Получаем feature importances
-        importances = model.get_feature_importance(df)
-        feature_importances = dict(zip(df.columns, importances.tolist()))
+        started = time.perf_counter()
+        if importance_type == IMPORTANCE_SHAP:
+            feature_importances = _shap_importances(model, df)[0]
+        else:
+            feature_importances = bundle.global_importances
+        STAGE_IMPORTANCES.observe(time.perf_counter() - started)
         
-        # Нормализуем importances
-        total = sum(abs(v) for v in feature_importances.values())
-        if total > 0:
-            feature_importances = {k: round(v / total, 4) for k, v in feature_importances.items()}
-        
-        return {
-            'success': True,
-            'default_probability': round(float(proba), 4),
-            'prediction': prediction,
-            'confidence': round(max(0.01, min(0.99, 0.65 + 0.3 * abs(0.5 - proba))), 4),
-            'feature_importances': feature_importances,
-            'model_version': 'v1.0.0',
-            'generated_at': datetime.now().isoformat()
-        }
+        return _single_result(bundle, proba, feature_importances, importance_type)
         
     except Exception as e:
         logger.error(f"Prediction failed: {e}")
@@ -184,42 +644,81 @@ def predict_single(features: dict) -> dict:
         }
 
 
-def predict_batch(features_list: list) -> dict:
+def predict_many(features_list: list, application_ids: list = None) -> list:
     """
-    Батч предсказание для нескольких записей.
+    Предсказание для нескольких независимых запросов одним вызовом predict_proba.
+    Возвращает список ответов в формате predict_single (используется micro-batching).
+    Если батч не удалось обработать целиком, записи считаются по одной,
+    чтобы ошибка одной записи не затронула остальные.
+    application_ids - ключи записей в результатах shadow.
     """
+    if application_ids is None:
+        application_ids = [None] * len(features_list)
+    
     try:
-        model = load_model()
+        bundle = get_bundle()
+        df = preprocess_batch_features(features_list, bundle)
+        probas = _predict_probas(bundle, df, application_ids)
         
-        # Предобрабатываем все данные
-        dfs = []
-        for features in features_list:
-            df = preprocess_input_features(features)
-            dfs.append(df)
+    except Exception as e:
+        logger.warning(f"Micro-batch prediction failed, scoring records one by one: {e}")
+        return [
+            predict_single(features, application_id=application_id)
+            for features, application_id in zip(features_list, application_ids)
+        ]
+    
+    return [_single_result(bundle, proba, bundle.global_importances) for proba in probas]
+
+
+def predict_batch(features_list: list, importance_type: str = None, record_ids: list = None) -> dict:
+    """
+    Батч предсказание для нескольких записей.
+    importance_type=global добавляет importances модели в ответ,
+    importance_type=shap - вклад признаков в каждую запись (одним вызовом на батч).
+    record_ids - ключи записей в результатах shadow (по умолчанию index в ответе).
+    """
+    try:
+        # Фиксируем bundle на весь запрос
+        bundle = get_bundle()
+        model = bundle.model
         
-        combined_df = pd.concat(dfs, ignore_index=True)
+        # Предобрабатываем весь батч одним проходом
+        combined_df = preprocess_batch_features(features_list, bundle)
         
         # Делаем предсказания
-        probas = model.predict_proba(combined_df)[:, 1]
+        probas = _predict_probas(bundle, combined_df, record_ids)
         predictions = (probas >= 0.5).astype(int)
+        confidences = np.clip(0.65 + 0.3 * np.abs(0.5 - probas), 0.01, 0.99)
         
         results = []
-        for i, (proba, pred) in enumerate(zip(probas, predictions)):
+        for i, (proba, pred, conf) in enumerate(zip(probas, predictions, confidences)):
             results.append({
                 'index': i,
                 'default_probability': round(float(proba), 4),
                 'prediction': int(pred),
-                'confidence': round(max(0.01, min(0.99, 0.65 + 0.3 * abs(0.5 - proba))), 4)
+                'confidence': round(float(conf), 4)
             })
         
-        return {
+        response = {
             'success': True,
             'total_predictions': len(results),
             'predictions': results,
-            'model_version': 'v1.0.0',
+            'model_version': bundle.version,
             'generated_at': datetime.now().isoformat()
         }
         
+        if importance_type == IMPORTANCE_SHAP:
+            started = time.perf_counter()
+            for result, row_importances in zip(results, _shap_importances(model, combined_df)):
+                result['feature_importances'] = row_importances
+            response['importance_type'] = IMPORTANCE_SHAP
+            STAGE_IMPORTANCES.observe(time.perf_counter() - started)
+        elif importance_type == IMPORTANCE_GLOBAL:
+            response['feature_importances'] = bundle.global_importances
+            response['importance_type'] = IMPORTANCE_GLOBAL
+        
+        return response
+        
     except Exception as e:
         logger.error(f"Batch prediction failed: {e}")
         return {
@@ -228,6 +727,51 @@ def predict_batch(features_list: list) -> dict:
         }
 
 
+def _array_result(bundle: ModelBundle, features_df: pd.DataFrame, record_ids=None) -> dict:
+    """Результаты предобработанного батча массивами numpy"""
+    probas = _predict_probas(bundle, features_df, record_ids)
+    
+    return {
+        'default_probability': probas,
+        'prediction': (probas >= 0.5).astype(np.int8),
+        'confidence': np.clip(0.65 + 0.3 * np.abs(0.5 - probas), 0.01, 0.99),
+        'model_version': bundle.version
+    }
+
+
+def predict_frame(df: pd.DataFrame, record_ids=None) -> dict:
+    """
+    Батч предсказание для DataFrame с колонками признаков.
+    Колоночный путь без построения dict на каждую запись, результаты -
+    массивы numpy в порядке строк входа. record_ids - ключи записей
+    в результатах shadow (по умолчанию номер строки).
+    """
+    bundle = get_bundle()
+    
+    started = time.perf_counter()
+    features_df = preprocess_frame(df, bundle)
+    STAGE_PREPROCESS.observe(time.perf_counter() - started)
+    
+    return _array_result(bundle, features_df, record_ids)
+
+
+def predict_arrays(features_list: list, importance_type: str = None) -> dict:
+    """
+    Батч предсказание записей параллельными массивами numpy
+    (компактный ответ /ml/predict/batch). importance_type=global
+    добавляет importances модели, SHAP в компактном ответе нет.
+    """
+    bundle = get_bundle()
+    
+    features_df = preprocess_batch_features(features_list, bundle)
+    result = _array_result(bundle, features_df)
+    
+    if importance_type == IMPORTANCE_GLOBAL:
+        result['feature_importances'] = bundle.global_importances
+    
+    return result
+
+
 def validate_model() -> bool:
     """Проверка доступности модели"""
     try:
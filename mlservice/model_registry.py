@@ -0,0 +1,104 @@
+"""
+Версионированный реестр моделей ML-сервиса.
+Каждая версия лежит в отдельной директории versions/<version>,
+файл current указывает на активную версию.
+"""
+
+import os
+import shutil
+from pathlib import Path
+from datetime import datetime
+import logging
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Пути
+MODEL_DIR = Path(os.environ.get('ML_MODEL_DIR', '/app/models'))
+REGISTRY_DIR = MODEL_DIR / 'versions'
+CURRENT_POINTER_PATH = MODEL_DIR / 'current'
+
+# Имена артефактов внутри директории версии
+MODEL_FILE = 'catboost_default_risk.cbm'
+LEGACY_MODEL_FILE = 'catboost_default_risk.pkl'
+ENCODER_FILE = 'label_encoder.pkl'
+ENCODING_TABLES_FILE = 'categorical_encoding.json'
+FEATURES_FILE = 'feature_columns.json'
+STATUS_FILE = 'model_status.json'
+TUNING_FILE = 'hyperparameter_search.json'
+
+# Сколько последних версий хранить на диске
+KEEP_VERSIONS = int(os.environ.get('ML_REGISTRY_KEEP', '5'))
+
+
+def new_version() -> str:
+    """Идентификатор новой версии по времени обучения"""
+    return datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+
+
+def version_dir(version: str) -> Path:
+    """Директория версии в реестре"""
+    return REGISTRY_DIR / version
+
+
+def create_version_dir(version: str) -> Path:
+    """Создание директории для артефактов новой версии"""
+    path = version_dir(version)
+    path.mkdir(parents=True, exist_ok=False)
+    return path
+
+
+def current_version():
+    """Активная версия из указателя current (None, если реестр пуст)"""
+    try:
+        version = CURRENT_POINTER_PATH.read_text().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def current_dir() -> Path:
+    """
+    Директория активной версии.
+    Если реестр еще не использовался, артефакты читаются из MODEL_DIR
+    (плоская раскладка старых моделей).
+    """
+    version = current_version()
+    if version is None:
+        return MODEL_DIR
+    return version_dir(version)
+
+
+def promote_version(version: str):
+    """
+    Атомарное переключение указателя current на версию.
+    Указатель пишется во временный файл и подменяется через os.replace.
+    """
+    if not (version_dir(version) / MODEL_FILE).exists():
+        raise FileNotFoundError(f"Model artifact not found for version {version}")
+
+    tmp_path = CURRENT_POINTER_PATH.with_name(f'.current.{os.getpid()}.tmp')
+    tmp_path.write_text(version)
+    os.replace(tmp_path, CURRENT_POINTER_PATH)
+
+    logger.info(f"Model version {version} promoted to current")
+
+    prune_versions()
+
+
+def list_versions() -> list:
+    """Версии в реестре от старых к новым"""
+    if not REGISTRY_DIR.exists():
+        return []
+    return sorted(p.name for p in REGISTRY_DIR.iterdir() if p.is_dir())
+
+
+def prune_versions(keep: int = KEEP_VERSIONS):
+    """Удаление старых версий, кроме активной"""
+    current = current_version()
+    stale = [v for v in list_versions()[:-keep] if v != current] if keep > 0 else []
+
+    for version in stale:
+        shutil.rmtree(version_dir(version), ignore_errors=True)
+        logger.info(f"Model version {version} removed from registry")
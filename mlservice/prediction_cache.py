@@ -0,0 +1,126 @@
+"""
+Кэш результатов предсказаний ML-сервиса.
+LRU + TTL, ограничен по количеству записей и объему памяти.
+Ключ - хэш предобработанного вектора признаков и версии модели,
+кэш очищается при перезагрузке модели.
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+import logging
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Параметры кэша
+PREDICTION_CACHE_ENABLED = os.environ.get('ML_PREDICTION_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get('ML_PREDICTION_CACHE_MAX_ENTRIES', '100000'))
+PREDICTION_CACHE_MAX_BYTES = int(os.environ.get('ML_PREDICTION_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get('ML_PREDICTION_CACHE_TTL_SECONDS', '300'))
+
+# Накладные расходы OrderedDict и кортежа на одну запись (оценка)
+_ENTRY_OVERHEAD_BYTES = 160
+
+
+class PredictionCache:
+    """
+    Потокобезопасный LRU-кэш с TTL.
+    Размер записи оценивается по sys.getsizeof ключа и значения.
+    """
+
+    def __init__(self, max_entries: int = PREDICTION_CACHE_MAX_ENTRIES,
+                 max_bytes: int = PREDICTION_CACHE_MAX_BYTES,
+                 ttl_seconds: float = PREDICTION_CACHE_TTL_SECONDS,
+                 enabled: bool = PREDICTION_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled and max_entries > 0
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._clears = 0
+
+    def get_many(self, keys: list) -> list:
+        """Значения по ключам (None для промахов и истекших записей)"""
+        now = time.monotonic()
+        values = []
+
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    self._misses += 1
+                    values.append(None)
+                    continue
+
+                value, expires_at, nbytes = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    self._bytes -= nbytes
+                    self._expirations += 1
+                    self._misses += 1
+                    values.append(None)
+                    continue
+
+                self._entries.move_to_end(key)
+                self._hits += 1
+                values.append(value)
+
+        return values
+
+    def put_many(self, keys: list, values: list):
+        """Сохранение значений с вытеснением самых старых записей"""
+        expires_at = time.monotonic() + self.ttl_seconds
+
+        with self._lock:
+            for key, value in zip(keys, values):
+                nbytes = sys.getsizeof(key) + sys.getsizeof(value) + _ENTRY_OVERHEAD_BYTES
+
+                previous = self._entries.pop(key, None)
+                if previous is not None:
+                    self._bytes -= previous[2]
+
+                self._entries[key] = (value, expires_at, nbytes)
+                self._bytes += nbytes
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, _, nbytes) = self._entries.popitem(last=False)
+                self._bytes -= nbytes
+                self._evictions += 1
+
+    def clear(self):
+        """Полная очистка (при смене версии модели)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._clears += 1
+
+    def stats(self) -> dict:
+        """Счетчики кэша"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'clears': self._clears
+            }
@@ -0,0 +1,542 @@
+"""
+Shadow-скоринг challenger-модели на живом трафике.
+Champion отвечает клиенту, предобработанный батч champion и его
+вероятности ставятся в очередь, challenger считает их в фоновом
+потоке. Результаты копятся в ограниченном буфере и периодически
+дописываются в JSONL-файл.
+
+Состояние shadow (включен ли и какая версия - challenger) общее для
+всех воркеров gunicorn: оно хранится в файле MODEL_DIR/shadow_state.json,
+каждый воркер перечитывает его при изменении mtime. Метрики воркеры
+периодически выгружают в ML_SHADOW_DIR, /ml/shadow/stats их суммирует.
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+import logging
+
+import numpy as np
+
+from model_registry import MODEL_DIR, current_version, list_versions, version_dir
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Параметры shadow-скоринга (включается явно или через API)
+SHADOW_ENABLED = os.environ.get('ML_SHADOW_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+SHADOW_VERSION = os.environ.get('ML_SHADOW_VERSION') or None
+SHADOW_QUEUE_DEPTH = int(os.environ.get('ML_SHADOW_QUEUE_DEPTH', '256'))
+SHADOW_BUFFER_SIZE = int(os.environ.get('ML_SHADOW_BUFFER_SIZE', '10000'))
+SHADOW_FLUSH_INTERVAL = float(os.environ.get('ML_SHADOW_FLUSH_INTERVAL', '30'))
+SHADOW_DIR = Path(os.environ.get('ML_SHADOW_DIR', str(MODEL_DIR / 'shadow')))
+SHADOW_MAX_OVERHEAD_MS = float(os.environ.get('ML_SHADOW_MAX_OVERHEAD_MS', '1'))
+SHADOW_COOLDOWN_SECONDS = float(os.environ.get('ML_SHADOW_COOLDOWN_SECONDS', '30'))
+SHADOW_THREAD_COUNT = int(os.environ.get('ML_SHADOW_THREAD_COUNT', '1'))
+# Как часто воркер проверяет общее состояние shadow (секунды)
+SHADOW_SYNC_INTERVAL = float(os.environ.get('ML_SHADOW_SYNC_INTERVAL', '5'))
+SHADOW_STATE_PATH = MODEL_DIR / 'shadow_state.json'
+
+# Счетчики, которые суммируются по воркерам в /ml/shadow/stats,
+# и суммы для пересчета средних
+SUMMED_COUNTERS = (
+    'queue_depth', 'buffered_rows', 'submitted_batches', 'dropped_batches', 'dropped_rows',
+    'skipped_paused', 'over_budget', 'scored_rows', 'score_errors', 'flushed_rows'
+)
+SUMMED_TOTALS = ('overhead_ms_total', 'abs_diff_total', 'disagreements')
+
+
+def default_challenger_version():
+    """
+    Самая новая версия реестра, обученная после активной (None, если
+    такой нет). Более старые версии - это прежние champion, после
+    promote они не выбираются.
+    """
+    current = current_version()
+    candidates = [version for version in list_versions() if current is None or version > current]
+    return candidates[-1] if candidates else None
+
+
+def read_shadow_state(path: Path = SHADOW_STATE_PATH):
+    """Общее состояние shadow (None, если shadow через API не переключался)"""
+    try:
+        return json.loads(Path(path).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_shadow_state(enabled: bool, version: str = None, path: Path = SHADOW_STATE_PATH) -> dict:
+    """Атомарная запись общего состояния: временный файл и os.replace"""
+    path = Path(path)
+    state = {'enabled': enabled, 'version': version, 'updated_at': datetime.now().isoformat()}
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    tmp_path.write_text(json.dumps(state))
+    os.replace(tmp_path, path)
+
+    return state
+
+
+def _stat_mtime(path: Path):
+    """mtime файла в наносекундах (None, если файла нет)"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class ShadowScorer:
+    """
+    Shadow-скоринг challenger-модели.
+    load_fn загружает bundle по директории версии. Предобработка
+    champion переиспользуется: колонки переставляются в порядок
+    challenger, коды категорий переводятся таблицей перекодировки.
+    Накладные расходы на пути champion (постановка в очередь)
+    измеряются; при превышении лимита shadow приостанавливается.
+    enable/disable пишут общее состояние, sync применяет его в воркере.
+    """
+
+    def __init__(self, load_fn, queue_depth: int = SHADOW_QUEUE_DEPTH,
+                 buffer_size: int = SHADOW_BUFFER_SIZE,
+                 flush_interval: float = SHADOW_FLUSH_INTERVAL,
+                 output_dir: Path = SHADOW_DIR,
+                 max_overhead_ms: float = SHADOW_MAX_OVERHEAD_MS,
+                 cooldown_seconds: float = SHADOW_COOLDOWN_SECONDS,
+                 state_path: Path = SHADOW_STATE_PATH,
+                 sync_interval: float = SHADOW_SYNC_INTERVAL):
+        self.load_fn = load_fn
+        self.queue_depth = queue_depth
+        self.flush_interval = flush_interval
+        self.output_dir = Path(output_dir)
+        self.max_overhead_ms = max_overhead_ms
+        self.cooldown_seconds = cooldown_seconds
+        self.state_path = Path(state_path)
+        self.sync_interval = sync_interval
+
+        self._enabled = False
+        self._challenger = None
+        self._paused_until = 0.0
+        self._code_maps = {}
+
+        # Примененное общее состояние (mtime файла) и его синхронизация
+        self._state_mtime = None
+        self._last_sync = 0.0
+        self._sync_lock = threading.Lock()
+
+        self._queue = queue.Queue(maxsize=queue_depth)
+        self._buffer = deque(maxlen=buffer_size)
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        self._stats_lock = threading.Lock()
+        self._submitted = 0
+        self._dropped_queue = 0
+        self._dropped_buffer = 0
+        self._skipped_paused = 0
+        self._over_budget = 0
+        self._overhead_ms_total = 0.0
+        self._overhead_ms_max = 0.0
+        self._scored_rows = 0
+        self._score_errors = 0
+        self._abs_diff_total = 0.0
+        self._disagreements = 0
+        self._flushed_rows = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled and self._challenger is not None
+
+    def enable(self, version: str = None) -> dict:
+        """
+        Включение shadow-скоринга во всех воркерах.
+        Без version challenger - самая новая версия, обученная после
+        активной. Challenger загружается в этом воркере до записи
+        общего состояния, остальные воркеры подхватывают его в sync.
+        """
+        version = version or default_challenger_version()
+        if version is None:
+            raise FileNotFoundError("No model version newer than the current one in the registry")
+        if version == current_version():
+            raise ValueError(f"Model version {version} is the current version")
+
+        if not version_dir(version).exists():
+            raise FileNotFoundError(f"Model version not found: {version}")
+
+        with self._sync_lock:
+            self._activate(version)
+            write_shadow_state(True, version, self.state_path)
+            self._state_mtime = _stat_mtime(self.state_path)
+
+        return self.stats()
+
+    def disable(self) -> dict:
+        """Отключение shadow-скоринга во всех воркерах с выгрузкой буфера"""
+        with self._sync_lock:
+            write_shadow_state(False, None, self.state_path)
+            self._state_mtime = _stat_mtime(self.state_path)
+            self._deactivate()
+
+        return self.stats()
+
+    def _activate(self, version: str):
+        """Загрузка challenger и включение shadow в текущем воркере"""
+        challenger = self._challenger
+        if challenger is None or challenger.version != version:
+            challenger = self.load_fn(version_dir(version))
+
+        self._challenger = challenger
+        self._code_maps = {}
+        self._paused_until = 0.0
+        self._enabled = True
+        self._ensure_started()
+        self._write_stats()
+
+        logger.info(f"Shadow scoring enabled: challenger={challenger.version}")
+
+    def _deactivate(self):
+        """Отключение shadow в текущем воркере с выгрузкой буфера"""
+        self._enabled = False
+        self.flush()
+        self._write_stats()
+        logger.info("Shadow scoring disabled")
+
+    def sync(self):
+        """
+        Периодическая проверка общего состояния (не чаще раза в
+        sync_interval). Файл читается только после изменения mtime,
+        challenger загружается в фоновом потоке.
+        """
+        now = time.monotonic()
+        if now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+
+        state_mtime = _stat_mtime(self.state_path)
+        if state_mtime == self._state_mtime or self._sync_lock.locked():
+            return
+
+        threading.Thread(target=self._apply_state, args=(state_mtime,), daemon=True).start()
+
+    def _apply_state(self, state_mtime: int):
+        """
+        Применение общего состояния в текущем воркере. mtime запоминается
+        только после успешного применения, при ошибке загрузки challenger
+        попытка повторяется на следующей проверке.
+        """
+        with self._sync_lock:
+            if state_mtime == self._state_mtime:
+                return
+
+            state = read_shadow_state(self.state_path) or {}
+            try:
+                if state.get('enabled') and state.get('version'):
+                    if not self.enabled or self._challenger.version != state['version']:
+                        self._activate(state['version'])
+                elif self._enabled:
+                    self._deactivate()
+            except Exception as e:
+                logger.error(f"Shadow state not applied: {e}")
+                return
+
+            self._state_mtime = state_mtime
+
+    @property
+    def challenger(self):
+        return self._challenger
+
+    def _ensure_started(self):
+        """
+        Запуск фонового потока в текущем процессе (после fork воркера).
+        После fork очередь создается заново: унаследованная очередь помнит
+        ожидание потока родителя, и put будил бы его, а не новый поток.
+        """
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+
+        with self._start_lock:
+            if self._worker is not None and self._worker_pid == os.getpid():
+                return
+            if self._worker is not None:
+                self._queue = queue.Queue(maxsize=self.queue_depth)
+            self._worker = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def submit(self, champion, df, probas, record_ids=None):
+        """
+        Постановка батча champion в очередь challenger (без ожидания).
+        Вызывается на пути ответа, поэтому только замеряет время
+        и отбрасывает батч, если очередь заполнена.
+        record_ids - ключи записей (application_id, sk_id_curr или индекс
+        в запросе), без них ключ - номер строки в батче.
+        """
+        challenger = self._challenger
+        if not self._enabled or challenger is None or challenger.version == champion.version:
+            return
+
+        started = time.perf_counter()
+        if started < self._paused_until:
+            with self._stats_lock:
+                self._skipped_paused += 1
+            return
+
+        self._ensure_started()
+
+        try:
+            self._queue.put_nowait((champion, challenger, df, probas, record_ids, datetime.now().isoformat()))
+            dropped = False
+        except queue.Full:
+            dropped = True
+
+        overhead_ms = (time.perf_counter() - started) * 1000
+
+        with self._stats_lock:
+            self._submitted += 1
+            self._dropped_queue += dropped
+            self._overhead_ms_total += overhead_ms
+            self._overhead_ms_max = max(self._overhead_ms_max, overhead_ms)
+
+            if overhead_ms > self.max_overhead_ms:
+                self._over_budget += 1
+                self._paused_until = time.perf_counter() + self.cooldown_seconds
+                logger.warning(f"Shadow overhead {overhead_ms:.3f} ms exceeds "
+                               f"{self.max_overhead_ms} ms, pausing for {self.cooldown_seconds} s")
+
+    def _code_map(self, champion, challenger, col: str):
+        """Перекодировка кодов категории champion в коды challenger (-1 - неизвестная)"""
+        key = (champion.version, challenger.version, col)
+        code_map = self._code_maps.get(key)
+
+        if code_map is None:
+            champion_table = champion.encoding_tables[col]
+            challenger_table = challenger.encoding_tables[col]
+            # Последний элемент - для кода -1
+            code_map = np.append(challenger_table.get_indexer(champion_table), -1)
+            self._code_maps[key] = code_map
+
+        return code_map
+
+    def _align(self, champion, challenger, df):
+        """Предобработанный батч champion в колонках и кодах challenger"""
+        features_info = challenger.features
+        columns = features_info['columns']
+
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Challenger expects features missing in champion: {missing}")
+
+        frame = df[columns]
+        cat_features = [columns[idx] for idx in features_info['categorical_indices']]
+        recode = [
+            col for col in cat_features
+            if col in champion.encoding_tables and col in challenger.encoding_tables
+            and not champion.encoding_tables[col].equals(challenger.encoding_tables[col])
+        ]
+
+        if recode:
+            frame = frame.copy()
+            for col in recode:
+                codes = frame[col].to_numpy(dtype=np.int64)
+                frame[col] = self._code_map(champion, challenger, col)[codes]
+
+        return frame
+
+    def _score(self, champion, challenger, df, champion_probas, record_ids, scored_at: str):
+        """
+        Скоринг батча challenger и запись результатов в буфер.
+        Запись результата находится по batch_id (один на батч) и record_id.
+        """
+        frame = self._align(champion, challenger, df)
+        challenger_probas = challenger.model.predict_proba(frame, thread_count=SHADOW_THREAD_COUNT)[:, 1]
+
+        champion_probas = np.asarray(champion_probas, dtype=np.float64)
+        diff = np.abs(challenger_probas - champion_probas)
+        disagreements = int(np.count_nonzero((challenger_probas >= 0.5) != (champion_probas >= 0.5)))
+
+        if record_ids is None:
+            record_ids = range(len(champion_probas))
+        batch_id = uuid.uuid4().hex
+
+        records = [
+            {
+                'scored_at': scored_at,
+                'batch_id': batch_id,
+                'record_id': record_id,
+                'champion_version': champion.version,
+                'challenger_version': challenger.version,
+                'champion_probability': round(champion_proba, 6),
+                'challenger_probability': round(challenger_proba, 6)
+            }
+            for record_id, champion_proba, challenger_proba in zip(
+                np.asarray(record_ids).tolist(), champion_probas.tolist(), challenger_probas.tolist()
+            )
+        ]
+
+        with self._buffer_lock:
+            overflow = max(0, len(self._buffer) + len(records) - self._buffer.maxlen)
+            self._buffer.extend(records)
+
+        with self._stats_lock:
+            self._scored_rows += len(records)
+            self._abs_diff_total += float(diff.sum())
+            self._disagreements += disagreements
+            self._dropped_buffer += overflow
+
+    def _run(self):
+        """
+        Цикл фонового потока: скоринг challenger, периодическая выгрузка
+        и проверка общего состояния (воркер без трафика тоже его применяет).
+        """
+        next_flush = time.monotonic() + self.flush_interval
+
+        while True:
+            timeout = min(next_flush - time.monotonic(), max(self.sync_interval, 0.1))
+            try:
+                item = self._queue.get(timeout=max(0.0, timeout))
+            except queue.Empty:
+                item = None
+
+            self.sync()
+
+            if item is not None:
+                try:
+                    self._score(*item)
+                except Exception as e:
+                    logger.error(f"Shadow scoring failed: {e}")
+                    with self._stats_lock:
+                        self._score_errors += 1
+
+            if time.monotonic() >= next_flush:
+                try:
+                    self.flush()
+                    self._write_stats()
+                except Exception as e:
+                    logger.error(f"Shadow flush failed: {e}")
+                next_flush = time.monotonic() + self.flush_interval
+
+    def flush(self) -> int:
+        """Дозапись буфера в JSONL-файл (отдельный файл на challenger и процесс)"""
+        with self._flush_lock:
+            with self._buffer_lock:
+                records = list(self._buffer)
+                self._buffer.clear()
+
+            if not records:
+                return 0
+
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            path = self.output_dir / f"shadow_{records[0]['challenger_version']}_{os.getpid()}.jsonl"
+
+            with open(path, 'a') as f:
+                f.writelines(json.dumps(record) + '\n' for record in records)
+
+            with self._stats_lock:
+                self._flushed_rows += len(records)
+
+            return len(records)
+
+    def _write_stats(self):
+        """Выгрузка метрик воркера для сводки по всем воркерам"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f'stats_{os.getpid()}.json'
+        tmp_path = path.with_name(f'.{path.name}.tmp')
+        tmp_path.write_text(json.dumps(self.stats(raw=True)))
+        os.replace(tmp_path, path)
+
+    def collect_stats(self) -> dict:
+        """
+        Сводка по всем воркерам: общее состояние, суммы счетчиков и
+        метрики каждого воркера (других - на момент их последней
+        выгрузки). Выгрузки, не обновлявшиеся дольше трех интервалов,
+        принадлежат остановленным воркерам и удаляются.
+        """
+        self._write_stats()
+
+        workers = []
+        stale_before = time.time() - 3 * self.flush_interval
+        for path in sorted(self.output_dir.glob('stats_*.json')):
+            try:
+                if path.stat().st_mtime < stale_before:
+                    path.unlink(missing_ok=True)
+                    continue
+                workers.append(json.loads(path.read_text()))
+            except (FileNotFoundError, ValueError):
+                continue
+
+        total = {name: sum(worker[name] for worker in workers) for name in SUMMED_COUNTERS + SUMMED_TOTALS}
+
+        # Без общего состояния (shadow включен только переменными окружения) - состояние воркера
+        state = read_shadow_state(self.state_path)
+        if state is None:
+            challenger = self._challenger
+            state = {'enabled': self.enabled, 'version': challenger.version if challenger is not None else None}
+
+        stats = {
+            'enabled': bool(state['enabled']),
+            'challenger_version': state['version'],
+            'workers': len(workers),
+            'paused_workers': sum(worker['paused'] for worker in workers)
+        }
+        stats.update((name, total[name]) for name in SUMMED_COUNTERS)
+
+        return {
+            **stats,
+            'max_overhead_ms': self.max_overhead_ms,
+            'avg_overhead_ms': round(total['overhead_ms_total'] / total['submitted_batches'], 4)
+            if total['submitted_batches'] else 0.0,
+            'peak_overhead_ms': max((worker['peak_overhead_ms'] for worker in workers), default=0.0),
+            'mean_abs_diff': round(total['abs_diff_total'] / total['scored_rows'], 6)
+            if total['scored_rows'] else 0.0,
+            'disagreement_rate': round(total['disagreements'] / total['scored_rows'], 6)
+            if total['scored_rows'] else 0.0,
+            'per_worker': workers
+        }
+
+    def stats(self, raw: bool = False) -> dict:
+        """
+        Метрики shadow-скоринга воркера и сравнение с champion.
+        raw=True добавляет суммы для сводки по воркерам.
+        """
+        challenger = self._challenger
+
+        with self._stats_lock:
+            stats = {
+                'pid': os.getpid(),
+                'enabled': self.enabled,
+                'paused': time.perf_counter() < self._paused_until,
+                'challenger_version': challenger.version if challenger is not None else None,
+                'queue_depth': self._queue.qsize(),
+                'buffered_rows': len(self._buffer),
+                'submitted_batches': self._submitted,
+                'dropped_batches': self._dropped_queue,
+                'dropped_rows': self._dropped_buffer,
+                'skipped_paused': self._skipped_paused,
+                'over_budget': self._over_budget,
+                'max_overhead_ms': self.max_overhead_ms,
+                'avg_overhead_ms': round(self._overhead_ms_total / self._submitted, 4) if self._submitted else 0.0,
+                'peak_overhead_ms': round(self._overhead_ms_max, 4),
+                'scored_rows': self._scored_rows,
+                'score_errors': self._score_errors,
+                'flushed_rows': self._flushed_rows,
+                'mean_abs_diff': round(self._abs_diff_total / self._scored_rows, 6) if self._scored_rows else 0.0,
+                'disagreement_rate': round(self._disagreements / self._scored_rows, 6) if self._scored_rows else 0.0
+            }
+            if raw:
+                stats.update(
+                    overhead_ms_total=self._overhead_ms_total,
+                    abs_diff_total=self._abs_diff_total,
+                    disagreements=self._disagreements
+                )
+
+        return stats
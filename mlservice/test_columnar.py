@@ -0,0 +1,76 @@
+"""
+Тесты колоночного скоринга эвристикой: результат совпадает с
+heuristic_arrays, отсутствующие колонки и пропуски заменяются
+значениями по умолчанию, строки выровнены по sk_id_curr.
+
+Запуск:
+    python -m pytest -q test_columnar.py
+"""
+
+import io
+import os
+import tempfile
+import unittest
+
+# Модули сервиса читают настройки при импорте
+os.environ['ML_MODEL_DIR'] = tempfile.mkdtemp(prefix='mlservice-test-')
+os.environ['ML_PREDICTION_CACHE_ENABLED'] = 'false'
+os.environ['ML_DATASET_CACHE_ENABLED'] = 'false'
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from columnar import score_columnar_heuristic, FORMAT_ARROW, FORMAT_PARQUET
+from heuristic import heuristic_arrays
+
+
+def arrow_payload(table: pa.Table) -> bytes:
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+class HeuristicColumnarTest(unittest.TestCase):
+
+    records = [
+        {'income': 30000.0, 'age': 25.0, 'debt_to_income': 0.6, 'bki_request_cnt': 4.0},
+        {'income': 120000.0, 'age': 50.0, 'debt_to_income': 0.1, 'bki_request_cnt': 0.0},
+        {'income': 80000.0, 'age': 33.0, 'debt_to_income': 0.4, 'bki_request_cnt': 2.0},
+    ]
+
+    def assert_matches_heuristic(self, result: pa.Table, records: list):
+        expected = heuristic_arrays(records)
+        np.testing.assert_allclose(
+            result.column('default_probability').to_numpy(), expected['default_probability'], rtol=1e-6
+        )
+        np.testing.assert_array_equal(result.column('prediction').to_numpy(), expected['prediction'])
+        np.testing.assert_allclose(result.column('confidence').to_numpy(), expected['confidence'], rtol=1e-6)
+
+    def test_matches_heuristic_arrays(self):
+        table = pa.table({'sk_id_curr': [10, 20, 30], **{
+            name.upper(): [record[name] for record in self.records] for name in self.records[0]
+        }})
+
+        content, total = score_columnar_heuristic(arrow_payload(table), FORMAT_ARROW, FORMAT_ARROW)
+        result = pa.ipc.open_stream(content).read_all()
+
+        self.assertEqual(total, 3)
+        self.assertEqual(result.column('sk_id_curr').to_pylist(), [10, 20, 30])
+        self.assert_matches_heuristic(result, self.records)
+
+    def test_missing_columns_and_nulls_use_defaults(self):
+        table = pa.table({'income': [30000.0, None], 'amt_credit': [1.0, 2.0]})
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer)
+
+        content, total = score_columnar_heuristic(buffer.getvalue(), FORMAT_PARQUET, FORMAT_PARQUET)
+        result = pq.read_table(io.BytesIO(content))
+
+        self.assertEqual(result.column('row_index').to_pylist(), [0, 1])
+        self.assert_matches_heuristic(result, [{'income': 30000.0}, {}])
+
+
+if __name__ == '__main__':
+    unittest.main()
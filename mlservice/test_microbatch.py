@@ -0,0 +1,117 @@
+"""
+Тесты micro-batching: каждый запрос получает свой результат, батч
+закрывается по размеру и по таймауту, после fork воркера поток-диспетчер
+запускается заново.
+
+Запуск:
+    python -m pytest -q test_microbatch.py
+"""
+
+import os
+import time
+import threading
+import unittest
+
+from microbatch import MicroBatcher
+
+
+class RecordingPredictor:
+    """predict_fn, запоминающий размеры батчей; ответ - признаки и application_id записи"""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, features_list: list, application_ids: list) -> list:
+        self.batch_sizes.append(len(features_list))
+        return [
+            {'value': features['value'], 'application_id': application_id}
+            for features, application_id in zip(features_list, application_ids)
+        ]
+
+
+class MicroBatcherTest(unittest.TestCase):
+
+    def test_results_routed_to_their_requests(self):
+        predictor = RecordingPredictor()
+        batcher = MicroBatcher(predictor, max_batch_size=8, max_wait_ms=20)
+
+        results = {}
+
+        def request(i):
+            results[i] = batcher.submit({'value': i}, application_id=1000 + i)
+
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        self.assertEqual(results, {i: {'value': i, 'application_id': 1000 + i} for i in range(20)})
+        self.assertEqual(sum(predictor.batch_sizes), 20)
+        self.assertLessEqual(max(predictor.batch_sizes), 8)
+
+    def test_batch_closes_at_max_size(self):
+        # Дедлайн батча 10 с, батчи закрываются только набором max_batch_size записей
+        predictor = RecordingPredictor()
+        batcher = MicroBatcher(predictor, max_batch_size=4, max_wait_ms=10000)
+
+        started = time.perf_counter()
+        futures = [batcher.enqueue({'value': i}) for i in range(8)]
+        results = [future.result(timeout=10) for future in futures]
+
+        self.assertEqual([result['value'] for result in results], list(range(8)))
+        self.assertEqual(predictor.batch_sizes, [4, 4])
+        self.assertLess(time.perf_counter() - started, 5)
+
+    def test_batch_closes_after_max_wait(self):
+        predictor = RecordingPredictor()
+        batcher = MicroBatcher(predictor, max_batch_size=100, max_wait_ms=50)
+
+        started = time.perf_counter()
+        result = batcher.submit({'value': 1})
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(result['value'], 1)
+        self.assertEqual(predictor.batch_sizes, [1])
+        self.assertGreaterEqual(elapsed, 0.05)
+        self.assertLess(elapsed, 5)
+
+        stats = batcher.stats()
+        self.assertEqual((stats['batches'], stats['submitted']), (1, 1))
+
+    def test_batch_error_reaches_every_request(self):
+        def failing(features_list, application_ids):
+            raise RuntimeError('model failed')
+
+        batcher = MicroBatcher(failing, max_batch_size=4, max_wait_ms=50)
+        futures = [batcher.enqueue({'value': i}) for i in range(3)]
+
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=10)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'fork is not available')
+    def test_dispatcher_restarted_after_fork(self):
+        predictor = RecordingPredictor()
+        batcher = MicroBatcher(predictor, max_batch_size=4, max_wait_ms=5)
+        self.assertEqual(batcher.submit({'value': 1})['value'], 1)
+        parent_worker = batcher._worker
+
+        # В дочернем процессе (как в воркере gunicorn после fork) потока-диспетчера нет
+        pid = os.fork()
+        if pid == 0:
+            ok = False
+            try:
+                ok = (batcher.enqueue({'value': 2}).result(timeout=10)['value'] == 2
+                      and batcher._worker is not parent_worker
+                      and batcher._worker_pid == os.getpid())
+            finally:
+                os._exit(0 if ok else 1)
+
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertIs(batcher._worker, parent_worker)
+
+
+if __name__ == '__main__':
+    unittest.main()
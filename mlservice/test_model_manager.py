@@ -0,0 +1,127 @@
+"""
+Тесты предобработки model_manager: векторизованный батч-путь должен
+давать те же признаки и вероятности, что и исходный построчный путь
+(LabelEncoder на каждую запись), включая ошибку при пропущенном признаке.
+
+Запуск:
+    python -m pytest -q test_model_manager.py
+"""
+
+import os
+import pickle
+import tempfile
+import warnings
+import unittest
+
+# Модули сервиса читают настройки при импорте
+os.environ['ML_MODEL_DIR'] = tempfile.mkdtemp(prefix='mlservice-test-')
+os.environ['ML_PREDICTION_CACHE_ENABLED'] = 'false'
+os.environ['ML_DATASET_CACHE_ENABLED'] = 'false'
+
+import numpy as np
+import pandas as pd
+
+import model_manager
+from train_model import train_pipeline, generate_prototype_data
+
+
+def reference_preprocess(features: dict, bundle) -> pd.DataFrame:
+    """Построчная предобработка в исходном виде (до векторизации)"""
+    df = pd.DataFrame([features])
+
+    features_info = bundle.features
+    cat_features = [features_info['columns'][idx] for idx in features_info['categorical_indices']]
+    encoders = model_manager.load_encoders(bundle.path)
+
+    for col in cat_features:
+        if col in df.columns:
+            df[col] = df[col].astype(str)
+            if col in encoders:
+                le = encoders[col]
+                if isinstance(le, bytes):
+                    le = pickle.loads(le)
+                df[col] = le.transform(df[col])
+
+    # Исходный fillna с неявным приведением object-колонок (без FutureWarning pandas)
+    with pd.option_context('future.no_silent_downcasting', True):
+        df = df.fillna(-1).infer_objects()
+
+    return df[features_info['columns']]
+
+
+class BatchPreprocessingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        df = generate_prototype_data(n_rows=500, seed=7)
+        result = train_pipeline(df=df, n_iterations=50)
+        assert result['success'], result.get('error')
+        model_manager.reload_model()
+
+        cls.bundle = model_manager.get_bundle()
+        records = df.drop(columns=['sk_id_curr', 'target']).head(20).to_dict(orient='records')
+        # Пропуск в числовом признаке заполняется -1 в обоих путях
+        records[2]['amt_annuity'] = None
+        cls.records = records
+
+    def test_batch_features_match_per_row(self):
+        batch = model_manager.preprocess_batch_features([dict(r) for r in self.records], self.bundle)
+        expected = pd.concat(
+            [reference_preprocess(dict(r), self.bundle) for r in self.records],
+            ignore_index=True
+        )
+
+        np.testing.assert_array_equal(batch.to_numpy(dtype=float), expected.to_numpy(dtype=float))
+        self.assertEqual(list(batch.columns), list(expected.columns))
+
+    def test_batch_probabilities_match_per_row(self):
+        response = model_manager.predict_batch([dict(r) for r in self.records])
+        self.assertTrue(response['success'], response.get('error'))
+
+        for record, prediction in zip(self.records, response['predictions']):
+            single = model_manager.predict_single(dict(record))
+            self.assertTrue(single['success'], single.get('error'))
+            self.assertEqual(prediction['default_probability'], single['default_probability'])
+
+    def test_frame_not_modified(self):
+        df = pd.DataFrame([dict(r) for r in self.records])
+        original = df.copy()
+
+        features = model_manager.preprocess_frame(df, self.bundle)
+
+        pd.testing.assert_frame_equal(df, original)
+        self.assertEqual(list(features.columns), self.bundle.features['columns'])
+
+    def test_missing_only_numeric_column_without_warnings(self):
+        # В одиночной записи None дает object-колонку
+        record = dict(self.records[0], amt_annuity=None)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            features = model_manager.preprocess_batch_features([record], self.bundle)
+
+        self.assertEqual(features['amt_annuity'].tolist(), [-1])
+        np.testing.assert_array_equal(
+            features.to_numpy(dtype=float), reference_preprocess(record, self.bundle).to_numpy(dtype=float)
+        )
+
+    def test_missing_feature_raises_like_per_row(self):
+        records = [dict(r) for r in self.records]
+        del records[1]['amt_credit']
+
+        with self.assertRaises(KeyError) as expected:
+            reference_preprocess(records[1], self.bundle)
+        with self.assertRaises(KeyError) as batch:
+            model_manager.preprocess_batch_features(records, self.bundle)
+        self.assertEqual(str(batch.exception), str(expected.exception))
+
+        self.assertFalse(model_manager.predict_batch(records)['success'])
+        self.assertFalse(model_manager.predict_single(records[1])['success'])
+        with self.assertRaises(KeyError):
+            model_manager.predict_frame(pd.DataFrame(self.records).drop(columns=['amt_credit']))
+        with self.assertRaises(KeyError):
+            model_manager.predict_arrays(records)
+
+
+if __name__ == '__main__':
+    unittest.main()
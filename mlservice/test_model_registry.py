@@ -0,0 +1,191 @@
+"""
+Тесты реестра версий и перезагрузки модели: переключение указателя
+current, очистка старых версий, атомарная подмена bundle и повтор
+reload после ошибки загрузки.
+
+Запуск:
+    python -m pytest -q test_model_registry.py
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Модули сервиса читают настройки при импорте
+os.environ['ML_MODEL_DIR'] = tempfile.mkdtemp(prefix='mlservice-test-')
+os.environ['ML_PREDICTION_CACHE_ENABLED'] = 'false'
+os.environ['ML_DATASET_CACHE_ENABLED'] = 'false'
+
+import model_manager
+import model_registry
+from model_registry import MODEL_FILE
+from train_model import train_pipeline, generate_prototype_data
+
+
+class RegistryTest(unittest.TestCase):
+    """Реестр во временной директории с пустыми артефактами версий"""
+
+    def setUp(self):
+        root = Path(tempfile.mkdtemp(prefix='mlservice-registry-'))
+        patches = [
+            mock.patch.object(model_registry, 'REGISTRY_DIR', root / 'versions'),
+            mock.patch.object(model_registry, 'CURRENT_POINTER_PATH', root / 'current'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.root = root
+
+    def make_versions(self, *versions):
+        for version in versions:
+            model_registry.create_version_dir(version)
+            (model_registry.version_dir(version) / MODEL_FILE).write_bytes(b'model')
+
+    def test_promote_switches_pointer(self):
+        self.make_versions('20240101-000000-000000', '20240102-000000-000000')
+        self.assertIsNone(model_registry.current_version())
+        self.assertEqual(model_registry.current_dir(), model_registry.MODEL_DIR)
+
+        model_registry.promote_version('20240101-000000-000000')
+        self.assertEqual(model_registry.current_version(), '20240101-000000-000000')
+        model_registry.promote_version('20240102-000000-000000')
+        self.assertEqual(model_registry.current_version(), '20240102-000000-000000')
+        self.assertEqual(model_registry.current_dir(), model_registry.version_dir('20240102-000000-000000'))
+
+        # Временный файл указателя подменен через os.replace и не остается
+        self.assertEqual(sorted(p.name for p in self.root.iterdir()), ['current', 'versions'])
+
+    def test_promote_without_model_keeps_pointer(self):
+        self.make_versions('20240101-000000-000000')
+        model_registry.promote_version('20240101-000000-000000')
+        model_registry.create_version_dir('20240102-000000-000000')
+
+        for version in ('20240102-000000-000000', '20240103-000000-000000'):
+            with self.assertRaises(FileNotFoundError):
+                model_registry.promote_version(version)
+        self.assertEqual(model_registry.current_version(), '20240101-000000-000000')
+
+    def test_prune_keeps_current_and_newest(self):
+        versions = [f'2024010{day}-000000-000000' for day in range(1, 7)]
+        self.make_versions(*versions)
+        model_registry.promote_version(versions[0])
+
+        model_registry.prune_versions(keep=2)
+
+        self.assertEqual(model_registry.list_versions(), [versions[0]] + versions[-2:])
+
+    def test_promote_prunes_to_keep_versions(self):
+        keep = model_registry.KEEP_VERSIONS
+        versions = [f'202401{day:02d}-000000-000000' for day in range(1, keep + 3)]
+        self.make_versions(*versions)
+
+        model_registry.promote_version(versions[-1])
+
+        self.assertEqual(model_registry.list_versions(), versions[-keep:])
+
+    def test_prune_without_limit_keeps_everything(self):
+        versions = [f'2024010{day}-000000-000000' for day in range(1, 4)]
+        self.make_versions(*versions)
+
+        model_registry.prune_versions(keep=0)
+
+        self.assertEqual(model_registry.list_versions(), versions)
+
+
+class ReloadTest(unittest.TestCase):
+    """Перезагрузка bundle между двумя обученными версиями"""
+
+    @classmethod
+    def setUpClass(cls):
+        df = generate_prototype_data(n_rows=300, seed=11)
+        cls.versions = []
+        for _ in range(2):
+            result = train_pipeline(df=df, n_iterations=20)
+            assert result['success'], result.get('error')
+            cls.versions.append(result['model_version'])
+        cls.record = df.drop(columns=['sk_id_curr', 'target']).iloc[0].to_dict()
+
+    def setUp(self):
+        # Фоновая проверка указателя из get_bundle не вмешивается в тест
+        patch = mock.patch.object(model_manager, 'RELOAD_CHECK_INTERVAL', float('inf'))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        model_registry.promote_version(self.versions[-1])
+        model_manager.reload_model()
+
+    def test_reload_swaps_bundle(self):
+        model_registry.promote_version(self.versions[0])
+        old = model_manager.reload_model()
+        self.assertEqual(old.version, self.versions[0])
+
+        model_registry.promote_version(self.versions[1])
+        new = model_manager.reload_model()
+
+        self.assertEqual(new.version, self.versions[1])
+        self.assertIs(model_manager.get_bundle(), new)
+        # Запрос, взявший старый bundle, дорабатывает на нем целиком
+        self.assertEqual(old.version, self.versions[0])
+        self.assertEqual(len(model_manager.preprocess_batch_features([dict(self.record)], old)), 1)
+
+    def test_requests_served_by_old_bundle_during_reload(self):
+        model_registry.promote_version(self.versions[0])
+        old = model_manager.reload_model()
+        model_registry.promote_version(self.versions[1])
+
+        load_bundle = model_manager.load_bundle
+        loading = threading.Event()
+
+        def slow_load_bundle(*args, **kwargs):
+            loading.set()
+            time.sleep(0.5)
+            return load_bundle(*args, **kwargs)
+
+        with mock.patch.object(model_manager, 'load_bundle', slow_load_bundle):
+            reload = threading.Thread(target=model_manager.reload_model)
+            reload.start()
+            self.assertTrue(loading.wait(timeout=10))
+
+            started = time.perf_counter()
+            self.assertIs(model_manager.get_bundle(), old)
+            self.assertLess(time.perf_counter() - started, 0.25)
+
+            reload.join(timeout=10)
+
+        self.assertEqual(model_manager.get_bundle().version, self.versions[1])
+
+    def test_failed_background_reload_is_retried(self):
+        model_registry.promote_version(self.versions[0])
+        old = model_manager.reload_model()
+
+        # Версия с поврежденным файлом модели проходит promote, но не загружается
+        broken = model_registry.new_version()
+        model_registry.create_version_dir(broken)
+        (model_registry.version_dir(broken) / MODEL_FILE).write_bytes(b'not a model')
+        self.addCleanup(shutil.rmtree, model_registry.version_dir(broken), ignore_errors=True)
+        model_registry.promote_version(broken)
+
+        pointer_mtime = model_manager._stat_mtime(model_registry.CURRENT_POINTER_PATH)
+        model_manager._last_pointer_mtime = None
+        model_manager._reload_in_background(pointer_mtime)
+
+        self.assertIs(model_manager.get_bundle(), old)
+        # mtime не запомнен - следующая проверка указателя повторит reload
+        self.assertIsNone(model_manager._last_pointer_mtime)
+
+        model_registry.promote_version(self.versions[1])
+        pointer_mtime = model_manager._stat_mtime(model_registry.CURRENT_POINTER_PATH)
+        model_manager._reload_in_background(pointer_mtime)
+
+        self.assertEqual(model_manager.get_bundle().version, self.versions[1])
+        self.assertEqual(model_manager._last_pointer_mtime, pointer_mtime)
+
+
+if __name__ == '__main__':
+    unittest.main()
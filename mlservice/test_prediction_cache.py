@@ -0,0 +1,125 @@
+"""
+Тесты кэша предсказаний: TTL, вытеснение по числу записей и по объему,
+стабильность ключей (вектор признаков и версия модели).
+
+Запуск:
+    python -m pytest -q test_prediction_cache.py
+"""
+
+import os
+import sys
+import tempfile
+import subprocess
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+# Модули сервиса читают настройки при импорте
+os.environ['ML_MODEL_DIR'] = tempfile.mkdtemp(prefix='mlservice-test-')
+os.environ['ML_PREDICTION_CACHE_ENABLED'] = 'false'
+os.environ['ML_DATASET_CACHE_ENABLED'] = 'false'
+
+import pandas as pd
+
+import model_manager
+from prediction_cache import PredictionCache, _ENTRY_OVERHEAD_BYTES
+
+
+def entry_bytes(key, value) -> int:
+    """Оценка размера записи так же, как в PredictionCache"""
+    return sys.getsizeof(key) + sys.getsizeof(value) + _ENTRY_OVERHEAD_BYTES
+
+
+class PredictionCacheTest(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        cache = PredictionCache(max_entries=10, max_bytes=1 << 20, ttl_seconds=60, enabled=True)
+        cache.put_many([b'a', b'b'], [0.1, 0.2])
+
+        self.assertEqual(cache.get_many([b'a', b'x', b'b']), [0.1, None, 0.2])
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_entries_expire_after_ttl(self):
+        cache = PredictionCache(max_entries=10, max_bytes=1 << 20, ttl_seconds=5, enabled=True)
+
+        with mock.patch('prediction_cache.time.monotonic', return_value=100.0):
+            cache.put_many([b'a'], [0.5])
+        with mock.patch('prediction_cache.time.monotonic', return_value=104.9):
+            self.assertEqual(cache.get_many([b'a']), [0.5])
+        with mock.patch('prediction_cache.time.monotonic', return_value=105.0):
+            self.assertEqual(cache.get_many([b'a']), [None])
+
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['bytes'], stats['expirations']), (0, 0, 1))
+
+    def test_evicts_least_recently_used_by_entries(self):
+        cache = PredictionCache(max_entries=2, max_bytes=1 << 20, ttl_seconds=60, enabled=True)
+        cache.put_many([b'a', b'b'], [0.1, 0.2])
+        # Обращение к a делает самой старой запись b
+        cache.get_many([b'a'])
+        cache.put_many([b'c'], [0.3])
+
+        self.assertEqual(cache.get_many([b'a', b'b', b'c']), [0.1, None, 0.3])
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_evicts_by_bytes(self):
+        keys = [bytes([i]) * 16 for i in range(4)]
+        limit = 2 * entry_bytes(keys[0], 0.5)
+        cache = PredictionCache(max_entries=100, max_bytes=limit, ttl_seconds=60, enabled=True)
+        cache.put_many(keys, [0.5] * len(keys))
+
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertLessEqual(stats['bytes'], limit)
+        self.assertEqual(cache.get_many(keys), [None, None, 0.5, 0.5])
+
+    def test_overwrite_keeps_byte_count(self):
+        cache = PredictionCache(max_entries=10, max_bytes=1 << 20, ttl_seconds=60, enabled=True)
+        cache.put_many([b'a'], [0.1])
+        cache.put_many([b'a'], [0.2])
+
+        self.assertEqual(cache.stats()['bytes'], entry_bytes(b'a', 0.2))
+        self.assertEqual(cache.get_many([b'a']), [0.2])
+
+    def test_disabled_without_entries(self):
+        self.assertFalse(PredictionCache(max_entries=0, enabled=True).enabled)
+
+
+class CacheKeyTest(unittest.TestCase):
+
+    frame = pd.DataFrame({'amt_credit': [1000.0, 2000.0], 'code_gender': [0, 1]})
+
+    def keys(self, version: str, frame: pd.DataFrame = None):
+        return model_manager._cache_keys(SimpleNamespace(version=version), self.frame if frame is None else frame)
+
+    def test_keys_are_stable_and_distinct(self):
+        keys = self.keys('v1')
+        self.assertEqual(keys, self.keys('v1'))
+        self.assertNotEqual(keys[0], keys[1])
+        # Целые и float с тем же значением дают тот же вектор
+        self.assertEqual(keys, self.keys('v1', self.frame.astype('float32')))
+
+    def test_keys_depend_on_model_version(self):
+        self.assertNotEqual(self.keys('v1')[0], self.keys('v2')[0])
+
+    def test_keys_match_across_processes(self):
+        # Воркеры gunicorn - разные процессы, ключ не должен зависеть от hash seed
+        code = (
+            "import pandas as pd, model_manager; from types import SimpleNamespace; "
+            "df = pd.DataFrame({'amt_credit': [1000.0, 2000.0], 'code_gender': [0, 1]}); "
+            "print([k.hex() for k in model_manager._cache_keys(SimpleNamespace(version='v1'), df)])"
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', code], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), env={**os.environ, 'PYTHONHASHSEED': '123'}
+        ).stdout.strip().splitlines()[-1]
+
+        self.assertEqual(output, str([key.hex() for key in self.keys('v1')]))
+
+    def test_non_numeric_features_are_not_cached(self):
+        self.assertIsNone(self.keys('v1', pd.DataFrame({'code_gender': ['F', 'M']})))
+
+
+if __name__ == '__main__':
+    unittest.main()
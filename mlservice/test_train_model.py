@@ -0,0 +1,141 @@
+"""
+Тесты предобработки train_model: коды категорий совпадают с исходным
+путем (LabelEncoder по astype(str)), числовые колонки получают
+компактные типы с заполнением пропусков -1.
+
+Запуск:
+    python -m pytest -q test_train_model.py
+"""
+
+import os
+import json
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+
+# Модули сервиса читают настройки при импорте
+os.environ['ML_MODEL_DIR'] = tempfile.mkdtemp(prefix='mlservice-test-')
+os.environ['ML_DATASET_CACHE_ENABLED'] = 'false'
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from train_model import (
+    _encode_categorical, _compact_numeric, preprocess_data, generate_prototype_data,
+    ENCODER_FILE, ENCODING_TABLES_FILE
+)
+
+
+def reference_encode(values: pd.Series) -> tuple:
+    """Кодирование категорий в исходном виде (до компактных фреймов)"""
+    le = LabelEncoder()
+    codes = le.fit_transform(values.astype(str))
+    return codes, le.classes_
+
+
+class EncodeCategoricalTest(unittest.TestCase):
+
+    def assert_matches_reference(self, values: pd.Series):
+        codes, classes = _encode_categorical(values)
+        expected_codes, expected_classes = reference_encode(values)
+
+        np.testing.assert_array_equal(codes, expected_codes)
+        self.assertEqual(list(classes), list(expected_classes))
+
+    def test_strings(self):
+        self.assert_matches_reference(pd.Series(['M', 'F', 'M', 'XNA', 'F']))
+
+    def test_missing_values(self):
+        # None и NaN остаются разными классами ('None' и 'nan')
+        self.assert_matches_reference(pd.Series(['b', None, 'a', np.nan, None], dtype=object))
+
+    def test_mixed_types_with_same_string(self):
+        # 1 и '1' дают одну строку и один класс
+        self.assert_matches_reference(pd.Series([1, '1', 'a', 2.5, 'a'], dtype=object))
+
+    def test_categorical_dtype(self):
+        values = pd.Series(pd.Categorical(['y', 'x', None, 'y'], categories=['y', 'x', 'z']))
+        codes, classes = _encode_categorical(values)
+        # NULL кодируется как None из pd.read_sql, неиспользуемая категория
+        # остается в классах и не сдвигает коды
+        expected_codes, _ = reference_encode(pd.Series(['y', 'x', None, 'y'], dtype=object))
+
+        np.testing.assert_array_equal(codes, expected_codes)
+        self.assertEqual(list(classes), ['None', 'x', 'y', 'z'])
+
+    def test_codes_use_smallest_int_dtype(self):
+        self.assertEqual(_encode_categorical(pd.Series(['a', 'b']))[0].dtype, np.int8)
+        many = pd.Series([f'v{i}' for i in range(300)])
+        self.assertEqual(_encode_categorical(many)[0].dtype, np.int16)
+
+
+class CompactNumericTest(unittest.TestCase):
+
+    def test_integers_downcast(self):
+        array = _compact_numeric(pd.Series([0, 1, 100], dtype=np.int64))
+        self.assertEqual(array.dtype, np.int8)
+        np.testing.assert_array_equal(array, [0, 1, 100])
+
+        self.assertEqual(_compact_numeric(pd.Series([0, 40000], dtype=np.int64)).dtype, np.int32)
+
+    def test_bool_to_int8(self):
+        array = _compact_numeric(pd.Series([True, False]))
+        self.assertEqual(array.dtype, np.int8)
+        np.testing.assert_array_equal(array, [1, 0])
+
+    def test_float_with_missing_values(self):
+        array = _compact_numeric(pd.Series([1.5, np.nan, 3.0]))
+        self.assertEqual(array.dtype, np.float32)
+        np.testing.assert_array_equal(array, [1.5, -1, 3.0])
+
+    def test_nullable_integer_with_missing_values(self):
+        array = _compact_numeric(pd.Series([1, None, 3], dtype='Int64'))
+        self.assertEqual(array.dtype, np.float32)
+        np.testing.assert_array_equal(array, [1, -1, 3])
+
+    def test_input_not_modified(self):
+        values = pd.Series([1.0, np.nan])
+        _compact_numeric(values)
+        self.assertTrue(np.isnan(values.iloc[1]))
+
+
+class PreprocessDataTest(unittest.TestCase):
+
+    def test_matches_reference_frame(self):
+        df = generate_prototype_data(n_rows=300, seed=3)
+        df.loc[df.index[:5], 'amt_annuity'] = np.nan
+        df.loc[df.index[5:8], 'code_gender'] = None
+        output_dir = Path(tempfile.mkdtemp(prefix='mlservice-test-'))
+
+        X_train, X_valid, _, _, columns, cat_indices = preprocess_data(df, output_dir)
+        features = pd.concat([X_train, X_valid]).loc[df.index]
+
+        expected = df.drop(columns=['sk_id_curr', 'target'])
+        for col in expected.columns:
+            if expected[col].dtype == 'object':
+                expected[col] = reference_encode(expected[col])[0]
+        expected = expected.fillna(-1)
+
+        self.assertEqual(columns, list(expected.columns))
+        self.assertEqual(
+            [columns[idx] for idx in cat_indices],
+            [col for col in df.columns if df[col].dtype == 'object']
+        )
+        np.testing.assert_allclose(features.to_numpy(dtype=float), expected.to_numpy(dtype=float), rtol=1e-6)
+
+        # Сохраненные encoders и таблицы кодирования соответствуют кодам
+        with open(output_dir / ENCODER_FILE, 'rb') as f:
+            encoders = pickle.load(f)
+        with open(output_dir / ENCODING_TABLES_FILE) as f:
+            tables = json.load(f)['columns']
+        for idx in cat_indices:
+            col = columns[idx]
+            classes = reference_encode(df[col])[1]
+            self.assertEqual(list(pickle.loads(encoders[col]).classes_), list(classes))
+            self.assertEqual(tables[col], list(classes))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Тесты бюджетов successive halving в tuning: число раундов, рост бюджетов
+и ошибка, когда два разных бюджета невозможны.
+
+Запуск:
+    python -m pytest -q test_tuning.py
+"""
+
+import os
+import tempfile
+import unittest
+
+# Модули сервиса читают настройки при импорте
+os.environ['ML_MODEL_DIR'] = tempfile.mkdtemp(prefix='mlservice-test-')
+os.environ['ML_DATASET_CACHE_ENABLED'] = 'false'
+
+from tuning import _rung_budgets
+
+
+class RungBudgetsTest(unittest.TestCase):
+
+    def assert_rungs(self, budgets, max_iterations):
+        self.assertEqual(budgets, sorted(set(budgets)))
+        self.assertLessEqual(budgets[-1], max_iterations)
+
+    def test_single_rung_up_to_eta_candidates(self):
+        for eta in (2, 3):
+            for n_candidates in range(1, eta + 1):
+                budgets = _rung_budgets(n_candidates, 1000, eta, 100)
+                self.assertEqual(budgets, [1000 // eta], (n_candidates, eta))
+
+    def test_eta_plus_one_candidates_get_two_rungs(self):
+        for eta in (2, 3, 4):
+            budgets = _rung_budgets(eta + 1, 1000, eta, 100)
+            self.assertEqual(len(budgets), 2, eta)
+            self.assert_rungs(budgets, 1000)
+
+    def test_eta_squared_candidates_get_two_rungs(self):
+        for eta in (2, 3, 5):
+            budgets = _rung_budgets(eta ** 2, 1000, eta, 10)
+            self.assertEqual(len(budgets), 2, eta)
+            self.assert_rungs(budgets, 1000)
+            self.assertEqual(len(_rung_budgets(eta ** 2 + 1, 1000, eta, 10)), 3, eta)
+
+    def test_exact_power_of_eta(self):
+        # math.log(125, 5) чуть больше 3, раундов все равно три
+        self.assertEqual(len(_rung_budgets(125, 10000, 5, 10)), 3)
+
+    def test_budgets_lifted_to_minimum(self):
+        self.assertEqual(_rung_budgets(6, 300, 3, 100), [100, 300])
+        self.assertEqual(_rung_budgets(12, 1000, 3, 100), [100, 300, 900])
+
+    def test_too_small_budget_raises(self):
+        with self.assertRaises(ValueError):
+            _rung_budgets(4, 2, 3, 100)
+        # Один раунд возможен при любом бюджете
+        self.assertEqual(_rung_budgets(3, 2, 3, 100), [1])
+        self.assertEqual(_rung_budgets(4, 3, 3, 100), [1, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,12 @@
 
 import os
 import pickle
+import shutil
+import resource
 import json
+import time
+import argparse
+import tempfile
 from pathlib import Path
 from datetime import datetime
 import logging
@@ -15,21 +20,38 @@ import numpy as np
 from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import roc_auc_score
-from catboost import CatBoostClassifier
-import joblib
+from catboost import CatBoostClassifier, Pool
+
+from dataset_cache import (
+    DATASET_CACHE_ENABLED,
+    file_fingerprint,
+    dataset_key,
+    load_dataset,
+    store_dataset,
+    copy_artifacts,
+    quantized_pool_path,
+    store_quantized_pool,
+    quantize_train_pool
+)
+from model_registry import (
+    MODEL_DIR,
+    MODEL_FILE,
+    ENCODER_FILE,
+    ENCODING_TABLES_FILE,
+    FEATURES_FILE,
+    STATUS_FILE,
+    TUNING_FILE,
+    new_version,
+    create_version_dir,
+    promote_version
+)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Пути
-MODEL_DIR = Path('/app/models')
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
-MODEL_PATH = MODEL_DIR / 'catboost_default_risk.pkl'
-ENCODER_PATH = MODEL_DIR / 'label_encoder.pkl'
-FEATURES_PATH = MODEL_DIR / 'feature_columns.json'
-
 # Статус модели
 MODEL_STATUS = {
     'version': 'v1.0.0',
@@ -39,6 +61,32 @@ MODEL_STATUS = {
 }
 
 
+# Версия предобработки (часть ключа кэша датасетов): увеличивается при
+# любом изменении preprocess_data или параметров разбиения train/valid
+PREPROCESSING_VERSION = 2
+
+# Гиперпараметры CatBoost по умолчанию (как в original notebook),
+# подбор - tuning.py
+DEFAULT_PARAMS = {
+    'learning_rate': 0.1,
+    'depth': 7,
+    'l2_leaf_reg': 40,
+    'bootstrap_type': 'Bernoulli',
+    'subsample': 0.7,
+    'scale_pos_weight': 5,
+    'eval_metric': 'AUC',
+    'metric_period': 50,
+    'od_type': 'Iter',
+    'od_wait': 45,
+    'random_seed': 17,
+    'allow_writing_files': False
+}
+
+
+class TrainingCancelled(Exception):
+    """Обучение остановлено по запросу отмены задачи"""
+
+
 def load_training_data_from_csv(csv_path: str = None) -> pd.DataFrame:
     """Загрузка данных из CSV файла (для прототипа)"""
     if csv_path is None:
@@ -51,28 +99,32 @@ def load_training_data_from_csv(csv_path: str = None) -> pd.DataFrame:
     return None
 
 
+def load_training_data_from_file(dataset_path: str) -> pd.DataFrame:
+    """Загрузка датасета в формате витрины из CSV или Parquet файла"""
+    if not os.path.exists(dataset_path):
+        raise FileNotFoundError(f"Dataset not found: {dataset_path}")
+    
+    if dataset_path.endswith('.parquet'):
+        return pd.read_parquet(dataset_path)
+    return load_training_data_from_csv(dataset_path)
+
+
 def load_training_data_from_greenplum():
-    """Загрузка данных из Greenplum training_mart"""
+    """
+    Загрузка данных из Greenplum training_mart.
+    Витрина выгружается через COPY (или server-side курсором, ML_TRAIN_LOADER)
+    с компактными типами по DDL и опциональным Parquet кэшем, см. greenplum.py
+    """
     try:
-        import psycopg2
-        from psycopg2.extras import RealDictCursor
-        
-        conn = psycopg2.connect(
-            host=os.environ.get('GREENPLUM_HOST', 'gpdb'),
-            port=os.environ.get('GREENPLUM_PORT', '5432'),
-            database=os.environ.get('GREENPLUM_DB', 'bank_dwh'),
-            user=os.environ.get('GREENPLUM_USER', 'bank_user'),
-            password=os.environ.get('GREENPLUM_PASSWORD', 'bank_pass')
+        from greenplum import load_training_frame
+
+        df, report = load_training_frame()
+
+        logger.info(
+            f"Loaded {len(df)} records from Greenplum ({report['loader']}, {report['seconds']} s): "
+            f"{report.get('frame_mb')} MB frame, "
+            f"peak RSS {report['peak_rss_mb']} MB"
         )
-        
-        query = """
-            SELECT * FROM training_mart.homecredit_features
-        """
-        
-        df = pd.read_sql(query, conn)
-        conn.close()
-        
-        logger.info(f"Loaded {len(df)} records from Greenplum")
         return df
         
     except Exception as e:
@@ -80,9 +132,89 @@ def load_training_data_from_greenplum():
         return None
 
 
-def preprocess_data(df: pd.DataFrame):
+def source_fingerprint(dataset_path: str = None):
+    """
+    Отпечаток источника данных для кэша датасетов: файл dataset_path
+    или витрина Greenplum. None - отпечаток недоступен, кэш не используется
+    """
+    try:
+        if dataset_path:
+            return file_fingerprint(dataset_path)
+        
+        from greenplum import table_fingerprint
+        return table_fingerprint()
+    
+    except Exception as e:
+        logger.warning(f"Source fingerprint unavailable, dataset cache skipped: {e}")
+        return None
+
+
+def _peak_rss_mb() -> float:
+    """Пиковый RSS процесса обучения, МБ"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _smallest_int_dtype(max_value: int):
+    """Минимальный знаковый целый тип для значений 0..max_value"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _encode_categorical(values: pd.Series) -> tuple:
+    """
+    Label encoding без строковой копии колонки.
+    В строки переводятся только уникальные значения, коды переставляются
+    в порядок отсортированных классов - результат совпадает с
+    LabelEncoder по astype(str). Возвращает (коды, классы).
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        uniques = [str(value) for value in values.cat.categories]
+        if (codes < 0).any():
+            # NULL кодируется как при чтении через pd.read_sql ('None')
+            codes = np.where(codes < 0, len(uniques), codes)
+            uniques.append('None')
+    else:
+        codes, uniques = pd.factorize(values)
+        uniques = [str(value) for value in uniques]
+        missing = codes < 0
+        if missing.any():
+            # None и NaN дают разные строки ('None'/'nan'), как при astype(str)
+            na_codes, na_uniques = pd.factorize(values[missing].astype(str))
+            codes[missing] = na_codes + len(uniques)
+            uniques.extend(na_uniques)
+
+    # Разные значения могут давать одну строку (1 и '1'), np.unique их объединяет
+    classes, remap = np.unique(np.asarray(uniques, dtype=object), return_inverse=True)
+    codes = remap.astype(_smallest_int_dtype(len(classes)))[codes]
+
+    return codes, classes
+
+
+def _compact_numeric(values: pd.Series) -> np.ndarray:
+    """
+    Числовая колонка в компактном типе: целые без пропусков - минимальный
+    целый тип, остальное - float32 с заполнением пропусков -1 на месте
+    """
+    if pd.api.types.is_bool_dtype(values.dtype):
+        return values.to_numpy(dtype=np.int8)
+
+    if pd.api.types.is_integer_dtype(values.dtype) and not values.hasnans:
+        return pd.to_numeric(values, downcast='integer').to_numpy()
+
+    array = values.to_numpy(dtype=np.float32, na_value=np.nan, copy=True)
+    np.putmask(array, np.isnan(array), -1)
+    return array
+
+
+def preprocess_data(df: pd.DataFrame, output_dir: Path = MODEL_DIR):
     """
     Предобработка данных как в original notebook.
+    Признаки собираются поколоночно в компактных типах (float32,
+    минимальные целые, коды категорий) без промежуточных копий фрейма.
+    Encoders и список признаков сохраняются в output_dir (директория версии).
     Возвращает: X_train, X_valid, y_train, y_valid, features_columns, cat_features_indices
     """
     if df is None or df.empty:
@@ -95,35 +227,47 @@ def preprocess_data(df: pd.DataFrame):
     # Получаем целевую переменную
     target = df['target']
     
-    # Удаляем ID и target из признаков
-    df_features = df.drop(columns=['sk_id_curr', 'target'])
+    # Признаки - все колонки кроме ID и target
+    feature_names = [col for col in df.columns if col not in ('sk_id_curr', 'target')]
     
     # Определяем категориальные признаки
-    cat_features = [col for col in df_features.columns if df_features[col].dtype == 'object']
+    cat_features = [
+        col for col in feature_names
+        if df[col].dtype == 'object' or isinstance(df[col].dtype, pd.CategoricalDtype)
+    ]
     
-    # Кодируем категориальные признаки
-    le = LabelEncoder()
-    
-    # Сохраняем encoder
+    # Кодируем категориальные признаки, числовые приводим к компактным типам
+    # с заполнением пропусков -1
     encoders = {}
-    for col in cat_features:
-        df_features[col] = df_features[col].astype(str)
-        df_features[col] = le.fit_transform(df_features[col])
-        encoders[col] = pickle.dumps(le)
+    encoding_tables = {}
+    features = {}
+    for col in feature_names:
+        if col in cat_features:
+            features[col], classes = _encode_categorical(df[col])
+            le = LabelEncoder()
+            le.classes_ = classes
+            encoders[col] = pickle.dumps(le)
+            encoding_tables[col] = classes.tolist()
+        else:
+            features[col] = _compact_numeric(df[col])
+    
+    df_features = pd.DataFrame(features, index=df.index, copy=False)
+    del features
     
     # Сохраняем label encoder
-    with open(ENCODER_PATH, 'wb') as f:
+    with open(output_dir / ENCODER_FILE, 'wb') as f:
         pickle.dump(encoders, f)
     
-    # Заполняем пропуски
-    df_features = df_features.fillna(-1)
+    # Сохраняем таблицы кодирования для быстрого инференса
+    with open(output_dir / ENCODING_TABLES_FILE, 'w') as f:
+        json.dump({'unknown_code': -1, 'columns': encoding_tables}, f)
     
     # Получаем индексы категориальных признаков
     all_columns = df_features.columns.tolist()
     cat_feature_indices = [all_columns.index(col) for col in cat_features]
     
     # Сохраняем список колонок
-    with open(FEATURES_PATH, 'w') as f:
+    with open(output_dir / FEATURES_FILE, 'w') as f:
         json.dump({
             'columns': all_columns,
             'categorical_indices': cat_feature_indices
@@ -138,6 +282,10 @@ def preprocess_data(df: pd.DataFrame):
     )
     
     logger.info(f"Train size: {len(X_train)}, Valid size: {len(X_valid)}")
+    logger.info(
+        f"Train frame: {X_train.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MB, "
+        f"peak RSS {_peak_rss_mb()} MB"
+    )
     logger.info(f"Cat features: {cat_features}")
     logger.info(f"Cat feature indices: {cat_feature_indices}")
     
@@ -150,36 +298,43 @@ def train_model(
     X_valid: pd.DataFrame,
     y_valid: pd.Series,
     cat_features_indices: list,
-    n_iterations: int = 1000
+    n_iterations: int = 1000,
+    callbacks: list = None,
+    params: dict = None,
+    pool_path: Path = None
 ) -> CatBoostClassifier:
     """
-    Обучение CatBoost модели
+    Обучение CatBoost модели.
+    callbacks - объекты с after_iteration(info) (прогресс и отмена задачи),
+    params - гиперпараметры поверх DEFAULT_PARAMS (результат подбора),
+    pool_path - квантованный Pool обучающей выборки из кэша датасетов:
+    обучение без повторного построения границ и квантования
     """
     logger.info("Training CatBoost model...")
     
     model = CatBoostClassifier(
         iterations=n_iterations,
-        learning_rate=0.1,
-        depth=7,
-        l2_leaf_reg=40,
-        bootstrap_type='Bernoulli',
-        subsample=0.7,
-        scale_pos_weight=5,
-        eval_metric='AUC',
-        metric_period=50,
-        od_type='Iter',
-        od_wait=45,
-        random_seed=17,
-        allow_writing_files=False,
+        **{**DEFAULT_PARAMS, **(params or {})},
         verbose=True
     )
     
+    if pool_path is not None:
+        model.fit(
+            Pool(f'quantized://{pool_path}'),
+            eval_set=Pool(X_valid, y_valid, cat_features=cat_features_indices),
+            use_best_model=True,
+            verbose=True,
+            callbacks=callbacks
+        )
+        return model
+    
     model.fit(
         X_train, y_train,
         eval_set=(X_valid, y_valid),
         cat_features=cat_features_indices,
         use_best_model=True,
-        verbose=True
+        verbose=True,
+        callbacks=callbacks
     )
     
     return model
@@ -202,90 +357,238 @@ def evaluate_model(model: CatBoostClassifier, X_valid: pd.DataFrame, y_valid: pd
     return metrics
 
 
-def save_model(model: CatBoostClassifier, metrics: dict):
+def save_model(model: CatBoostClassifier, metrics: dict, output_dir: Path = MODEL_DIR):
     """
-    Сохранение модели и метрик
+    Сохранение модели и метрик в директорию версии
     """
-    joblib.dump(model, MODEL_PATH)
+    model_path = output_dir / MODEL_FILE
+    
+    # Нативный бинарный формат CatBoost (cbm)
+    model.save_model(str(model_path), format='cbm')
     
     # Обновляем статус
     MODEL_STATUS['status'] = 'trained'
     MODEL_STATUS['last_trained'] = datetime.now().isoformat()
     MODEL_STATUS['metrics'] = metrics
     
-    status_path = MODEL_DIR / 'model_status.json'
-    with open(status_path, 'w') as f:
+    with open(output_dir / STATUS_FILE, 'w') as f:
         json.dump(MODEL_STATUS, f, indent=2)
     
-    logger.info(f"Model saved to {MODEL_PATH}")
+    logger.info(f"Model saved to {model_path}")
     logger.info(f"Model status: {MODEL_STATUS}")
+    
+    return model_path
 
 
-def train_pipeline():
+def generate_prototype_data(n_rows: int = 1000, seed: int = None) -> pd.DataFrame:
+    """Синтетические данные в формате витрины (если Greenplum недоступен)"""
+    rng = np.random.RandomState(seed)
+    
+    return pd.DataFrame({
+        'sk_id_curr': range(1, n_rows + 1),
+        'target': rng.choice([0, 1], n_rows, p=[0.8, 0.2]),
+        'amt_income_total': rng.uniform(20000, 500000, n_rows),
+        'amt_credit': rng.uniform(50000, 1000000, n_rows),
+        'amt_annuity': rng.uniform(1000, 50000, n_rows),
+        'cnt_children': rng.randint(0, 6, n_rows),
+        'code_gender': rng.choice(['M', 'F'], n_rows),
+        'flag_own_car': rng.choice(['Y', 'N'], n_rows),
+        'flag_own_realty': rng.choice(['Y', 'N'], n_rows),
+        'days_birth': rng.randint(-20000, -5000, n_rows),
+        'days_employed': rng.randint(-10000, -100, n_rows),
+        'ext_source_1': rng.uniform(0, 1, n_rows),
+        'ext_source_2': rng.uniform(0, 1, n_rows),
+        'ext_source_3': rng.uniform(0, 1, n_rows),
+        'region_rating_client': rng.randint(1, 4, n_rows),
+        'organization_type': rng.choice(['Business Entity', 'Industry', 'Trade', 'Service'], n_rows),
+        'pos_cash_balance_avg': rng.uniform(0, 50000, n_rows),
+        'credit_card_balance_avg': rng.uniform(0, 100000, n_rows),
+        'bureau_credit_sum_avg': rng.uniform(0, 200000, n_rows),
+        'prev_app_annuity_avg': rng.uniform(0, 30000, n_rows),
+    })
+
+
+def train_pipeline(promote: bool = True, df: pd.DataFrame = None, n_iterations: int = 1000,
+                   dataset_path: str = None, progress=None, tune: bool = False,
+                   tune_trials: int = None):
     """
-    Полный пайплайн обучения модели
+    Полный пайплайн обучения модели.
+    promote=False оставляет версию в реестре без переключения current
+    (challenger для shadow-скоринга). df - готовые данные вместо
+    загрузки из Greenplum (бенчмарки, офлайн-запуск), dataset_path -
+    CSV/Parquet файл в формате витрины.
+    tune=True - подбор гиперпараметров (tuning.py) перед обучением,
+    лучшие параметры и журнал trials сохраняются в директорию версии.
+    progress - прогресс задачи обучения (training_jobs.TrainingProgress):
+    отметки шагов, callback итераций CatBoost и отмена.
     """
     global MODEL_STATUS
     
+    output_dir = None
+    cached = None
+    fingerprint = None
+    cache_key = None
+    
+    def stage(name: str):
+        if progress is not None:
+            progress.stage(name)
+    
     try:
         # 1. Загрузка данных
         logger.info("Step 1: Loading training data...")
-        df = load_training_data_from_greenplum()
+        stage('loading')
+        if df is None and DATASET_CACHE_ENABLED:
+            # Неизменные данные - выборки из кэша без загрузки и предобработки
+            fingerprint = source_fingerprint(dataset_path)
+            if fingerprint is not None:
+                cache_key = dataset_key(fingerprint, PREPROCESSING_VERSION)
+                cached = load_dataset(cache_key)
         
-        if df is None or df.empty:
+        if cached is not None:
+            logger.info(f"Using cached preprocessed dataset {cached['key']}")
+        elif df is None and dataset_path:
+            df = load_training_data_from_file(dataset_path)
+        elif df is None:
+            df = load_training_data_from_greenplum()
+        
+        if cached is None and (df is None or df.empty):
             logger.warning("No data from Greenplum, using prototype data")
-            # Прототипные данные
-            df = pd.DataFrame({
-                'sk_id_curr': range(1, 1001),
-                'target': np.random.choice([0, 1], 1000, p=[0.8, 0.2]),
-                'amt_income_total': np.random.uniform(20000, 500000, 1000),
-                'amt_credit': np.random.uniform(50000, 1000000, 1000),
-                'amt_annuity': np.random.uniform(1000, 50000, 1000),
-                'cnt_children': np.random.randint(0, 6, 1000),
-                'code_gender': np.random.choice(['M', 'F'], 1000),
-                'flag_own_car': np.random.choice(['Y', 'N'], 1000),
-                'flag_own_realty': np.random.choice(['Y', 'N'], 1000),
-                'days_birth': np.random.randint(-20000, -5000, 1000),
-                'days_employed': np.random.randint(-10000, -100, 1000),
-                'ext_source_1': np.random.uniform(0, 1, 1000),
-                'ext_source_2': np.random.uniform(0, 1, 1000),
-                'ext_source_3': np.random.uniform(0, 1, 1000),
-                'region_rating_client': np.random.randint(1, 4, 1000),
-                'organization_type': np.random.choice(['Business Entity', 'Industry', 'Trade', 'Service'], 1000),
-                'pos_cash_balance_avg': np.random.uniform(0, 50000, 1000),
-                'credit_card_balance_avg': np.random.uniform(0, 100000, 1000),
-                'bureau_credit_sum_avg': np.random.uniform(0, 200000, 1000),
-                'prev_app_annuity_avg': np.random.uniform(0, 30000, 1000),
-            })
+            df = generate_prototype_data()
+            fingerprint = None
+            cache_key = None
+        if df is not None:
+            logger.info(f"Data loaded: {len(df)} rows, peak RSS {_peak_rss_mb()} MB")
+        
+        # Директория новой версии в реестре
+        version = new_version()
+        output_dir = create_version_dir(version)
+        MODEL_STATUS['version'] = version
         
         # 2. Предобработка
         logger.info("Step 2: Preprocessing data...")
-        X_train, X_valid, y_train, y_valid, feature_columns, cat_indices = preprocess_data(df)
+        stage('preprocessing')
+        if cached is not None:
+            copy_artifacts(cached['artifacts_dir'], output_dir)
+            X_train, X_valid = cached['X_train'], cached['X_valid']
+            y_train, y_valid = cached['y_train'], cached['y_valid']
+            feature_columns, cat_indices = cached['feature_columns'], cached['cat_indices']
+        else:
+            X_train, X_valid, y_train, y_valid, feature_columns, cat_indices = preprocess_data(df, output_dir)
+            if cache_key is not None:
+                store_dataset(
+                    cache_key, fingerprint, PREPROCESSING_VERSION,
+                    X_train, X_valid, y_train, y_valid, feature_columns, cat_indices, output_dir
+                )
+        del df
+        
+        # Квантованный Pool строится один раз на отпечаток данных
+        pool_path = None
+        pool_cache = None
+        quantize_seconds = None
+        if cache_key is not None:
+            pool_path = quantized_pool_path(cache_key)
+            pool_cache = 'hit' if pool_path is not None else 'miss'
+            if pool_path is None:
+                started = time.perf_counter()
+                pool_path = store_quantized_pool(cache_key, X_train, y_train, cat_indices)
+                quantize_seconds = round(time.perf_counter() - started, 3)
+        
+        # 3. Подбор гиперпараметров и обучение
+        params = None
+        tuning = None
+        if tune:
+            from tuning import tune_hyperparameters, TUNE_TRIALS
+            
+            logger.info("Step 3: Searching hyperparameters...")
+            stage('tuning')
+            tuning = tune_hyperparameters(
+                X_train, y_train, X_valid, y_valid, cat_indices,
+                max_iterations=n_iterations,
+                n_trials=tune_trials or TUNE_TRIALS,
+                progress=progress,
+                pool_path=pool_path
+            )
+            params = tuning['best_params']
+            
+            with open(output_dir / TUNING_FILE, 'w') as f:
+                json.dump(tuning, f, indent=2)
+            logger.info(f"Best hyperparameters: {params} (AUC {tuning['best_auc']})")
         
-        # 3. Обучение
         logger.info("Step 3: Training model...")
-        model = train_model(X_train, y_train, X_valid, y_valid, cat_indices)
+        stage('training')
+        started = time.perf_counter()
+        model = train_model(
+            X_train, y_train, X_valid, y_valid, cat_indices,
+            n_iterations=n_iterations,
+            callbacks=[progress] if progress is not None else None,
+            params=params,
+            pool_path=pool_path
+        )
+        fit_seconds = round(time.perf_counter() - started, 3)
+        logger.info(
+            f"Model trained in {fit_seconds} s (quantized pool: {pool_cache or 'not used'}), "
+            f"peak RSS {_peak_rss_mb()} MB"
+        )
         
         # 4. Оценка
         logger.info("Step 4: Evaluating model...")
+        stage('evaluating')
         metrics = evaluate_model(model, X_valid, y_valid)
         
         # 5. Сохранение
         logger.info("Step 5: Saving model...")
-        save_model(model, metrics)
+        stage('saving')
+        model_path = save_model(model, metrics, output_dir)
+        
+        # 6. Публикация версии (атомарное переключение current)
+        if promote:
+            logger.info("Step 6: Promoting model version...")
+            stage('promoting')
+            promote_version(version)
+        else:
+            logger.info(f"Step 6: Version {version} saved as challenger, current is unchanged")
+        # Версия записана полностью, при ошибке ниже ее удалять нельзя
+        output_dir = None
         
         MODEL_STATUS['status'] = 'ready'
+        peak_rss_mb = _peak_rss_mb()
+        logger.info(f"Training run peak RSS: {peak_rss_mb} MB")
         
         return {
             'success': True,
             'model_version': MODEL_STATUS['version'],
             'metrics': metrics,
             'feature_count': len(feature_columns),
-            'model_path': str(MODEL_PATH)
+            'model_path': str(model_path),
+            'peak_rss_mb': peak_rss_mb,
+            'hyperparameters': params,
+            'dataset_cache': ('hit' if cached is not None else 'miss') if cache_key is not None else None,
+            'fit': {
+                'quantized_pool': pool_cache if pool_path is not None else None,
+                'quantize_seconds': quantize_seconds,
+                'fit_seconds': fit_seconds
+            },
+            'tuning': {key: value for key, value in tuning.items() if key != 'trials'} if tuning else None
+        }
+    
+    except TrainingCancelled as e:
+        logger.warning(f"Training cancelled: {e}")
+        # Незавершенная версия не должна попасть в реестр
+        if output_dir is not None:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        MODEL_STATUS['status'] = 'cancelled'
+        return {
+            'success': False,
+            'cancelled': True,
+            'error': str(e),
+            'model_version': MODEL_STATUS['version']
         }
         
     except Exception as e:
         logger.error(f"Training failed: {e}")
+        # Недописанная версия не должна попасть в реестр
+        if output_dir is not None:
+            shutil.rmtree(output_dir, ignore_errors=True)
         MODEL_STATUS['status'] = 'failed'
         return {
             'success': False,
@@ -294,6 +597,74 @@ def train_pipeline():
         }
 
 
-if __name__ == '__main__':
-    result = train_pipeline()
+def benchmark_pool_fit(dataset_path: str = None, n_iterations: int = 1000) -> dict:
+    """
+    Время обучения без кэшированного Pool (из DataFrame, границы и
+    квантование CatBoost строит сам) и с ним (квантование один раз,
+    затем обучение из Pool) на одних выборках. Данные - dataset_path
+    или витрина Greenplum. Модели обоих способов должны совпадать.
+    """
+    if dataset_path:
+        df = load_training_data_from_file(dataset_path)
+    else:
+        df = load_training_data_from_greenplum()
+    if df is None or df.empty:
+        logger.warning("No data from Greenplum, using prototype data")
+        df = generate_prototype_data()
+    
+    with tempfile.TemporaryDirectory(prefix='mlservice-pool-bench-') as tmp_dir:
+        work_dir = Path(tmp_dir)
+        X_train, X_valid, y_train, y_valid, _, cat_indices = preprocess_data(df, work_dir)
+        rows = len(df)
+        del df
+        
+        started = time.perf_counter()
+        dataframe_model = train_model(X_train, y_train, X_valid, y_valid, cat_indices, n_iterations=n_iterations)
+        dataframe_fit_seconds = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        pool_path = quantize_train_pool(X_train, y_train, cat_indices, work_dir)
+        quantize_seconds = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        pool_model = train_model(
+            X_train, y_train, X_valid, y_valid, cat_indices,
+            n_iterations=n_iterations,
+            pool_path=pool_path
+        )
+        pool_fit_seconds = time.perf_counter() - started
+    
+    max_diff = np.abs(
+        dataframe_model.predict_proba(X_valid)[:, 1] - pool_model.predict_proba(X_valid)[:, 1]
+    ).max()
+    
+    return {
+        'rows': rows,
+        'n_iterations': n_iterations,
+        'tree_count': pool_model.tree_count_,
+        'dataframe_fit_seconds': round(dataframe_fit_seconds, 3),
+        'quantize_seconds': round(quantize_seconds, 3),
+        'pool_fit_seconds': round(pool_fit_seconds, 3),
+        'speedup': round(dataframe_fit_seconds / pool_fit_seconds, 2) if pool_fit_seconds else None,
+        'max_prediction_diff': float(max_diff)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Обучение модели ML-сервиса')
+    parser.add_argument('--dataset', default=None, help='CSV/Parquet файл в формате витрины')
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--benchmark-pool', action='store_true',
+                        help='Сравнить время обучения из DataFrame и из квантованного Pool')
+    args = parser.parse_args(argv)
+    
+    if args.benchmark_pool:
+        print(json.dumps(benchmark_pool_fit(args.dataset, args.iterations), indent=2))
+        return
+    
+    result = train_pipeline(n_iterations=args.iterations, dataset_path=args.dataset)
     print(f"\nTraining result: {result}")
+
+
+if __name__ == '__main__':
+    main()
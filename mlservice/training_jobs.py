@@ -0,0 +1,327 @@
+"""
+Асинхронные задачи обучения.
+POST /ml/train ставит задачу и сразу возвращает job_id, обучение идет
+в отдельном spawn-процессе. Состояние и прогресс (итерация, AUC,
+прошедшее время, ETA) процесс обучения пишет в файл задачи в
+MODEL_DIR/jobs, поэтому статус доступен из любого воркера gunicorn.
+Одновременно выполняется одно обучение (файловая блокировка),
+отмена - флаг-файл, который проверяется на каждой итерации CatBoost
+и между шагами пайплайна.
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import asyncio
+import multiprocessing
+from datetime import datetime
+import logging
+
+from model_registry import MODEL_DIR
+from executors import init_training_process
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = MODEL_DIR / 'jobs'
+LOCK_PATH = MODEL_DIR / 'training.lock'
+
+# Как часто процесс обучения обновляет файл задачи, секунд
+PROGRESS_INTERVAL = float(os.environ.get('ML_TRAIN_PROGRESS_INTERVAL', '1.0'))
+# Сколько последних задач хранить на диске
+JOBS_KEEP = int(os.environ.get('ML_TRAIN_JOBS_KEEP', '20'))
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_CANCELLING = 'cancelling'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+FINAL_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+
+# Задачи наблюдения за процессами обучения этого воркера
+_watchers = set()
+
+
+class JobAlreadyRunning(RuntimeError):
+    """Обучение уже выполняется (в этом или другом воркере)"""
+
+    def __init__(self, job_id: str):
+        super().__init__(f"Training job {job_id or 'unknown'} is already running")
+        self.job_id = job_id
+
+
+def _job_path(job_id: str):
+    return JOBS_DIR / f'{job_id}.json'
+
+
+def _cancel_path(job_id: str):
+    return JOBS_DIR / f'{job_id}.cancel'
+
+
+def _write_job(job: dict):
+    """Атомарная запись файла задачи: временный файл и rename"""
+    path = _job_path(job['job_id'])
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    tmp_path.write_text(json.dumps(job, default=str))
+    os.replace(tmp_path, path)
+
+
+def read_job(job_id: str):
+    """Состояние задачи (None, если задача неизвестна)"""
+    if not job_id.isalnum():
+        return None
+
+    try:
+        job = json.loads(_job_path(job_id).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if job['status'] in (STATUS_QUEUED, STATUS_RUNNING) and _cancel_path(job_id).exists():
+        job['status'] = STATUS_CANCELLING
+    return job
+
+
+def _prune_jobs(keep: int = JOBS_KEEP):
+    """Удаление файлов старых завершенных задач"""
+    jobs = sorted(JOBS_DIR.glob('*.json'), key=lambda path: path.stat().st_mtime)
+    for path in jobs[:-keep] if keep > 0 else []:
+        job_id = path.stem
+        job = read_job(job_id)
+        if job is not None and job['status'] in FINAL_STATUSES:
+            path.unlink(missing_ok=True)
+            _cancel_path(job_id).unlink(missing_ok=True)
+
+
+class TrainingProgress:
+    """
+    Прогресс задачи в процессе обучения: шаг пайплайна и callback
+    CatBoost after_iteration (итерация, AUC, elapsed, ETA).
+    При активном детекторе переобучения CatBoost считает AUC на каждой
+    итерации. ETA - верхняя оценка, детектор может остановить раньше;
+    итоговый прогресс (последняя итерация, лучший AUC) записывается при
+    переходе от обучения к следующему шагу.
+    """
+
+    def __init__(self, job: dict, interval: float = PROGRESS_INTERVAL):
+        self.job = job
+        self.interval = interval
+        # Флаг отмены; его же проверяют trials подбора гиперпараметров
+        self.cancel_path = _cancel_path(job['job_id'])
+        self._fit_started = None
+        self._last_write = 0.0
+        self._last_iteration = None
+
+    def cancelled(self) -> bool:
+        return self.cancel_path.exists()
+
+    def stage(self, name: str):
+        """Переход к шагу пайплайна (с проверкой отмены)"""
+        from train_model import TrainingCancelled
+
+        if self.cancelled():
+            raise TrainingCancelled(f"Training job {self.job['job_id']} cancelled")
+
+        if name == 'training':
+            self._fit_started = time.perf_counter()
+        elif self.job['stage'] == 'training' and self._last_iteration is not None:
+            # Обучение закончилось (в том числе остановкой детектора переобучения)
+            self._update_progress(*self._last_iteration, finished=True)
+
+        self.job['stage'] = name
+        _write_job(self.job)
+
+    def _update_progress(self, iteration: int, auc_history: list, now: float, finished: bool = False):
+        iterations = self.job['params']['n_iterations']
+        elapsed = now - self._fit_started
+        self.job['progress'] = {
+            'iteration': iteration,
+            'iterations': iterations,
+            'auc': round(auc_history[-1], 4) if auc_history else None,
+            'best_auc': round(max(auc_history), 4) if auc_history else None,
+            'elapsed_seconds': round(elapsed, 1),
+            'eta_seconds': 0.0 if finished else round(elapsed / iteration * (iterations - iteration), 1)
+        }
+
+    def after_iteration(self, info) -> bool:
+        """Callback CatBoost: False останавливает обучение"""
+        now = time.perf_counter()
+        if self._fit_started is None:
+            self._fit_started = now
+
+        auc_history = info.metrics.get('validation', {}).get('AUC') or []
+        self._last_iteration = (info.iteration, auc_history, now)
+
+        if now - self._last_write >= self.interval or info.iteration >= self.job['params']['n_iterations']:
+            self._update_progress(info.iteration, auc_history, now)
+            _write_job(self.job)
+            self._last_write = now
+
+        return not self.cancelled()
+
+
+def _run_job(job: dict):
+    """Точка входа процесса обучения"""
+    from train_model import train_pipeline
+
+    init_training_process()
+
+    job.update(status=STATUS_RUNNING, started_at=datetime.now().isoformat(), pid=os.getpid())
+    _write_job(job)
+
+    progress = TrainingProgress(job)
+    result = train_pipeline(
+        promote=job['params']['promote'],
+        n_iterations=job['params']['n_iterations'],
+        dataset_path=job['params']['dataset_path'],
+        progress=progress,
+        tune=job['params']['tune'],
+        tune_trials=job['params']['tune_trials']
+    )
+
+    if result.get('cancelled'):
+        status = STATUS_CANCELLED
+    else:
+        status = STATUS_SUCCEEDED if result.get('success') else STATUS_FAILED
+
+    job.update(
+        status=status,
+        finished_at=datetime.now().isoformat(),
+        result=result,
+        error=result.get('error')
+    )
+    _write_job(job)
+
+
+def _acquire_lock(job_id: str) -> int:
+    """
+    Неблокирующий захват блокировки обучения.
+    В файле блокировки - job_id текущей задачи.
+    """
+    fd = os.open(LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        running_job_id = os.read(fd, 64).decode().strip()
+        os.close(fd)
+        raise JobAlreadyRunning(running_job_id)
+
+    os.ftruncate(fd, 0)
+    os.write(fd, job_id.encode())
+    return fd
+
+
+def _release_lock(fd: int):
+    os.ftruncate(fd, 0)
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+async def _watch(job: dict, process, lock_fd: int, on_success):
+    """
+    Ожидание процесса обучения. Блокировка держится до его завершения,
+    если процесс умер без финального статуса - задача помечается failed.
+    """
+    loop = asyncio.get_running_loop()
+
+    try:
+        await loop.run_in_executor(None, process.join)
+
+        final = read_job(job['job_id']) or job
+        if final['status'] not in FINAL_STATUSES:
+            final.update(
+                status=STATUS_FAILED,
+                finished_at=datetime.now().isoformat(),
+                error=f"Training process exited with code {process.exitcode}"
+            )
+            _write_job(final)
+
+        logger.info(f"Training job {job['job_id']} finished: {final['status']}")
+
+        if final['status'] == STATUS_SUCCEEDED and on_success is not None:
+            await on_success(final)
+
+    except Exception as e:
+        logger.error(f"Training job {job['job_id']} watcher failed: {e}")
+
+    finally:
+        _release_lock(lock_fd)
+        _cancel_path(job['job_id']).unlink(missing_ok=True)
+
+
+async def submit_job(n_iterations: int = 1000, dataset_path: str = None,
+                     promote: bool = True, tune: bool = False, tune_trials: int = None,
+                     on_success=None) -> dict:
+    """
+    Постановка задачи обучения.
+    Возвращает состояние задачи сразу после старта процесса,
+    JobAlreadyRunning - если обучение уже идет.
+    on_success - корутина, вызываемая в этом воркере после успешного обучения.
+    """
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+
+    job_id = uuid.uuid4().hex
+    lock_fd = _acquire_lock(job_id)
+
+    try:
+        job = {
+            'job_id': job_id,
+            'status': STATUS_QUEUED,
+            'stage': None,
+            'params': {
+                'n_iterations': n_iterations,
+                'dataset_path': dataset_path,
+                'promote': promote,
+                'tune': tune,
+                'tune_trials': tune_trials
+            },
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'pid': None,
+            'progress': None,
+            'result': None,
+            'error': None
+        }
+        _write_job(job)
+        _prune_jobs()
+
+        # spawn: fork процесса с потоками CatBoost небезопасен
+        process = multiprocessing.get_context('spawn').Process(
+            target=_run_job,
+            args=(job,),
+            name=f'training-{job_id}',
+            daemon=False
+        )
+        process.start()
+
+    except Exception:
+        _release_lock(lock_fd)
+        raise
+
+    task = asyncio.create_task(_watch(job, process, lock_fd, on_success))
+    _watchers.add(task)
+    task.add_done_callback(_watchers.discard)
+
+    logger.info(f"Training job {job_id} started (pid {process.pid}): {job['params']}")
+
+    return job
+
+
+def cancel_job(job_id: str):
+    """
+    Запрос отмены задачи: флаг-файл, процесс обучения останавливается
+    на ближайшей итерации CatBoost или между шагами пайплайна.
+    Возвращает состояние задачи (None, если задача неизвестна).
+    """
+    job = read_job(job_id)
+    if job is None or job['status'] in FINAL_STATUSES:
+        return job
+
+    _cancel_path(job_id).touch()
+    logger.info(f"Training job {job_id} cancellation requested")
+
+    return read_job(job_id)
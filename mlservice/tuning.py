@@ -0,0 +1,247 @@
+"""
+Параллельный подбор гиперпараметров CatBoost.
+Кандидаты из пространства поиска проходят successive halving: на каждом
+раунде оставшиеся кандидаты обучаются с бюджетом итераций, лучшая 1/ETA
+часть по AUC на валидации переходит в следующий раунд с бюджетом в ETA
+раз больше. Внутри trial работает детектор переобучения (od_wait).
+
+Trials выполняются в пуле процессов (spawn), потоки CatBoost делятся
+между процессами, чтобы суммарно не превышать доступные CPU.
+Обучающая выборка квантуется один раз (или берется готовый Pool из
+кэша датасетов), каждый процесс пула загружает квантованный Pool и
+строит Pool валидации при старте. Флаг отмены задачи обучения
+проверяется в callback каждого trial, поэтому отмена останавливает
+идущие trials на ближайшей итерации, а не после их завершения.
+"""
+
+import os
+import math
+import time
+import random
+import tempfile
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import logging
+
+from catboost import CatBoostClassifier, Pool
+
+from executors import CPU_COUNT
+from dataset_cache import quantize_train_pool
+from train_model import DEFAULT_PARAMS, TrainingCancelled
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TUNE_TRIALS = int(os.environ.get('ML_TUNE_TRIALS', '12'))
+TUNE_WORKERS = int(os.environ.get('ML_TUNE_WORKERS', str(min(4, CPU_COUNT))))
+TUNE_ETA = int(os.environ.get('ML_TUNE_ETA', '3'))
+TUNE_MIN_ITERATIONS = int(os.environ.get('ML_TUNE_MIN_ITERATIONS', '100'))
+TUNE_SEED = 17
+
+# Пространство поиска; значения DEFAULT_PARAMS всегда входят в кандидаты
+SEARCH_SPACE = {
+    'depth': (4, 5, 6, 7, 8),
+    'l2_leaf_reg': (3, 10, 20, 40, 80),
+    'learning_rate': (0.03, 0.05, 0.1, 0.2),
+    'scale_pos_weight': (1, 2, 5, 10)
+}
+
+# Выборки (квантованная обучающая и валидация) в процессе пула
+_worker_pools = None
+_worker_thread_count = 1
+# Флаг-файл отмены задачи обучения (None - отмена не отслеживается)
+_worker_cancel_path = None
+
+
+class _CancelCallback:
+    """Callback CatBoost: trial останавливается на ближайшей итерации после отмены задачи"""
+
+    def __init__(self, cancel_path: Path):
+        self.cancel_path = cancel_path
+
+    def after_iteration(self, info) -> bool:
+        return not self.cancel_path.exists()
+
+
+def sample_candidates(n_trials: int, seed: int = TUNE_SEED) -> list:
+    """
+    Случайные неповторяющиеся комбинации из SEARCH_SPACE.
+    Первый кандидат - текущие параметры по умолчанию (baseline).
+    """
+    rng = random.Random(seed)
+    names = sorted(SEARCH_SPACE)
+    total = math.prod(len(SEARCH_SPACE[name]) for name in names)
+
+    candidates = [{name: DEFAULT_PARAMS[name] for name in names}]
+    seen = {tuple(candidates[0][name] for name in names)}
+
+    while len(candidates) < min(n_trials, total):
+        values = tuple(rng.choice(SEARCH_SPACE[name]) for name in names)
+        if values not in seen:
+            seen.add(values)
+            candidates.append(dict(zip(names, values)))
+
+    return candidates
+
+
+def _init_worker(train_path: str, X_valid, y_valid, cat_features_indices: list, thread_count: int,
+                 cancel_path: str = None):
+    """Загрузка выборок один раз на процесс пула"""
+    global _worker_pools, _worker_thread_count, _worker_cancel_path
+
+    _worker_pools = (
+        Pool(f'quantized://{train_path}'),
+        Pool(X_valid, y_valid, cat_features=cat_features_indices)
+    )
+    _worker_thread_count = thread_count
+    _worker_cancel_path = Path(cancel_path) if cancel_path else None
+
+
+def _run_trial(trial: dict) -> dict:
+    """Обучение кандидата с бюджетом итераций, результат - лучший AUC на валидации"""
+    train_pool, valid_pool = _worker_pools
+    started = time.perf_counter()
+
+    model = CatBoostClassifier(
+        **{**DEFAULT_PARAMS, **trial['params']},
+        iterations=trial['iterations'],
+        thread_count=_worker_thread_count,
+        verbose=False
+    )
+    callbacks = [_CancelCallback(_worker_cancel_path)] if _worker_cancel_path is not None else None
+    model.fit(train_pool, eval_set=valid_pool, use_best_model=True, callbacks=callbacks)
+
+    return {
+        **trial,
+        'auc': round(model.get_best_score()['validation']['AUC'], 6),
+        'best_iteration': model.get_best_iteration(),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def _rung_budgets(n_candidates: int, max_iterations: int, eta: int, min_iterations: int) -> list:
+    """
+    Бюджеты итераций раундов: до одного кандидата нужно ceil(log_eta(n))
+    раундов, последний раунд получает max_iterations / eta (полное
+    обучение победителя выполняет пайплайн). Нижний раунд поднимается
+    до min_iterations, каждый следующий получает не меньше чем в eta раз
+    больше предыдущего (но не больше max_iterations), поэтому раунды не
+    схлопываются. При n_candidates <= eta раунд один: все кандидаты
+    обучаются с одним бюджетом, лучший выбирается сразу. Если бюджетов
+    меньше, чем раундов, победитель выбирается среди оставшихся в
+    последнем раунде. Для нескольких раундов нужны два разных бюджета,
+    при max_iterations < eta их нет - ValueError.
+    """
+    # Целочисленный ceil(log_eta(n)): math.log на точных степенях eta дает погрешность
+    rungs = 1
+    while eta ** rungs < n_candidates:
+        rungs += 1
+    if rungs > 1 and max_iterations < eta:
+        raise ValueError(
+            f"max_iterations={max_iterations} is too small for successive halving with eta={eta}"
+        )
+
+    floor = max(1, min(min_iterations, max_iterations // eta))
+    budgets = [
+        min(max_iterations, max(max_iterations // eta ** (rungs - rung), floor * eta ** rung))
+        for rung in range(rungs)
+    ]
+    # Раунды с одинаковым бюджетом повторили бы те же обучения (seed фиксирован)
+    return list(dict.fromkeys(budgets))
+
+
+def tune_hyperparameters(X_train, y_train, X_valid, y_valid, cat_features_indices: list,
+                         max_iterations: int = 1000, n_trials: int = TUNE_TRIALS,
+                         workers: int = TUNE_WORKERS, eta: int = TUNE_ETA,
+                         progress=None, pool_path: Path = None) -> dict:
+    """
+    Подбор гиперпараметров successive halving в пуле процессов.
+    progress - прогресс задачи обучения (отметка раундов и отмена),
+    pool_path - готовый квантованный Pool обучающей выборки из кэша датасетов.
+    Возвращает лучшие параметры и полный журнал trials.
+    """
+    started = time.perf_counter()
+    eta = max(2, eta)
+    candidates = sample_candidates(n_trials)
+    budgets = _rung_budgets(len(candidates), max_iterations, eta, TUNE_MIN_ITERATIONS)
+
+    workers = max(1, min(workers, CPU_COUNT, len(candidates)))
+    thread_count = max(1, CPU_COUNT // workers)
+
+    trials = []
+    with tempfile.TemporaryDirectory(prefix='mlservice-tuning-') as work_dir:
+        quantize_started = time.perf_counter()
+        train_path = pool_path or quantize_train_pool(
+            X_train, y_train, cat_features_indices, Path(work_dir)
+        )
+        quantize_seconds = time.perf_counter() - quantize_started if pool_path is None else 0.0
+
+        logger.info(
+            f"Hyperparameter search: {len(candidates)} candidates, budgets {budgets}, "
+            f"{workers} workers x {thread_count} threads"
+        )
+
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(str(train_path), X_valid, y_valid, cat_features_indices, thread_count,
+                      str(progress.cancel_path) if progress is not None else None)
+        )
+
+        try:
+            alive = list(range(len(candidates)))
+            for rung, iterations in enumerate(budgets):
+                if progress is not None:
+                    progress.stage(f'tuning: rung {rung + 1}/{len(budgets)}, {len(alive)} candidates')
+
+                pending = {
+                    executor.submit(_run_trial, {
+                        'candidate': idx,
+                        'rung': rung,
+                        'iterations': iterations,
+                        'params': candidates[idx]
+                    })
+                    for idx in alive
+                }
+
+                results = []
+                while pending:
+                    done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                    results.extend(future.result() for future in done)
+
+                    if progress is not None and progress.cancelled():
+                        raise TrainingCancelled("Hyperparameter search cancelled")
+
+                results.sort(key=lambda trial: trial['auc'], reverse=True)
+                trials.extend(results)
+
+                keep = max(1, math.ceil(len(results) / eta))
+                alive = [trial['candidate'] for trial in results[:keep]]
+                logger.info(
+                    f"Rung {rung + 1}/{len(budgets)} ({iterations} iterations): "
+                    f"best AUC {results[0]['auc']} {results[0]['params']}"
+                )
+
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    best = max((trial for trial in trials if trial['rung'] == len(budgets) - 1), key=lambda trial: trial['auc'])
+    baseline = max((trial for trial in trials if trial['candidate'] == 0), key=lambda trial: trial['rung'])
+
+    return {
+        'best_params': best['params'],
+        'best_auc': best['auc'],
+        'baseline_params': candidates[0],
+        'baseline_auc': baseline['auc'],
+        'baseline_rung': baseline['rung'],
+        'budgets': budgets,
+        'eta': eta,
+        'workers': workers,
+        'thread_count': thread_count,
+        'quantize_seconds': round(quantize_seconds, 3),
+        'seconds': round(time.perf_counter() - started, 3),
+        'trials': trials
+    }
@@ -0,0 +1,133 @@
+"""
+Прогрев ML-сервиса при старте воркера.
+Загружает bundle модели и выполняет несколько предсказаний на
+синтетических строках из feature_columns.json, чтобы первый
+реальный запрос не платил за загрузку и первый вызов CatBoost.
+До окончания прогрева readiness возвращает not ready.
+"""
+
+import os
+import time
+from datetime import datetime
+import logging
+
+from model_manager import (
+    get_bundle,
+    predict_single,
+    predict_batch,
+    prediction_cache,
+    IMPORTANCE_GLOBAL,
+    IMPORTANCE_SHAP
+)
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.environ.get('ML_WARMUP_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+WARMUP_PREDICTIONS = int(os.environ.get('ML_WARMUP_PREDICTIONS', '16'))
+
+# Состояние прогрева текущего процесса
+_state = {
+    'ready': False,
+    'model_loaded': False,
+    'started_at': None,
+    'finished_at': None,
+    'steps_ms': {},
+    'error': None
+}
+
+
+def synthetic_rows(bundle, count: int) -> list:
+    """
+    Синтетические записи по списку признаков версии.
+    Категориальные признаки берутся из таблиц кодирования, числовые
+    различаются по строкам, чтобы не попадать в кэш предсказаний.
+    """
+    features_info = bundle.features
+    columns = features_info['columns']
+    cat_features = {columns[idx] for idx in features_info['categorical_indices']}
+
+    rows = []
+    for i in range(count):
+        row = {}
+        for col in columns:
+            if col in cat_features:
+                categories = bundle.encoding_tables.get(col)
+                row[col] = categories[i % len(categories)] if categories is not None and len(categories) else 'unknown'
+            else:
+                row[col] = float(i)
+        rows.append(row)
+
+    return rows
+
+
+def _step(name: str, fn, *args, **kwargs):
+    """Выполнение шага прогрева с замером и логированием времени"""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    _state['steps_ms'][name] = elapsed_ms
+    logger.info(f"Warm-up step '{name}' took {elapsed_ms} ms")
+
+    return result
+
+
+def warm_up(predictions: int = WARMUP_PREDICTIONS) -> dict:
+    """
+    Прогрев: загрузка bundle, одиночные предсказания, батч и SHAP.
+    Без обученной модели сервис готов сразу (работает эвристика).
+    """
+    _state.update(ready=False, started_at=datetime.now().isoformat(), steps_ms={}, error=None)
+    started = time.perf_counter()
+
+    try:
+        try:
+            bundle = _step('bundle_load', get_bundle)
+        except FileNotFoundError as e:
+            logger.warning(f"Warm-up skipped, model not trained yet: {e}")
+            bundle = None
+
+        if bundle is not None:
+            rows = _step('synthetic_rows', synthetic_rows, bundle, max(1, predictions))
+
+            def single_predictions():
+                for row in rows:
+                    result = predict_single(row, IMPORTANCE_GLOBAL)
+                    if not result.get('success'):
+                        raise RuntimeError(result.get('error'))
+
+            _step('single_predictions', single_predictions)
+            _step('batch_prediction', predict_batch, rows, IMPORTANCE_GLOBAL)
+            _step('shap_importances', predict_single, rows[0], IMPORTANCE_SHAP)
+
+            # Синтетические строки не должны занимать кэш
+            prediction_cache.clear()
+
+        _state['model_loaded'] = bundle is not None
+
+    except Exception as e:
+        # Прогрев не должен блокировать сервис навсегда
+        logger.error(f"Warm-up failed: {e}")
+        _state['error'] = str(e)
+
+    _state['steps_ms']['total'] = round((time.perf_counter() - started) * 1000, 2)
+    _state.update(ready=True, finished_at=datetime.now().isoformat())
+    logger.info(f"Warm-up finished in {_state['steps_ms']['total']} ms")
+
+    return readiness()
+
+
+def readiness() -> dict:
+    """Состояние готовности текущего процесса"""
+    return {
+        'ready': _state['ready'] or not WARMUP_ENABLED,
+        'warmup_enabled': WARMUP_ENABLED,
+        'model_loaded': _state['model_loaded'],
+        'started_at': _state['started_at'],
+        'finished_at': _state['finished_at'],
+        'steps_ms': dict(_state['steps_ms']),
+        'error': _state['error'],
+        'pid': os.getpid()
+    }